@@ -0,0 +1,196 @@
+# -*- coding: utf-8 -*-
+# -----------------------------------------------------------
+# This module contains asyncio Modbus TCP client
+#
+# (C) 2021 Maxim Kozyakov, Voronezh, Russia
+# Released under GNU Public License (MIT)
+# email kmmax@yandex.ru
+# -----------------------------------------------------------
+
+"""
+Модуль AsyncClient.py
+Назначение:
+Минимальный Modbus TCP клиент на asyncio (MBAP кадры), используется AsyncEngine.
+Один экземпляр клиента обслуживает одно TCP соединение.
+Конвейерный режим (pipeline_depth > 1): до N запросов отправляются, не дожидаясь ответов,
+ответы сопоставляются с запросами по transaction id заголовка MBAP.
+Глубина конвейера общего клиента может быть увеличена (setPipelineDepth) для устройства с большей глубиной.
+"""
+
+import asyncio
+import struct
+
+DEFAULT_UNIT = 1              # default modbus unit id
+DEFAULT_TIMEOUT = 3.0         # default timeout of connection and request, sec
+DEFAULT_PIPELINE_DEPTH = 1    # default number of in-flight requests (1 - serialized requests)
+MAX_PIPELINE_DEPTH = 256      # upper limit of in-flight requests per connection
+
+MBAP_HEADER = struct.Struct(">HHHB")   # transaction id, protocol id, length, unit id
+MBAP_HEADER_SIZE = MBAP_HEADER.size
+
+# Modbus function codes
+FC_READ_HOLDING_REGISTERS = 0x03
+FC_WRITE_SINGLE_REGISTER = 0x06
+FC_WRITE_MULTIPLE_REGISTERS = 0x10
+FC_MASK_WRITE_REGISTER = 0x16
+
+
+class ModbusError(Exception):
+    """ Server has answered with modbus exception response """
+    def __init__(self, function: int, code: int):
+        super().__init__("modbus exception: function=0x{0:02X}, code={1}".format(function, code))
+        self.function = function
+        self.code = code
+
+
+class AsyncModbusTcpClient(object):
+    """
+    Modbus TCP client working over asyncio streams.
+    Up to pipeline_depth requests are in flight at the same time, replies are
+    dispatched to the waiting requests by transaction id (depth 1 - serialized requests).
+    """
+    def __init__(self, host: str, port: int, unit: int = DEFAULT_UNIT, timeout: float = DEFAULT_TIMEOUT,
+                 pipeline_depth: int = DEFAULT_PIPELINE_DEPTH):
+        assert 0 < pipeline_depth <= MAX_PIPELINE_DEPTH
+        self.host = host
+        self.port = port
+        self.unit = unit
+        self.timeout = timeout
+        self.pipeline_depth = pipeline_depth
+
+        self.__reader = None
+        self.__writer = None
+        self.__tid = 0                 # last transaction id
+        self.__window = None           # limits in-flight requests (created inside event loop)
+        self.__pending = {}            # transaction id -> future of reply
+        self.__dispatcher = None       # task reading replies
+
+    # ---------- Public ----------
+    def is_connected(self) -> bool:
+        return self.__writer is not None and not self.__writer.is_closing()
+
+    async def connect(self):
+        """ Opens connection, raises OSError/asyncio.TimeoutError on fail """
+        self.close()
+        self.__reader, self.__writer = await asyncio.wait_for(
+            asyncio.open_connection(self.host, self.port), self.timeout)
+        self.__window = asyncio.Semaphore(self.pipeline_depth)
+        self.__dispatcher = asyncio.get_running_loop().create_task(self.__dispatch(self.__reader))
+
+    def close(self):
+        self.__abort(ConnectionError("connection to {0}:{1} is closed".format(self.host, self.port)))
+        if self.__dispatcher is not None and self.__dispatcher is not asyncio.current_task():
+            self.__dispatcher.cancel()
+        self.__dispatcher = None
+
+    def setPipelineDepth(self, pipeline_depth: int):
+        """ Increases max number of in-flight requests (the depth is never decreased) """
+        assert 0 < pipeline_depth <= MAX_PIPELINE_DEPTH
+        if pipeline_depth <= self.pipeline_depth:
+            return
+        if self.__window is not None:
+            for _ in range(pipeline_depth - self.pipeline_depth):
+                self.__window.release()
+        self.pipeline_depth = pipeline_depth
+
+    def in_flight(self) -> int:
+        """ Returns number of requests waiting for reply """
+        return len(self.__pending)
+
+    async def read_holding_registers(self, address: int, count: int, unit: int = None) -> list:
+        """ FC3. Returns list of count registers from address """
+        payload = await self.read_holding_registers_raw(address, count, unit)
+        return list(struct.unpack(">{0}H".format(count), payload))
+
+    async def read_holding_registers_raw(self, address: int, count: int, unit: int = None) -> memoryview:
+        """ FC3. Returns count registers from address as big-endian bytes (see Range.setRegistersBytes) """
+        pdu = struct.pack(">BHH", FC_READ_HOLDING_REGISTERS, address, count)
+        reply = await self._execute(pdu, unit)
+        if len(reply) < 2 or reply[1] != 2 * count or len(reply) < 2 + 2 * count:
+            raise ConnectionError("bad read response length")
+        return memoryview(reply)[2:2 + 2 * count]
+
+    async def write_register(self, address: int, value: int, unit: int = None):
+        """ FC6. Writes single register """
+        pdu = struct.pack(">BHH", FC_WRITE_SINGLE_REGISTER, address, value & 0xFFFF)
+        await self._execute(pdu, unit)
+
+    async def write_registers(self, address: int, values: list, unit: int = None):
+        """ FC16. Writes continuous sequence of registers """
+        count = len(values)
+        pdu = struct.pack(">BHHB{0}H".format(count), FC_WRITE_MULTIPLE_REGISTERS,
+                          address, count, 2 * count, *[v & 0xFFFF for v in values])
+        await self._execute(pdu, unit)
+
+    async def mask_write_register(self, address: int, and_mask: int, or_mask: int, unit: int = None):
+        """ FC22. Writes bits of register: (register & and_mask) | (or_mask & ~and_mask) """
+        pdu = struct.pack(">BHHH", FC_MASK_WRITE_REGISTER, address, and_mask & 0xFFFF, or_mask & 0xFFFF)
+        await self._execute(pdu, unit)
+
+    # ---------- Protected ----------
+    def _next_tid(self) -> int:
+        """ Returns next transaction id which is not used by in-flight requests """
+        self.__tid = (self.__tid + 1) & 0xFFFF
+        while self.__tid in self.__pending:
+            self.__tid = (self.__tid + 1) & 0xFFFF
+        return self.__tid
+
+    async def _execute(self, pdu: bytes, unit: int = None) -> bytes:
+        """ Sends request PDU to unit (None - unit of the client) and returns reply PDU """
+        async with self.__window:
+            if not self.is_connected():
+                raise ConnectionError("not connected to {0}:{1}".format(self.host, self.port))
+
+            tid = self._next_tid()
+            reply = asyncio.get_running_loop().create_future()
+            self.__pending[tid] = reply
+            self.__writer.write(MBAP_HEADER.pack(tid, 0, len(pdu) + 1, self.unit if unit is None else unit) + pdu)
+            try:
+                reply = await asyncio.wait_for(reply, self.timeout)
+            except asyncio.TimeoutError:
+                # A late reply would be taken for another request, the connection is dropped
+                self.close()
+                raise
+            # cancelled request (device is deleted) keeps its transaction id until the reply comes:
+            # the reply is dropped by __dispatch, the connection shared with other devices is kept
+
+        if reply[0] & 0x80:
+            raise ModbusError(reply[0] & 0x7F, reply[1] if len(reply) > 1 else 0)
+        return reply
+
+    async def _read_frame(self, reader: asyncio.StreamReader):
+        """ Reads one MBAP frame, returns (transaction id, PDU) """
+        try:
+            header = await reader.readexactly(MBAP_HEADER_SIZE)
+            tid, _, length, _ = MBAP_HEADER.unpack(header)
+            pdu = await reader.readexactly(length - 1)
+        except asyncio.IncompleteReadError as err:
+            raise EOFError("connection closed by server") from err
+        return tid, pdu
+
+    # ---------- Privat -----------
+    async def __dispatch(self, reader: asyncio.StreamReader):
+        """ Reads replies and passes them to the waiting requests by transaction id """
+        try:
+            while True:
+                tid, pdu = await self._read_frame(reader)
+                reply = self.__pending.pop(tid, None)
+                if reply is None:
+                    raise ConnectionError("unexpected transaction id {0}".format(tid))
+                if not reply.done():
+                    reply.set_result(pdu)
+        except (OSError, EOFError) as err:
+            # The stream state is unknown after a fail, the connection is dropped
+            if reader is self.__reader:
+                self.__abort(err)
+
+    def __abort(self, error: Exception):
+        """ Closes the stream and fails all in-flight requests """
+        if self.__writer is not None:
+            self.__writer.close()
+        self.__reader = None
+        self.__writer = None
+        for reply in self.__pending.values():
+            if not reply.done():
+                reply.set_exception(error)
+        self.__pending.clear()
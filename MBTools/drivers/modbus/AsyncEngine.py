@@ -0,0 +1,239 @@
+# -*- coding: utf-8 -*-
+# -----------------------------------------------------------
+# This module contains asyncio polling engine of modbus driver
+#
+# (C) 2021 Maxim Kozyakov, Voronezh, Russia
+# Released under GNU Public License (MIT)
+# email kmmax@yandex.ru
+# -----------------------------------------------------------
+
+"""
+Модуль AsyncEngine.py
+Назначение:
+Опрос всех устройств драйвера в одном потоке с одним циклом событий asyncio
+(вместо отдельного QThread на каждый Device).
+
+Контракт Device не меняется: данные публикуются через Device.dataChanged и Device.rangesChanged
+(один раз за цикл опроса), поэтому ModbusDriver продолжает выдавать dataChanged(str, Range)
+или пачки rangesChanged (см. ModbusDriver.setBatchWindow).
+Если у устройства Device.pipelineDepth() > 1, запросы всех ranges цикла отправляются
+конвейером (не дожидаясь ответов), цикл опроса занимает примерно один round-trip.
+Глубина берется у каждого устройства, а не у общего соединения: устройство с глубиной 1
+опрашивается последовательно, даже если соединение открыто устройством с большей глубиной.
+Устройства с одинаковым ip:port используют общие соединения (AsyncConnectionPool).
+Недоступное устройство не опрашивается, пока открыт его CircuitBreaker (см. Device.loop).
+"""
+
+import asyncio
+import threading
+import time
+
+from MBTools.drivers.modbus.ModbusDriver import Device, QualityEnum, REQUEST_DELAY
+from MBTools.drivers.modbus.WriteQueue import MaskBatch, WriteError
+from MBTools.drivers.modbus.AsyncClient import AsyncModbusTcpClient, ModbusError, DEFAULT_TIMEOUT
+from MBTools.drivers.modbus.ConnectionPool import AsyncConnectionPool, NotConnectedError
+from MBTools.drivers.modbus.CircuitBreaker import BreakerState
+
+
+class AsyncEngine(object):
+    """
+    Polls devices concurrently on a single asyncio event loop.
+    The loop is run in its own thread, so the engine can be used from Qt GUI thread.
+    """
+    def __init__(self, request_delay: float = REQUEST_DELAY, timeout: float = DEFAULT_TIMEOUT):
+        """
+        :param request_delay: max idle time of device polling loop, sec (ranges are polled by their scan rates)
+        :param timeout: timeout of connection and request, sec
+        """
+        self.__request_delay = request_delay
+        self.__timeout = timeout
+        self.__pool = AsyncConnectionPool(timeout=timeout)
+        self.__loop = None
+        self.__thread = None
+        self.__tasks = {}        # device -> asyncio.Task
+
+    # ---------- Public ----------
+    def isRunning(self) -> bool:
+        return self.__thread is not None and self.__thread.is_alive()
+
+    def start(self):
+        """ Starts event loop thread """
+        if self.isRunning():
+            return
+        self.__loop = asyncio.new_event_loop()
+        self.__thread = threading.Thread(target=self.__run, name="modbus-asyncio", daemon=True)
+        self.__thread.start()
+
+    def stop(self):
+        """ Stops polling of all devices and event loop """
+        if not self.isRunning():
+            return
+        for device in list(self.__tasks.keys()):
+            self.delDevice(device)
+        self.__loop.call_soon_threadsafe(self.__pool.close)
+        self.__loop.call_soon_threadsafe(self.__loop.stop)
+        self.__thread.join()
+        self.__loop.close()
+        self.__thread = None
+        self.__loop = None
+
+    def addDevice(self, device: Device):
+        """ Starts polling the device """
+        assert device not in self.__tasks
+        self.start()
+        device.is_running = True
+        future = asyncio.run_coroutine_threadsafe(self.__spawn(device), self.__loop)
+        future.result()
+
+    def delDevice(self, device: Device) -> bool:
+        """ Stops polling the device and waits for the end of polling """
+        if device not in self.__tasks or not self.isRunning():
+            return False
+        device.stop()
+        future = asyncio.run_coroutine_threadsafe(self.__cancel(device), self.__loop)
+        future.result()
+        return True
+
+    def devices(self):
+        return self.__tasks.keys()
+
+    def setSessionLimit(self, ip: str, port: int, max_sessions: int):
+        """ Sets max number of TCP sessions shared by devices with address ip:port """
+        if self.isRunning():
+            self.__loop.call_soon_threadsafe(self.__pool.setSessionLimit, ip, port, max_sessions)
+        else:
+            self.__pool.setSessionLimit(ip, port, max_sessions)
+
+    # ---------- Privat -----------
+    def __run(self):
+        asyncio.set_event_loop(self.__loop)
+        self.__loop.run_forever()
+
+    async def __spawn(self, device: Device):
+        self.__tasks[device] = asyncio.get_running_loop().create_task(self.__poll(device))
+
+    async def __cancel(self, device: Device):
+        task = self.__tasks.pop(device)
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+
+    async def __poll(self, device: Device):
+        """ Polling loop of single device (analog of Device.loop) """
+        endpoint = self.__pool.attach(device.ip(), device.port())
+        try:
+            breaker = device.circuitBreaker()
+            while device.is_running:
+                if not breaker.allow(time.monotonic()):
+                    device._failWrites(ConnectionError("device {0} is not available".format(device.name())))
+                else:
+                    try:
+                        client = await endpoint.acquire(device.pipelineDepth())
+                    except NotConnectedError as err:
+                        device._linkFailed(err, fatal=True)
+                    else:
+                        if BreakerState.HALF_OPEN == breaker.state():
+                            await self.__probe(device, client)
+                        else:
+                            device._beginCycle()
+                            try:
+                                await self.__pollRanges(device, client)
+                            finally:
+                                device._endCycle()
+                            if client.is_connected() and BreakerState.CLOSED == breaker.state():
+                                await self.__flushWrites(device, client)
+                await asyncio.sleep(min(device._waitTime(time.monotonic()), self.__request_delay))
+        finally:
+            self.__pool.detach(endpoint)
+            device._failWrites(ConnectionError("device {0} is stopped".format(device.name())))
+            device._setQuality(QualityEnum.DRV_NOT_STARTED)
+            device.finished.emit()
+
+    @staticmethod
+    async def __flushWrites(device: Device, client: AsyncModbusTcpClient) -> bool:
+        """
+        Writes pending commands of the device (FC6 for single register, otherwise FC16,
+        bits - FC22 or read-modify-write)
+        :return: False if the connection has been lost
+        """
+        batches = device._takeWrites()
+        for i, batch in enumerate(batches):
+            try:
+                if isinstance(batch, MaskBatch):
+                    if device.maskWrite():
+                        await client.mask_write_register(batch.address, batch.and_mask, batch.or_mask, device.unit())
+                    else:
+                        register = (await client.read_holding_registers(batch.address, 1, device.unit()))[0]
+                        await client.write_register(batch.address, batch.apply(register), device.unit())
+                elif 1 == len(batch):
+                    await client.write_register(batch.address, batch.values[0], device.unit())
+                else:
+                    await client.write_registers(batch.address, batch.values, device.unit())
+            except ModbusError as err:
+                device._writeDone(batch, WriteError(str(err)))
+                continue
+            except (OSError, EOFError, asyncio.TimeoutError) as err:
+                for rest in batches[i:]:
+                    device._writeDone(rest, err)
+                device._linkFailed(err)
+                return False
+            device._writeDone(batch)
+            device._linkOk()
+        return True
+
+    @staticmethod
+    async def __probe(device: Device, client: AsyncModbusTcpClient):
+        """ Sends single cheap request to check the link when circuit breaker is half-open """
+        try:
+            await client.read_holding_registers(device._probeAddress(), 1, device.unit())
+        except ModbusError:
+            pass
+        except (OSError, EOFError, asyncio.TimeoutError) as err:
+            device._linkFailed(err)
+            return
+        device._linkOk()
+
+    @staticmethod
+    async def __readRange(device: Device, client: AsyncModbusTcpClient, data) -> bool:
+        """
+        Reads and publishes the range
+        :return: False if the connection has been lost
+        """
+        try:
+            sent_ns = time.monotonic_ns()
+            payload = await client.read_holding_registers_raw(data.address(), data.number(), device.unit())
+            data.setRegistersBytes(payload, QualityEnum.GOOD, device._stamp(sent_ns))
+        except ModbusError:
+            data.setQuality(QualityEnum.REQUEST_ERROR)
+        except (OSError, EOFError, asyncio.TimeoutError) as err:
+            if not device._linkFailed(err):
+                data.setQuality(QualityEnum.NO_CONNET)
+                device._publish(data)
+            return False
+        device._linkOk()
+        device._publish(data)
+        return True
+
+    @staticmethod
+    async def __pollRanges(device: Device, client: AsyncModbusTcpClient):
+        due = list(device._dueRanges(time.monotonic()))
+        depth = min(device.pipelineDepth(), client.pipeline_depth)
+        if depth > 1:
+            # writes go first, then reads are in flight together (limited by pipeline depth of the device)
+            if due and await AsyncEngine.__flushWrites(device, client):
+                window = asyncio.Semaphore(depth)
+
+                async def read(data):
+                    async with window:
+                        return await AsyncEngine.__readRange(device, client, data)
+
+                await asyncio.gather(*[read(data) for data in due])
+            return
+
+        for data in due:
+            if not await AsyncEngine.__flushWrites(device, client):
+                return
+            if not await AsyncEngine.__readRange(device, client, data):
+                return
@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+# -----------------------------------------------------------
+# This module contains circuit breaker of modbus device polling
+#
+# (C) 2021 Maxim Kozyakov, Voronezh, Russia
+# Released under GNU Public License (MIT)
+# email kmmax@yandex.ru
+# -----------------------------------------------------------
+
+"""
+Модуль CircuitBreaker.py
+Назначение:
+Прерыватель опроса недоступного устройства.
+- CLOSED: устройство опрашивается, неудачи считаются;
+- OPEN: после threshold неудач подряд опрос прекращается на время задержки,
+  задержка растет экспоненциально (base_delay * 2^n, не более max_delay) со случайным разбросом;
+- HALF_OPEN: по истечении задержки выполняется один дешевый пробный запрос,
+  успех закрывает прерыватель, неудача снова открывает его с большей задержкой.
+"""
+
+import enum
+import random
+
+FAILURE_THRESHOLD = 3         # failures in a row which open the breaker
+BASE_DELAY = 0.5              # first backoff delay, sec
+MAX_DELAY = 30.0              # max backoff delay, sec
+JITTER = 0.2                  # relative random spread of delay (+-20%)
+
+
+@enum.unique
+class BreakerState(enum.Enum):
+    CLOSED = 0          # normal polling
+    OPEN = 1            # polling is stopped till the end of backoff delay
+    HALF_OPEN = 2       # probe request is allowed
+
+
+class CircuitBreaker(object):
+    """ Circuit breaker with exponential backoff and jitter (time is time.monotonic) """
+    def __init__(self, threshold: int = FAILURE_THRESHOLD, base_delay: float = BASE_DELAY,
+                 max_delay: float = MAX_DELAY, jitter: float = JITTER, rand=random.random):
+        assert threshold > 0 and 0 < base_delay <= max_delay and 0 <= jitter < 1
+        self.threshold = threshold
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.jitter = jitter
+        self.__rand = rand
+        self.__state = BreakerState.CLOSED
+        self.__failures = 0         # failures in a row
+        self.__trips = 0            # openings in a row (exponent of delay)
+        self.__open_until = 0.0
+
+    def state(self) -> BreakerState:
+        return self.__state
+
+    def failures(self) -> int:
+        return self.__failures
+
+    def allow(self, now: float) -> bool:
+        """ Returns True if requests may be sent, switches OPEN to HALF_OPEN at the end of delay """
+        if BreakerState.OPEN == self.__state:
+            if now < self.__open_until:
+                return False
+            self.__state = BreakerState.HALF_OPEN
+        return True
+
+    def retryIn(self, now: float) -> float:
+        """ Returns time until the probe request, sec (0 if requests are allowed) """
+        if BreakerState.OPEN != self.__state:
+            return 0.0
+        return max(self.__open_until - now, 0.0)
+
+    def success(self):
+        """ Request has been answered (exception response counts as answer too) """
+        self.__state = BreakerState.CLOSED
+        self.__failures = 0
+        self.__trips = 0
+
+    def failure(self, now: float, fatal: bool = False) -> bool:
+        """
+        Request has failed. Returns True if the breaker has been opened by this failure
+        :param fatal: the breaker is opened without counting (e.g. connection is refused)
+        """
+        if BreakerState.OPEN == self.__state:
+            return False
+        self.__failures += 1
+        if not fatal and BreakerState.HALF_OPEN != self.__state and self.__failures < self.threshold:
+            return False
+
+        delay = min(self.base_delay * 2 ** self.__trips, self.max_delay)
+        delay *= 1.0 + self.jitter * (2.0 * self.__rand() - 1.0)
+        self.__trips += 1
+        self.__state = BreakerState.OPEN
+        self.__open_until = now + delay
+        return True
@@ -0,0 +1,333 @@
+# -*- coding: utf-8 -*-
+# -----------------------------------------------------------
+# This module contains pool of modbus TCP connections shared by devices
+#
+# (C) 2021 Maxim Kozyakov, Voronezh, Russia
+# Released under GNU Public License (MIT)
+# email kmmax@yandex.ru
+# -----------------------------------------------------------
+
+"""
+Модуль ConnectionPool.py
+Назначение:
+Общие TCP соединения для устройств (Device) с одинаковым адресом ip:port
+(несколько логических устройств за одним шлюзом, разные unit id или области регистров).
+- число сессий к одному адресу ограничено (многие шлюзы принимают 1-4 соединения);
+- переподключение выполняется одним автоматом состояний на адрес: пока идет подключение,
+  остальные устройства ждут его результата, после неудачи все получают NotConnectedError
+  до следующей попытки (без повторных подключений и таймаутов).
+
+ConnectionPool - для потоков (синхронный клиент pymodbus, запросы разных устройств сериализуются).
+AsyncConnectionPool - для AsyncEngine (клиенты asyncio общие, запросы идут конвейером).
+В обоих пулах устройства подключаются к адресу через attach/detach: сессии адреса закрываются,
+когда его перестает использовать последнее устройство.
+"""
+
+import asyncio
+import enum
+import threading
+import time
+from contextlib import contextmanager
+
+from pymodbus.client.sync import ModbusTcpClient
+
+from MBTools.drivers.modbus.AsyncClient import AsyncModbusTcpClient, DEFAULT_TIMEOUT
+from MBTools.utilites.Log import getLogger
+
+log = getLogger("modbus.pool")
+
+MAX_SESSIONS = 1              # default number of TCP sessions to one endpoint
+RECONNECT_DELAY = 1.0         # delay before next connection attempt, sec
+
+
+@enum.unique
+class LinkState(enum.Enum):
+    """ State of connection to endpoint """
+    DISCONNECTED = 0    # no sessions, connection will be opened on demand
+    CONNECTING = 1      # one of callers is connecting, others are waiting for result
+    CONNECTED = 2       # at least one session is open
+    WAITING = 3         # last attempt has failed, next attempt is delayed
+
+
+class NotConnectedError(ConnectionError):
+    """ Endpoint has no connection (connection has failed, next attempt is delayed) """
+    pass
+
+
+class Endpoint(object):
+    """ Sessions to one ip:port and reconnect state machine (threads) """
+    def __init__(self, ip: str, port: int, max_sessions: int = MAX_SESSIONS,
+                 reconnect_delay: float = RECONNECT_DELAY, factory=ModbusTcpClient):
+        assert max_sessions > 0
+        self.ip = ip
+        self.port = port
+        self.max_sessions = max_sessions
+        self.reconnect_delay = reconnect_delay
+        self.__factory = factory
+        self.users = 0              # number of devices using the endpoint (see ConnectionPool.attach)
+        self.__cond = threading.Condition()
+        self.__closed = False       # sessions are closed on release
+        self.__idle = []            # open sessions which are not used now
+        self.__opened = 0           # open sessions (idle and used)
+        self.__connecting = False
+        self.__retry_at = 0.0       # time of next connection attempt (time.monotonic)
+
+    def state(self) -> LinkState:
+        with self.__cond:
+            if self.__connecting:
+                return LinkState.CONNECTING
+            if self.__opened:
+                return LinkState.CONNECTED
+            if time.monotonic() < self.__retry_at:
+                return LinkState.WAITING
+            return LinkState.DISCONNECTED
+
+    def retryIn(self) -> float:
+        """ Returns time until next connection attempt, sec """
+        with self.__cond:
+            return max(self.__retry_at - time.monotonic(), 0.0)
+
+    def acquire(self, timeout: float = None):
+        """
+        Returns open session for exclusive use (waits while all open sessions are busy)
+        raise NotConnectedError - connection has failed or next attempt is delayed
+        raise ConnectionError - all sessions are busy till timeout
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self.__cond:
+            while True:
+                if self.__idle:
+                    return self.__idle.pop()
+                if not self.__opened and not self.__connecting and time.monotonic() < self.__retry_at:
+                    raise NotConnectedError("no connection with {0}:{1}".format(self.ip, self.port))
+                if not self.__connecting and self.__opened < self.max_sessions:
+                    self.__connecting = True
+                    break
+                wait = None if deadline is None else deadline - time.monotonic()
+                if wait is not None and wait <= 0:
+                    raise ConnectionError("all sessions to {0}:{1} are busy".format(self.ip, self.port))
+                self.__cond.wait(wait)
+
+        log.info("connecting to %s:%s", self.ip, self.port, extra={"key": (self.ip, self.port)})
+        client = self.__factory(self.ip, self.port)
+        connected = False
+        try:
+            connected = client.connect()
+        finally:
+            with self.__cond:
+                self.__connecting = False
+                if connected:
+                    self.__opened += 1
+                    self.__retry_at = 0.0
+                else:
+                    self.__retry_at = time.monotonic() + self.reconnect_delay
+                self.__cond.notify_all()
+        if not connected:
+            client.close()
+            raise NotConnectedError("no connection with {0}:{1}".format(self.ip, self.port))
+        return client
+
+    def release(self, client, broken: bool = False):
+        """ Returns session to the pool, broken session is closed """
+        with self.__cond:
+            if broken or self.__closed or not client.is_socket_open():
+                client.close()
+                self.__opened -= 1
+            else:
+                self.__idle.append(client)
+            self.__cond.notify_all()
+
+    def close(self):
+        """ Closes idle sessions, sessions in use are closed when they are released """
+        with self.__cond:
+            self.__closed = True
+            for client in self.__idle:
+                client.close()
+            self.__opened -= len(self.__idle)
+            self.__idle.clear()
+            self.__cond.notify_all()
+
+
+class ConnectionPool(object):
+    """ Driver-level pool of endpoints for devices polled by threads """
+    def __init__(self, max_sessions: int = MAX_SESSIONS, reconnect_delay: float = RECONNECT_DELAY,
+                 factory=ModbusTcpClient):
+        self.__max_sessions = max_sessions
+        self.__reconnect_delay = reconnect_delay
+        self.__factory = factory
+        self.__lock = threading.Lock()
+        self.__limits = {}          # (ip, port) -> max sessions
+        self.__endpoints = {}       # (ip, port) -> Endpoint
+
+    def endpoint(self, ip: str, port: int) -> Endpoint:
+        with self.__lock:
+            return self.__endpoint(ip, port)
+
+    def attach(self, ip: str, port: int) -> Endpoint:
+        """ Returns endpoint for a device, the endpoint is created on first use """
+        with self.__lock:
+            endpoint = self.__endpoint(ip, port)
+            endpoint.users += 1
+            return endpoint
+
+    def detach(self, ip: str, port: int):
+        """ Releases endpoint of a device, sessions are closed when no device uses it """
+        with self.__lock:
+            endpoint = self.__endpoints.get((ip, port))
+            if endpoint is None:
+                return
+            endpoint.users -= 1
+            if endpoint.users > 0:
+                return
+            del self.__endpoints[(ip, port)]
+        endpoint.close()
+
+    def setSessionLimit(self, ip: str, port: int, max_sessions: int):
+        """ Sets max number of sessions to ip:port """
+        assert max_sessions > 0
+        with self.__lock:
+            self.__limits[(ip, port)] = max_sessions
+            self.__endpoint(ip, port).max_sessions = max_sessions
+
+    @contextmanager
+    def session(self, ip: str, port: int, timeout: float = None):
+        """
+        Context manager, gives open client for exclusive use.
+        The session is closed if an exception is raised inside the block.
+        """
+        endpoint = self.endpoint(ip, port)
+        client = endpoint.acquire(timeout)
+        try:
+            yield client
+        except BaseException:
+            endpoint.release(client, broken=True)
+            raise
+        endpoint.release(client)
+
+    def close(self):
+        """ Closes sessions of all endpoints """
+        with self.__lock:
+            endpoints = list(self.__endpoints.values())
+            self.__endpoints.clear()
+        for endpoint in endpoints:
+            endpoint.close()
+
+    def __endpoint(self, ip: str, port: int) -> Endpoint:
+        """ Returns endpoint of ip:port, creates it if it doesn't exist (under the lock) """
+        key = (ip, port)
+        if key not in self.__endpoints:
+            self.__endpoints[key] = Endpoint(ip, port, self.__limits.get(key, self.__max_sessions),
+                                             self.__reconnect_delay, self.__factory)
+        return self.__endpoints[key]
+
+
+class AsyncEndpoint(object):
+    """ Shared asyncio clients of one ip:port and reconnect state machine """
+    def __init__(self, ip: str, port: int, max_sessions: int = MAX_SESSIONS,
+                 reconnect_delay: float = RECONNECT_DELAY, timeout: float = DEFAULT_TIMEOUT):
+        assert max_sessions > 0
+        self.ip = ip
+        self.port = port
+        self.max_sessions = max_sessions
+        self.reconnect_delay = reconnect_delay
+        self.timeout = timeout
+        self.users = 0              # number of devices using the endpoint
+        self.__clients = []
+        self.__connecting = None    # asyncio.Future of current connection attempt
+        self.__retry_at = 0.0
+
+    def state(self) -> LinkState:
+        if self.__connecting is not None:
+            return LinkState.CONNECTING
+        if any(client.is_connected() for client in self.__clients):
+            return LinkState.CONNECTED
+        if time.monotonic() < self.__retry_at:
+            return LinkState.WAITING
+        return LinkState.DISCONNECTED
+
+    def retryIn(self) -> float:
+        return max(self.__retry_at - time.monotonic(), 0.0)
+
+    async def acquire(self, pipeline_depth: int = 1) -> AsyncModbusTcpClient:
+        """
+        Returns the least loaded connected client, opens new session while it's allowed.
+        Clients are shared: requests of devices are serialized or pipelined by the client,
+        pipeline depth of the client is increased up to the largest depth requested by devices
+        (each device limits its own in-flight requests, see AsyncEngine).
+        raise NotConnectedError - connection has failed or next attempt is delayed
+        """
+        self.__clients = [client for client in self.__clients if client.is_connected()]
+        idle = [client for client in self.__clients if not client.in_flight()]
+        if idle or len(self.__clients) >= self.max_sessions:
+            client = min(idle or self.__clients, key=lambda client: client.in_flight())
+            client.setPipelineDepth(pipeline_depth)
+            return client
+
+        if self.__connecting is not None:
+            # single reconnect: wait for result of the attempt in progress
+            await asyncio.shield(self.__connecting)
+            return await self.acquire(pipeline_depth)
+        if not self.__clients and time.monotonic() < self.__retry_at:
+            raise NotConnectedError("no connection with {0}:{1}".format(self.ip, self.port))
+
+        self.__connecting = asyncio.get_running_loop().create_future()
+        client = AsyncModbusTcpClient(self.ip, self.port, timeout=self.timeout, pipeline_depth=pipeline_depth)
+        try:
+            await client.connect()
+        except (OSError, asyncio.TimeoutError) as err:
+            if not self.__clients:
+                self.__retry_at = time.monotonic() + self.reconnect_delay
+                raise NotConnectedError("no connection with {0}:{1}".format(self.ip, self.port)) from err
+            client = min(self.__clients, key=lambda client: client.in_flight())
+            client.setPipelineDepth(pipeline_depth)
+            return client
+        finally:
+            self.__connecting.set_result(None)
+            self.__connecting = None
+        self.__retry_at = 0.0
+        self.__clients.append(client)
+        return client
+
+    def close(self):
+        for client in self.__clients:
+            client.close()
+        self.__clients.clear()
+
+
+class AsyncConnectionPool(object):
+    """ Pool of endpoints for AsyncEngine (used inside its event loop only) """
+    def __init__(self, max_sessions: int = MAX_SESSIONS, reconnect_delay: float = RECONNECT_DELAY,
+                 timeout: float = DEFAULT_TIMEOUT):
+        self.__max_sessions = max_sessions
+        self.__reconnect_delay = reconnect_delay
+        self.__timeout = timeout
+        self.__limits = {}          # (ip, port) -> max sessions
+        self.__endpoints = {}       # (ip, port) -> AsyncEndpoint
+
+    def setSessionLimit(self, ip: str, port: int, max_sessions: int):
+        assert max_sessions > 0
+        self.__limits[(ip, port)] = max_sessions
+        if (ip, port) in self.__endpoints:
+            self.__endpoints[(ip, port)].max_sessions = max_sessions
+
+    def attach(self, ip: str, port: int) -> AsyncEndpoint:
+        """ Returns endpoint for a device, the endpoint is created on first use """
+        key = (ip, port)
+        if key not in self.__endpoints:
+            self.__endpoints[key] = AsyncEndpoint(ip, port, self.__limits.get(key, self.__max_sessions),
+                                                  self.__reconnect_delay, self.__timeout)
+        endpoint = self.__endpoints[key]
+        endpoint.users += 1
+        return endpoint
+
+    def detach(self, endpoint: AsyncEndpoint):
+        """ Releases endpoint of a device, connections are closed when no device uses it """
+        endpoint.users -= 1
+        if endpoint.users <= 0:
+            endpoint.close()
+            self.__endpoints.pop((endpoint.ip, endpoint.port), None)
+
+    def close(self):
+        for endpoint in self.__endpoints.values():
+            endpoint.close()
+        self.__endpoints.clear()
@@ -23,6 +23,10 @@ from PyQt5 import QtWidgets
 from PyQt5.QtCore import QObject
 
 from MBTools.drivers.modbus.ModbusDriver import ModbusDriver, Device, Range, DeviceCreator, DriverCreator, ModbusCalculator, AbsConfControl
+from MBTools.drivers.modbus.RangePlanner import RangePlanner
+from MBTools.utilites.Log import getLogger
+
+log = getLogger("modbus.config")
 
 
 def overrides(interface_class):
@@ -37,8 +41,6 @@ class AbcDriverConf(object):
     Class which configures driver
     """
     def __init__(self):
-        self.__MAX_NUMBERS_IN_RANGE = 100   # Maximum address range from minimum to maximum
-
         self._driver: AbsConfControl = None   # Reference to ModbusDriver
 
     @abstractmethod
@@ -76,9 +78,9 @@ class AbcDriverConf(object):
         @param[in-out] dev - устройство для которого будет перераспределены диапазоны
         @param[in] addresses - полный перечень адресов устройства
         """
-        ranges = ModbusCalculator.split_numbers(addresses, self.__MAX_NUMBERS_IN_RANGE)
+        plan = RangePlanner.plan(addresses, dev.planCost())
         dev.delAllRanges()
-        for i, rng in enumerate(ranges):
+        for i, rng in enumerate(plan.requests):
             dev.addRange(rng[0], rng[1] - rng[0] + 1, "range{}".format(i))
 
 
@@ -108,20 +110,20 @@ class ModbusDriverConf(QObject, AbcDriverConf):
         if dev in devs:
             # print("\tAdd: dev {0} is exists".format(dev.name()))
             if not add_addresses:
-                print("\tNothing to add")
+                log.debug("%s: nothing to add", dev.name())
                 return None
             else:
                 # print("\tNew ranges will be crerated to {}".format(dev.name()))
                 new_addresses = old_addresses + add_addresses
                 self._update_ranges(dev, new_addresses)
-                print("\tNew ranges has been created for {}".format(dev.name()))
+                log.info("%s: new ranges have been created", dev.name())
                 return None
         else:
             # print("\tAdd: dev {0} isn't exists".format(dev.name()))
             new_addresses = old_addresses + add_addresses
             self._update_ranges(dev, new_addresses)
             self._driver.addDevice(dev)
-            print("\tDevice's been  added: {}".format(dev.name()))
+            log.info("%s: device has been added", dev.name())
             return None
 
         assert False, "End of ModbusDriverConf::add_addreses"
@@ -140,7 +142,7 @@ class ModbusDriverConf(QObject, AbcDriverConf):
         devs = self._driver.devices()
         # if the device does not exist, do nothing
         if dev not in devs:
-            print("Del: dev {} isn't exists".format(dev.name()))
+            log.info("del: device %s doesn't exist", dev.name())
             return None
 
         # 1. Calculate a new up-to-date list of addresses
@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+# -----------------------------------------------------------
+# This module contains conflating mailbox of the latest values
+#
+# (C) 2021 Maxim Kozyakov, Voronezh, Russia
+# Released under GNU Public License (MIT)
+# email kmmax@yandex.ru
+# -----------------------------------------------------------
+
+"""
+Модуль Mailbox.py
+Назначение:
+Передача обновлений из потоков опроса потребителю (поток GUI) без очереди всех событий.
+- для каждого ключа (устройство, range) хранится только последнее значение, повторное обновление
+  ключа, который еще не забран, заменяет значение (conflation);
+- потребитель забирает все "грязные" ключи (drain) в своем темпе, поэтому размер ящика
+  не больше числа ranges, а задержка - не больше одного цикла потребителя при любой его скорости;
+- put возвращает True, если ящик был пуст: только тогда потребителя нужно разбудить,
+  так что в очереди событий потребителя не больше одного уведомления.
+Ключи забираются в порядке их первого обновления после предыдущего drain.
+"""
+
+import threading
+
+
+class Mailbox(object):
+    """ Latest values by keys, filled by any thread, drained by the consumer """
+    def __init__(self):
+        self.__lock = threading.Lock()
+        self.__dirty = {}       # key -> latest value (not taken by the consumer)
+
+    def put(self, key, value) -> bool:
+        """ Stores the latest value of the key, returns True if the consumer should be woken up """
+        with self.__lock:
+            wakeup = not self.__dirty
+            self.__dirty[key] = value
+        return wakeup
+
+    def putMany(self, items) -> bool:
+        """ Stores latest values [(key, value), ...] at once (see put) """
+        with self.__lock:
+            wakeup = not self.__dirty
+            self.__dirty.update(items)
+            return wakeup and bool(self.__dirty)
+
+    def drain(self) -> list:
+        """ Returns latest values of all updated keys and clears the mailbox """
+        with self.__lock:
+            values = list(self.__dirty.values())
+            self.__dirty.clear()
+        return values
+
+    def __len__(self):
+        with self.__lock:
+            return len(self.__dirty)
@@ -1,18 +1,44 @@
 # -*- coding: utf-8 -*-
 # import pymodbus.pdu
-from PyQt5 import QtCore, QtWidgets
-from PyQt5.QtCore import *
 from pymodbus.client.sync import ModbusTcpClient
+from pymodbus.pdu import ExceptionResponse
 import time
 import sys
 import enum
+import threading
+from array import array
 import numpy as np
 from abc import ABC, abstractmethod
+import logging
+from MBTools.utilites import Log
+from MBTools.drivers.modbus.RangePlanner import PlanCost
+from MBTools.drivers.modbus.RangeIndex import RangeIndex
+from MBTools.drivers.modbus.WriteQueue import WriteQueue, WriteBatch, MaskBatch, WriteError
+from MBTools.drivers.modbus.ConnectionPool import ConnectionPool, NotConnectedError
+from MBTools.drivers.modbus.CircuitBreaker import CircuitBreaker, BreakerState
+from MBTools.drivers.modbus.AsyncClient import ModbusError
+from MBTools.drivers.modbus.Timestamp import Timestamp, WallClock
+from MBTools.utilites.Log import getLogger
+from MBTools.utilites.Signal import Signal
+
+log = getLogger("modbus.device")
 
 DEFAULT_IP = "127.0.0.1"      # default ip address of modbus server
 DEFAULT_PORT = 502            # default port of modbus server
+DEFAULT_UNIT = 1              # default unit id of modbus server
 # NUMBER = 50                 # number of registers
-REQUEST_DELAY = 0.5           # default delay between requests, sec
+REQUEST_DELAY = 0.5           # default delay between requests (default scan rate), sec
+PIPELINE_DEPTH = 1            # default number of in-flight requests per connection (async engine)
+HEARTBEAT = None              # default period of re-emitting not changed ranges, sec (None - never)
+BATCH_WINDOW = None           # default window of batched notifications of driver, sec (None - per range)
+
+""" Scan classes: named polling periods of ranges, sec """
+SCAN_CLASSES = {
+    "fast": 0.1,
+    "normal": 1.0,
+    "slow": 10.0,
+    "rare": 60.0,
+}
 
 
 def overrides(interface_class):
@@ -22,7 +48,7 @@ def overrides(interface_class):
     return overrider
 
 
-lock = QtCore.QMutex()
+lock = threading.Lock()
 
 """ Tag qulity """
 @enum.unique
@@ -87,6 +113,7 @@ class AbsModbus:
     def __init__(self):
         self._name = "name"
         self._comment = "comment"
+        self._object_name = ""
 
     @abstractmethod
     def ranges(self):
@@ -106,6 +133,12 @@ class AbsModbus:
     def _setComment(self, name: str):
         self._comment
 
+    def setObjectName(self, name: str):
+        self._object_name = name
+
+    def objectName(self) -> str:
+        return self._object_name
+
     def name(self):
         return self._name
 
@@ -117,19 +150,31 @@ class AbsModbus:
         self._setComment()
 
 
-class Range(QObject, AbsModbus):
-    """ Class represents one continuous range of modbus registers """
+class Range(AbsModbus):
+    """
+    Class represents one continuous range of modbus registers.
+    Registers are kept in preallocated array('H') which is updated in place,
+    registers()/reristersNum() return memoryview without copying
+    (values of a view are changed by next polling, copy them to keep a snapshot).
+    New registers are compared with previous ones, so the device emits only changed ranges.
+    """
     id = 0
 
-    def __init__(self, size: int = 0, parent=None):
-        QObject.__init__(self, parent)
+    def __init__(self, size: int = 0):
         AbsModbus.__init__(self)
 
         self.__address = 0                   # first registers address
-        self.__map = [0] * size              # continuous sequence of modbus registers
+        self.__map = array('H', bytes(2 * size))    # continuous sequence of modbus registers
+        self.__view = memoryview(self.__map)        # zero-copy access to registers
+        self.__changed = None                # mask of registers changed since last publishing
+        self.__quality_changed = False       # quality changed since last publishing
+        self.__mask = np.zeros(size, dtype=bool)    # changed registers of last publishing
+        self.__published = 0.0               # time of last publishing (time.monotonic)
         self.__quality = QualityEnum.UNDEF   # quality
-        self.__time = time.localtime()       # last time of updating
+        self.__stamp = Timestamp.now()       # last time of updating
         self.__id = 0                        # ID
+        self.__scan_rate = REQUEST_DELAY     # polling period, sec
+        self.__next_scan = 0.0               # time of next polling (time.monotonic)
 
         self.__id = Range.id + 1
         Range.id = self.__id
@@ -139,7 +184,7 @@ class Range(QObject, AbsModbus):
 
     def isAddressExists(self, address: int) -> bool:
         """ returns True if modbus item uses register with pointed address """
-        return address in range(self.__address, self.__address + self.number())
+        return 0 <= address - self.__address < len(self.__map)
 
     def ranges(self) -> list:
         """ AbsModbus interface Returns all ranges of item.  In this case, returns itself. """
@@ -167,44 +212,89 @@ class Range(QObject, AbsModbus):
     def number(self) -> int:
         return len(self.__map)
 
-    def setRegisters(self, registers: list, quality=QualityEnum.UNDEF):
-        if len(self.__map) < len(registers):
-            self.__map = registers[:len(self.__map)]
-        else:
-            self.__map = list(registers)
+    def setRegisters(self, registers: list, quality=QualityEnum.UNDEF, stamp: Timestamp = None):
+        """ Sets registers, stamp - time of request and response (None - now) """
+        self.__store(array('H', registers[:len(self.__map)]))
+        self.setQuality(quality)
+        self.__stamp = stamp or Timestamp.now()
+        self.updateInfo()
 
-        self.__quality = quality
-        self.__time = time.localtime()
+    def setRegistersBytes(self, payload: bytes, quality=QualityEnum.UNDEF, stamp: Timestamp = None):
+        """ Sets registers from big-endian bytes of modbus response (in place, without lists),
+        stamp - time of request and response (None - now) """
+        size = len(self.__map)
+        registers = array('H')
+        registers.frombytes(payload[:min(2 * size, len(payload) & ~1)])
+        if 'little' == sys.byteorder:
+            registers.byteswap()
+        self.__store(registers)
+        self.setQuality(quality)
+        self.__stamp = stamp or Timestamp.now()
         self.updateInfo()
 
     def setQuality(self, quality):
+        if quality != self.__quality:
+            self.__quality_changed = True
         self.__quality = quality
 
-    def registers(self):
-        return self.__map
+    def isChanged(self) -> bool:
+        """ Returns True if registers or quality have changed since last publishing """
+        return self.__changed is not None or self.__quality_changed
+
+    def changedMask(self) -> np.ndarray:
+        """ Returns mask (numpy bool array) of registers changed in last publishing of the range """
+        return self.__mask
+
+    def publishedAt(self) -> float:
+        """ Returns time (time.monotonic) of last publishing """
+        return self.__published
+
+    def registers(self) -> memoryview:
+        return self.__view
 
     def reristersNum(self, addr: int, num: int):
-        """ Returns values of num registers from address = addr """
+        """ Returns values of num registers from address = addr (memoryview, without copying) """
         index = addr - self.__address
-        if index + num > len(self.__map):
+        if index < 0 or index + num > len(self.__map):
             return None
-        return self.__map[index: index + num]
+        return self.__view[index: index + num]
 
     def register(self, addr: int):
-        """
-        returns value by register address
-        \todo check the vallidity of the index
-        """
+        """ returns value by register address, None if the range hasn't the address """
         index = addr - self.__address
-        if index > len(self.__map):
+        if not 0 <= index < len(self.__map):
             return None
-        return self.__map[index]
+        return self.__view[index]
 
     def quality(self):
         return self.__quality
 
-    def time(self):
-        return self.__time
+    def time(self) -> time.struct_time:
+        """ Returns wall time of last updating (struct_time is created on demand) """
+        return self.__stamp.localtime()
+
+    def timestamp(self) -> Timestamp:
+        """ Returns monotonic times of request and response and wall time in ns """
+        return self.__stamp
+
+    def setScanRate(self, rate: float):
+        """ Sets polling period of the range, sec """
+        assert rate > 0
+        self.__scan_rate = rate
+        self.__next_scan = 0.0
+
+    def scanRate(self) -> float:
+        return self.__scan_rate
+
+    def nextScan(self) -> float:
+        """ Returns time (time.monotonic) of next polling """
+        return self.__next_scan
+
+    def scheduleScan(self, now: float):
+        """ Plans next polling. Phase is kept, missed periods are skipped """
+        self.__next_scan += self.__scan_rate
+        if self.__next_scan <= now:
+            self.__next_scan = now + self.__scan_rate
 
     # ---------- Protected ----------
     def _setName(self):
@@ -213,40 +303,73 @@ class Range(QObject, AbsModbus):
     def _setComment(self):
         self._comment = "{0}..{1}".format(self.address(), self.number())
 
+    def _markPublished(self, now: float):
+        """ Called by device on emitting the range, resets change tracking """
+        self.__mask = self.__changed if self.__changed is not None else np.zeros(len(self.__map), dtype=bool)
+        self.__changed = None
+        self.__quality_changed = False
+        self.__published = now
+
     # ---------- Privat -----------
+    def __store(self, registers: array):
+        """ Copies new registers to the buffer and accumulates mask of changed registers """
+        if len(registers) != len(self.__map):
+            # shorter response: buffer is replaced (views of old buffer stay valid)
+            self.__map = registers
+            self.__view = memoryview(self.__map)
+            self.__changed = np.ones(len(registers), dtype=bool)
+            return
+
+        mask = np.frombuffer(registers, dtype=np.uint16) != np.frombuffer(self.__map, dtype=np.uint16)
+        if not mask.any():
+            return
+        self.__changed = mask if self.__changed is None else self.__changed | mask
+        # single copy to the buffer, so readers never see half-converted registers
+        self.__view[:] = registers
+
     def __str__(self):
         """ data[id]: [addr:num] time [quality] registers """
         return "data{0}: {1} [addr={2}:num={3}] {4}: {5}".format(
             self.__id,
-            "{:02}:{:02}:{:02}".format(self.__time.tm_hour, self.__time.tm_min, self.__time.tm_sec, self.__time),
+            time.strftime("%H:%M:%S", self.time()),
             self.__address, len(self.__map),
             QualityEnumStr[self.__quality],
-            self.__map[:50]) # will be shown only 50 registers
+            self.__view[:50].tolist()) # will be shown only 50 registers
 
     def __len__(self):
         return len(self.__map)
 
 
-class Device(QObject, AbsModbus):
+class Device(AbsModbus):
     """
-    Class pools modbus server
+    Class pools modbus server.
+    Signals are called in the polling thread (see QtDriver for delivering them to Qt GUI thread)
     """
-    dataChanged = pyqtSignal(Range)
-    rangeNumberChanged = pyqtSignal()
-    finished = pyqtSignal()
-    runningChanged = pyqtSignal(bool)
-
-    def __init__(self, ip=DEFAULT_IP, port=DEFAULT_PORT,  parent=None):
-        super().__init__(parent)
+    dataChanged = Signal(Range)
+    rangesChanged = Signal(list)    # ranges emitted by one poll cycle (after their dataChanged)
+    rangeNumberChanged = Signal()
+    finished = Signal()
+    runningChanged = Signal(bool)
+
+    def __init__(self, ip=DEFAULT_IP, port=DEFAULT_PORT, unit=DEFAULT_UNIT):
+        super().__init__()
         self.__ranges = []       # ranges of modbus registers (separated requists)
+        self.__index = RangeIndex()  # ranges by addresses
         self.__ip = ip           # ip address of modbus server
         self.__port = port       # port of modbus server
+        self.__unit = unit       # unit id (devices behind one gateway share ip:port)
         self.__driver = None
+        self.__pool = None       # connections shared with other devices (set by driver)
+        self.__breaker = CircuitBreaker()   # stops polling of not available device
+        self.__plan_cost = PlanCost()   # cost parameters for planning of requests
+        self.__pipeline_depth = PIPELINE_DEPTH  # in-flight requests (used by async engine)
+        self.__heartbeat = HEARTBEAT    # period of re-emitting not changed ranges
+        self.__mask_write = False       # bits are written by FC22 (otherwise read-modify-write)
+        self.__clock = WallClock()      # wall time of responses (synchronized every cycle)
+        self.__cycle = None             # ranges emitted by current poll cycle (None - out of cycle)
 
         # For using on writing commangs
-        self.__writeAddr = 0
-        self.__writeValue = 0
-        self._writeFlag = False
+        self.__write_queue = WriteQueue()
         # self.updateInfo()
 
         # Flags
@@ -260,11 +383,79 @@ class Device(QObject, AbsModbus):
         """ Returns port number of modbus server """
         return self.__port
 
+    def unit(self):
+        """ Returns unit id of modbus server """
+        return self.__unit
+
+    def setPool(self, pool: ConnectionPool):
+        """ Sets pool of connections shared by devices of the driver (thread engine) """
+        self.__pool = pool
+
+    def setHeartbeat(self, interval: float = None):
+        """
+        Sets period of re-emitting ranges which haven't changed, sec.
+        None - only changed ranges (registers or quality) are emitted.
+        """
+        assert interval is None or interval > 0
+        self.__heartbeat = interval
+
+    def heartbeat(self) -> float:
+        return self.__heartbeat
+
+    def setMaskWrite(self, enabled: bool):
+        """
+        Sets writing of bits by mask write register (FC22) if the server supports it,
+        otherwise bits are written by reading and writing of the register in one session
+        """
+        self.__mask_write = enabled
+
+    def maskWrite(self) -> bool:
+        return self.__mask_write
+
+    def setCircuitBreaker(self, breaker: CircuitBreaker):
+        self.__breaker = breaker
+
+    def circuitBreaker(self) -> CircuitBreaker:
+        return self.__breaker
+
     def isAddressExists(self, address: int) -> bool:
-        for range in self.__ranges:
-            if range.isAddressExists(address):
-                return True
-        return False
+        return self.__index.find(address) is not None
+
+    def rangeByAddress(self, address: int):
+        """ returns range which reads register with the address, otherwise None """
+        return self.__index.find(address)
+
+    def isSpanExists(self, address: int, size: int = 1) -> bool:
+        """ returns True if all registers address..address+size-1 are read by one range """
+        return self.spanRange(address, size) is not None
+
+    def spanRange(self, address: int, size: int = 1):
+        """ returns range which reads all registers address..address+size-1, otherwise None """
+        return self.__index.find(address, size)
+
+    def setPlanCost(self, cost: PlanCost):
+        """ Sets cost parameters of requests (see RangePlanner) """
+        self.__plan_cost = cost
+
+    def planCost(self) -> PlanCost:
+        return self.__plan_cost
+
+    def setPipelineDepth(self, depth: int):
+        """
+        Sets number of requests sent without waiting for replies.
+        Supported by the async engine only, the thread engine always sends requests one by one.
+        """
+        assert depth > 0
+        self.__pipeline_depth = depth
+
+    def pipelineDepth(self) -> int:
+        return self.__pipeline_depth
+
+    def estimatedCycleTime(self) -> float:
+        """ Returns estimated time of polling all ranges once, sec (round-trips are shared by pipeline) """
+        registers = sum(data.number() for data in self.__ranges)
+        round_trips = -(-len(self.__ranges) // self.__pipeline_depth)
+        return round_trips * self.__plan_cost.request_cost + registers * self.__plan_cost.register_cost
 
     def _setName(self):
         self._name = self.objectName()
@@ -272,12 +463,13 @@ class Device(QObject, AbsModbus):
     def _setComment(self):
         self._comment = "{0}:{1}".format(self.__ip, self.__port)
 
-    def addRange(self, addr, num, name: str = '?') -> Range:
+    def addRange(self, addr, num, name: str = '?', scan_rate: float = None) -> Range:
         """
         Adds new range of modbus numbers (this will be new request)
         :param addr: Start address
         :param num: Number of registers
         :param name: Name of registers range
+        :param scan_rate: Polling period of the range, sec (None - REQUEST_DELAY)
         :return: object with represents this modbus range
 
         \todo This method should itself reallocate the ranges based on the existing ranges
@@ -286,18 +478,23 @@ class Device(QObject, AbsModbus):
         data = Range(num)
         data.setAddress(addr)
         data.setObjectName(name)
+        if scan_rate is not None:
+            data.setScanRate(scan_rate)
         self.__ranges.append(data)
+        self.__index.add(data)
         self.rangeNumberChanged.emit()
         return data
 
     def delRange(self, data: Range) -> bool:
-        print("{0}: Device::delRange".format(self.name()))
+        log.debug("%s: Device::delRange", self.name())
         self.__ranges.remove(data)
+        self.__index.remove(data)
         self.rangeNumberChanged.emit()
         return True
 
     def delAllRanges(self):
         self.__ranges.clear()
+        self.__index.clear()
         self.rangeNumberChanged.emit()
         return True
 
@@ -305,6 +502,7 @@ class Device(QObject, AbsModbus):
         for data in self.__ranges:
             if data.dataId() == id:
                 self.__ranges.remove(data)
+                self.__index.remove(data)
                 self.rangeNumberChanged.emit()
                 return True
         return False
@@ -319,73 +517,272 @@ class Device(QObject, AbsModbus):
     def ranges(self):
         return self.__ranges
 
-    @pyqtSlot()
     def start(self):
         """ Starts loop polling process """
-        # print("TagList::start")
-        print("{0}: Device::start".format(self.name()))
+        log.debug("%s: Device::start", self.name())
         # self.is_running = True
         self.is_running = True
         self.loop()
 
-    # @pyqtSlot()
     def stop(self):
         """ Stops loop polling process """
-        print("TagList::stop")
+        log.debug("%s: Device::stop", self.name())
         self.is_running = False
 
     def loop(self):
-        # print("TagList::loop")
-        print("{0}: Device::loop".format(self.name()))
-        n = 0
-        client = ModbusTcpClient(self.__ip, self.__port)
+        log.debug("%s: Device::loop", self.name())
+        pool = self.__pool if self.__pool is not None else ConnectionPool()
         while self.is_running:
-            for data in self.__ranges:
-                try:
-                    if client.is_socket_open():
-                        if self._writeFlag:
-                            client.write_register(self.__writeAddr, self.__writeValue)
-                            print("<- {0}: {1}".format(self.__writeAddr, self.__writeValue))
-                            self._writeFlag = False
-                        result = client.read_holding_registers(data.address(), data.number())
-                        data.setRegisters(result.registers, QualityEnum.GOOD)
-                        with QtCore.QMutexLocker(lock):
-                            print(data)
-                            if data:
-                                self.dataChanged.emit(data)
-                    else:
-                        for d in self.__ranges:
-                            d.setQuality(QualityEnum.NO_CONNET)
-                            with QtCore.QMutexLocker(lock):
-                                self.dataChanged.emit(d)
-                        print("connecting to {0}:{1}".format(self.__ip, client.port))
-                        client.connect()
-                        time.sleep(1)
-
-                except Exception as err:
-                    print(err)
-                    data.setQuality(QualityEnum.NO_CONNET)
-                    with QtCore.QMutexLocker(lock):
-                        self.dataChanged.emit(data)
-            time.sleep(REQUEST_DELAY)
-
-        client.close()
-        for d in self.__ranges:
-            d.setQuality(QualityEnum.DRV_NOT_STARTED)
-            self.dataChanged.emit(d)
+            now = time.monotonic()
+            if not self.__breaker.allow(now):
+                self._failWrites(ConnectionError("device {0} is not available".format(self.name())))
+            elif BreakerState.HALF_OPEN == self.__breaker.state():
+                self.__probe(pool)
+            else:
+                self._beginCycle()
+                for data in self._dueRanges(now):
+                    try:
+                        sent_ns = time.monotonic_ns()
+                        registers = self.__request(pool, data.address(), data.number())
+                        data.setRegisters(registers, QualityEnum.GOOD, self._stamp(sent_ns))
+                        self._linkOk()
+                    except ModbusError as err:
+                        log.warning("%s: %s", self.name(), err, extra={"key": self.name()})
+                        data.setQuality(QualityEnum.REQUEST_ERROR)
+                        self._linkOk()
+                    except Exception as err:
+                        log.warning("%s: %s", self.name(), err, extra={"key": self.name()})
+                        if self._linkFailed(err, isinstance(err, NotConnectedError)):
+                            break
+                        data.setQuality(QualityEnum.NO_CONNET)
+                    log.debug("%s", data)
+                    self._publish(data)
+                self._endCycle()
+
+                # commands are not delayed till the next scan of ranges
+                if len(self.__write_queue) and BreakerState.CLOSED == self.__breaker.state():
+                    try:
+                        with pool.session(self.__ip, self.__port) as client:
+                            self._flushWrites(client)
+                    except Exception as err:
+                        log.warning("%s: %s", self.name(), err, extra={"key": self.name()})
+                        self._failWrites(err)
+                        self._linkFailed(err, isinstance(err, NotConnectedError))
+            time.sleep(self._waitTime(time.monotonic()))
+
+        if self.__pool is None:
+            pool.close()
+        self._failWrites(ConnectionError("device {0} is stopped".format(self.name())))
+        self._setQuality(QualityEnum.DRV_NOT_STARTED)
 
         self.finished.emit()
 
-    @pyqtSlot(int, int)
+    def write(self, addr: int, values):
+        """
+        Queues writing of values (int or list of int) to registers from address addr.
+        Repeated writing to the same address replaces the value, adjacent addresses
+        are written by one request (FC16). Commands are sent ahead of the next read.
+        :return: concurrent.futures.Future with True or exception (WriteError, ConnectionError,
+                 ValueError - value isn't an integer 0..0xFFFF)
+        """
+        return self.__write_queue.put(addr, values)
+
+    def writeMany(self, commands) -> list:
+        """
+        Queues commands [(addr, values), ...] at once: adjacent registers of different commands
+        are written by one request
+        :return: list of concurrent.futures.Future (one per command, see write)
+        """
+        return self.__write_queue.putMany(commands)
+
+    def writeBits(self, bits) -> list:
+        """
+        Queues writing of bits [(addr, bit_number, value), ...], other bits of the registers are kept.
+        Bits of one register are merged till the queue is sent and written by one command
+        (FC22 or read-modify-write, see setMaskWrite)
+        :return: list of concurrent.futures.Future (one per bit, see write)
+        """
+        return self.__write_queue.putBits(bits)
+
+    def writeBit(self, addr: int, bit_number: int, value: bool):
+        """ Queues writing of one bit (see writeBits) """
+        return self.writeBits([(addr, bit_number, value)])[0]
+
     def writeRegisters(self, addr, value):
-        print("{0}::writeRegisters".format(__class__))
-        self.__writeAddr = addr
-        self.__writeValue = value
-        self._writeFlag = True
+        log.debug("%s: writeRegisters %s <- %s", self.name(), addr, value)
+        return self.write(addr, value)
 
-    @pyqtSlot(int, int)
-    def readRegisters(self, addr, num):
-        pass
+    def readRegisters(self, addr, num) -> list:
+        """
+        Reads registers by separate request (in the calling thread, session of the device pool)
+        raise ModbusError - server has answered by exception response
+        raise Exception - link failure
+        """
+        pool = self.__pool if self.__pool is not None else ConnectionPool()
+        try:
+            return self.__request(pool, addr, num, flush=False)
+        finally:
+            if self.__pool is None:
+                pool.close()
+
+    def __request(self, pool: ConnectionPool, address: int, count: int, flush: bool = True) -> list:
+        """
+        Sends pending write commands and reads registers by session of the pool
+        raise ModbusError - server has answered by exception response
+        raise Exception - link failure (NotConnectedError - no connection)
+        """
+        with pool.session(self.__ip, self.__port) as client:
+            if flush:
+                self._flushWrites(client)
+            result = client.read_holding_registers(address, count, unit=self.__unit)
+            if result.isError() and not isinstance(result, ExceptionResponse):
+                raise ConnectionError(str(result))
+        if isinstance(result, ExceptionResponse):
+            raise ModbusError(result.original_code, result.exception_code)
+        return result.registers
+
+    def __probe(self, pool: ConnectionPool):
+        """ Sends single cheap request to check the link when circuit breaker is half-open """
+        try:
+            self.__request(pool, self._probeAddress(), 1, flush=False)
+        except ModbusError:
+            pass
+        except Exception as err:
+            log.warning("%s: probe: %s", self.name(), err, extra={"key": self.name()})
+            self._linkFailed(err, isinstance(err, NotConnectedError))
+            return
+        self._linkOk()
+
+    # ---------- Protected (used by polling engines) ----------
+    def _publish(self, data: Range) -> bool:
+        """
+        Notifies about new data of the range if registers or quality have changed
+        (or heartbeat period has passed). Returns True if the range has been emitted
+        """
+        now = time.monotonic()
+        if not data.isChanged():
+            if self.__heartbeat is None or now - data.publishedAt() < self.__heartbeat:
+                return False
+        with lock:
+            if not data:
+                return False
+            data._markPublished(now)
+            self.dataChanged.emit(data)
+        if self.__cycle is not None:
+            self.__cycle.append(data)
+        else:
+            self.rangesChanged.emit([data])
+        return True
+
+    def _beginCycle(self):
+        """ Starts poll cycle: ranges emitted till _endCycle are notified by one rangesChanged """
+        self.__cycle = []
+
+    def _endCycle(self):
+        """ Finishes poll cycle, emits rangesChanged if any range has been emitted """
+        cycle, self.__cycle = self.__cycle, None
+        if cycle:
+            self.rangesChanged.emit(cycle)
+
+    def _setQuality(self, quality: QualityEnum):
+        """ Sets quality of all ranges and notifies about it (by one rangesChanged out of poll cycle) """
+        own_cycle = self.__cycle is None
+        if own_cycle:
+            self._beginCycle()
+        for data in self.__ranges:
+            data.setQuality(quality)
+            self._publish(data)
+        if own_cycle:
+            self._endCycle()
+
+    def _dueRanges(self, now: float) -> list:
+        """ Returns ranges whose polling time has come and plans their next polling """
+        self.__clock.sync()
+        due = []
+        for data in list(self.__ranges):
+            if data.nextScan() <= now:
+                due.append(data)
+                data.scheduleScan(now)
+        return due
+
+    def _waitTime(self, now: float) -> float:
+        """ Returns time until next polling of any range, but not more than REQUEST_DELAY
+        (pending commands and stopping are checked at least every REQUEST_DELAY) """
+        wait = REQUEST_DELAY
+        if BreakerState.OPEN == self.__breaker.state():
+            return min(self.__breaker.retryIn(now), wait)
+        for data in list(self.__ranges):
+            wait = min(wait, data.nextScan() - now)
+        return max(wait, 0.0)
+
+    def _stamp(self, sent_ns: int) -> Timestamp:
+        """ Returns timestamp of response received now to request sent at sent_ns (time.monotonic_ns) """
+        return self.__clock.stamp(sent_ns)
+
+    def _probeAddress(self) -> int:
+        """ Returns address of register which is read by probe request """
+        return self.__ranges[0].address() if self.__ranges else 0
+
+    def _linkOk(self):
+        """ Request has been answered """
+        self.__breaker.success()
+
+    def _linkFailed(self, error: Exception, fatal: bool = False) -> bool:
+        """
+        Counts failure of request. When circuit breaker opens, all ranges get NO_CONNET at once
+        and pending write commands are failed.
+        :param fatal: opens the breaker at once (no connection with device)
+        :return: True if the breaker has been opened
+        """
+        if not self.__breaker.failure(time.monotonic(), fatal):
+            return False
+        log.warning("%s: polling is suspended for %.2fs", self.name(),
+                    self.__breaker.retryIn(time.monotonic()), extra={"key": self.name()})
+        self._setQuality(QualityEnum.NO_CONNET)
+        self._failWrites(error)
+        return True
+
+    def _takeWrites(self) -> list:
+        """ Returns pending write commands as list of WriteBatch and clears the queue """
+        return self.__write_queue.take()
+
+    def _writeDone(self, batch: WriteBatch, error: Exception = None):
+        """ Notifies callers about result of the batch writing """
+        self.__write_queue.done(batch, error)
+
+    def _failWrites(self, error: Exception):
+        """ Finishes all pending write commands with error """
+        self.__write_queue.fail(error)
+
+    def _flushWrites(self, client: ModbusTcpClient):
+        """ Writes pending commands by synchronous pymodbus client """
+        batches = self._takeWrites()
+        for i, batch in enumerate(batches):
+            try:
+                if isinstance(batch, MaskBatch):
+                    result = self.__writeMask(client, batch)
+                elif 1 == len(batch):
+                    result = client.write_register(batch.address, batch.values[0], unit=self.__unit)
+                else:
+                    result = client.write_registers(batch.address, batch.values, unit=self.__unit)
+            except Exception as err:
+                for rest in batches[i:]:
+                    self._writeDone(rest, err)
+                raise
+            if result.isError():
+                self._writeDone(batch, WriteError(str(result)))
+            else:
+                log.debug("%s: <- %s", self.name(), batch)
+                self._writeDone(batch)
+
+    def __writeMask(self, client: ModbusTcpClient, batch: MaskBatch):
+        """ Writes bits of the register by FC22 or by reading and writing of the register """
+        if self.__mask_write:
+            return client.mask_write_register(batch.address, batch.and_mask, batch.or_mask, unit=self.__unit)
+        result = client.read_holding_registers(batch.address, 1, unit=self.__unit)
+        if result.isError():
+            return result
+        return client.write_register(batch.address, batch.apply(result.registers[0]), unit=self.__unit)
 
     def setDriver(self, driver):
         self.__driver = driver
@@ -400,6 +797,13 @@ class Device(QObject, AbsModbus):
         return msg
 
 
+@enum.unique
+class EngineType(enum.Enum):
+    """ Polling engine of modbus driver """
+    THREAD = 1      # every device is polled in its own thread (Device.loop)
+    ASYNC = 2       # all devices are polled on single asyncio event loop (AsyncEngine)
+
+
 class AbsConfControl(object):
     @abstractmethod
     def addDevice(self, device: Device):
@@ -414,47 +818,68 @@ class AbsConfControl(object):
         pass
 
 
-class AbsDataChange(QObject):
-    @QtCore.pyqtSlot(Range)
-    def onDataChanged(self, data: Range):
-        sender = self.sender()
-        self.dataChanged.emit(sender.objectName(), data)
+class AbsDataChange(object):
+    @abstractmethod
+    def onDataChanged(self, data: Range, device: Device):
+        """ New data of the range has been read by the device """
+        pass
 
-    @QtCore.pyqtSlot(int, int)
+    @abstractmethod
     def onCmdReady(self, addr: int, value: int, device: Device = None):
-        """
-        Sends value for writing to register using address for all devices which has this address
-        :param addr: address of register for writing
-        :param value: value for writing
-        :return:
-        """
-        for device in self.__devices.keys():
-            if device.isAddressExists(addr):
-                device.writeRegisters(addr, value)
-        # TODO make this method by using signal, now it'not work
-        # self.cmdSent.emit(addr, value)
+        """ Sends value for writing to register using address """
+        pass
 
 
 class ModbusDriver(AbsDataChange, AbsModbus, AbsConfControl):
-    dataChanged = pyqtSignal(str, Range)
-    cmdSent = pyqtSignal(int, int)
-    rangeNumberChanged = pyqtSignal()
-    deviceNumberChanged = pyqtSignal()
-
-    def __init__(self, parent=None):
-        super().__init__(parent)
+    """
+    Modbus driver without Qt: signals are pure python callbacks which are called
+    in polling threads (see QtDriver.QtModbusDriver for Qt signals)
+    """
+    dataChanged = Signal(str, Range)
+    rangesChanged = Signal(list)        # [(device name, Range), ...] (see setBatchWindow)
+    cmdSent = Signal(int, int)
+    rangeNumberChanged = Signal()
+    deviceNumberChanged = Signal()
+
+    def __init__(self, engine: EngineType = EngineType.THREAD):
+        super().__init__()
         self.__name = ""
         self.__comment = ""
-        self.__devices = {}
+        self.__devices = {}             # device -> threading.Thread (None for asyncio engine)
+        self.__slots = {}               # device -> slots connected to device.dataChanged, rangesChanged
+        self.__batch_window = BATCH_WINDOW
+        self.__batch_lock = threading.Lock()
+        self.__batch = {}               # (device name, range id) -> (device name, Range) of current window
+        self.__batch_timer = None       # threading.Timer which emits the window
+        self.__engine_type = engine
+        self.__engine = None
+        self.__pool = ConnectionPool()  # connections shared by devices with the same ip:port
+        if EngineType.ASYNC == engine:
+            from MBTools.drivers.modbus.AsyncEngine import AsyncEngine
+            self.__engine = AsyncEngine()
 
     # ------------------- AbsDataChange -------------------------------------------
-    @QtCore.pyqtSlot(Range)
     @overrides(AbsDataChange)
-    def onDataChanged(self, data: Range):
-        sender = self.sender()
-        self.dataChanged.emit(sender.objectName(), data)
+    def onDataChanged(self, data: Range, device: Device):
+        if self.__batch_window is None:
+            self.dataChanged.emit(device.objectName(), data)
+
+    def onRangesChanged(self, ranges: list, device: Device):
+        """ Ranges emitted by one poll cycle of the device, all batches are emitted by __emitBatch """
+        window = self.__batch_window
+        if window is None:
+            return
+        name = device.objectName()
+        with self.__batch_lock:
+            for data in ranges:
+                self.__batch[(name, data.dataId())] = (name, data)
+            if window > 0 and self.__batch_timer is None:
+                self.__batch_timer = threading.Timer(window, self.__emitBatch)
+                self.__batch_timer.daemon = True
+                self.__batch_timer.start()
+        if 0 == window:
+            self.__emitBatch()
 
-    @QtCore.pyqtSlot(int, int)
     @overrides(AbsDataChange)
     def onCmdReady(self, addr: int, value: int, device: Device = None):
         """
@@ -463,47 +888,64 @@ class ModbusDriver(AbsDataChange, AbsModbus, AbsConfControl):
         :param value: value for writing
         :return:
         """
+        futures = []
         for device in self.__devices.keys():
             if device.isAddressExists(addr):
-                device.writeRegisters(addr, value)
+                futures.append(device.writeRegisters(addr, value))
         # TODO make this method by using signal, now it'not work
         # self.cmdSent.emit(addr, value)
+        return futures
 
     # ------------------- AbsConfControl -------------------------------------------
     @overrides(AbsConfControl)
     def addDevice(self, device: Device):
         assert device not in self.__devices
 
-        thread = QThread()
         device.setDriver(self)
-        device.dataChanged.connect(self.onDataChanged)
-        device.rangeNumberChanged.connect(self.rangeNumberChanged)
+        self.__slots[device] = (lambda data: self.onDataChanged(data, device),
+                                lambda ranges: self.onRangesChanged(ranges, device))
+        device.dataChanged.connect(self.__slots[device][0])
+        device.rangesChanged.connect(self.__slots[device][1])
+        device.rangeNumberChanged.connect(self.rangeNumberChanged.emit)
         self.cmdSent.connect(device.writeRegisters)
+
+        if self.__engine is not None:
+            self.__devices[device] = None
+            self.__engine.addDevice(device)
+            self.deviceNumberChanged.emit()
+            return
+
+        self.__pool.attach(device.ip(), device.port())
+        device.setPool(self.__pool)
+
+        device.is_running = True
+        thread = threading.Thread(target=device.start, name="modbus-{0}".format(device.name()), daemon=True)
         self.__devices[device] = thread
-        device.moveToThread(thread)
-        thread.started.connect(device.start)
-        device.finished.connect(thread.terminate)
         thread.start()
         self.deviceNumberChanged.emit()
 
     @overrides(AbsConfControl)
     def delDevice(self, device: Device) -> bool:
-        for dev in self.__devices.keys():
-            print(id(dev))
-
-        if device in self.__devices:
-            print("TagList has found {0}".format(device))
-        else:
-            print("TagList hasn't found ")
+        if device not in self.__devices:
+            log.info("device %s isn't found", device.name())
             return False
 
-        device.stop()
-        thread: QThread = self.__devices[device]
-        thread.quit()
-        thread.wait()
-        print("device deleted : {0}".format(thread.isRunning()))
+        if self.__engine is not None:
+            self.__engine.delDevice(device)
+        else:
+            device.stop()
+            thread: threading.Thread = self.__devices[device]
+            thread.join()
+            self.__pool.detach(device.ip(), device.port())
+            log.debug("device %s deleted: thread is running %s", device.name(), thread.is_alive())
         del self.__devices[device]
+        on_data, on_ranges = self.__slots.pop(device)
+        device.dataChanged.disconnect(on_data)
+        device.rangesChanged.disconnect(on_ranges)
+        device.rangeNumberChanged.disconnect(self.rangeNumberChanged.emit)
+        self.cmdSent.disconnect(device.writeRegisters)
         self.deviceNumberChanged.emit()
+        return True
 
     @overrides(AbsConfControl)
     def devices(self):
@@ -520,7 +962,10 @@ class ModbusDriver(AbsDataChange, AbsModbus, AbsConfControl):
 
     @overrides(AbsModbus)
     def isAddressExists(self, address: int) -> bool:
-        pass
+        for device in list(self.__devices.keys()):
+            if device.isAddressExists(address):
+                return True
+        return False
 
     # ------------------- protected -------------------------------------------
     def _setName(self):
@@ -530,15 +975,60 @@ class ModbusDriver(AbsDataChange, AbsModbus, AbsConfControl):
         self.__comment = "Modbus driver"
 
     # ------------------- public -------------------------------------------
+    def engineType(self) -> EngineType:
+        return self.__engine_type
+
+    def setSessionLimit(self, ip: str, port: int, max_sessions: int):
+        """ Sets max number of TCP sessions shared by devices with address ip:port """
+        if self.__engine is not None:
+            self.__engine.setSessionLimit(ip, port, max_sessions)
+        else:
+            self.__pool.setSessionLimit(ip, port, max_sessions)
+
+    def setBatchWindow(self, window: float = None):
+        """
+        Sets batched notifications: ranges are emitted by rangesChanged([(device name, Range), ...])
+        instead of dataChanged of every range.
+        :param window: None - no batches (dataChanged per range), 0 - one batch per poll cycle of device,
+                       > 0 - ranges of all devices updated during the window (sec) are emitted by one batch
+                       (range updated several times is emitted once)
+        """
+        assert window is None or window >= 0
+        self.__batch_window = window
+
+    def batchWindow(self):
+        return self.__batch_window
+
+    def __emitBatch(self):
+        """ Emits ranges collected during the window (timer thread) or the cycle (window 0, polling thread) """
+        with self.__batch_lock:
+            batch = list(self.__batch.values())
+            self.__batch.clear()
+            self.__batch_timer = None
+        if batch:
+            self.rangesChanged.emit(batch)
+
     def clear(self):
-        dev = self.__devices.keys()[0]
-        self.delDevice(dev)
+        for dev in list(self.__devices.keys()):
+            self.delDevice(dev)
+
+    def close(self):
+        """ Stops polling of all devices and closes their connections (driver can't be used after it) """
+        self.clear()
+        if self.__engine is not None:
+            self.__engine.stop()
+        with self.__batch_lock:
+            if self.__batch_timer is not None:
+                self.__batch_timer.cancel()
+                self.__batch_timer = None
+            self.__batch.clear()
+        self.__pool.close()
 
 
 class DeviceCreator:
     @staticmethod
-    def create(ip: str, port: int, name: str):
-        device = Device(ip, port)
+    def create(ip: str, port: int, name: str, unit: int = DEFAULT_UNIT):
+        device = Device(ip, port, unit=unit)
         device.setObjectName(name)
         device.updateInfo()
         return device
@@ -546,8 +1036,8 @@ class DeviceCreator:
 
 class DriverCreator:
     @staticmethod
-    def create(name: str, devices=None):
-        drv = ModbusDriver()
+    def create(name: str, devices=None, engine: EngineType = EngineType.THREAD):
+        drv = ModbusDriver(engine=engine)
         drv.setObjectName("modbus")
         if devices is not None:
             for dev in devices:
@@ -556,7 +1046,8 @@ class DriverCreator:
 
 
 def main(argv):
-    app = QtWidgets.QApplication(sys.argv)
+    """ Headless polling (without Qt) """
+    Log.setup(logging.INFO)
 
     drv1 = DriverCreator.create("modbus")
     drv1.deviceNumberChanged.connect(lambda: print("TagList number Changed"))
@@ -568,16 +1059,21 @@ def main(argv):
     drv1.addDevice(device1)
 
     # sleeping and adding device after
-    QThread.sleep(5)
+    time.sleep(5)
     device2 = DeviceCreator.create("10.18.32.78", 20502, "dev2")
     device2.addRange(0, 10)
     drv1.addDevice(device2)
 
     # sleeping and deleting device after
-    QThread.sleep(5)
+    time.sleep(5)
     drv1.delDevice(device2)
 
-    return app.exec()
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        drv1.delDevice(device1)
+    return 0
 
 
 if __name__ == "__main__":
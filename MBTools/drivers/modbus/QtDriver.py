@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+# -----------------------------------------------------------
+# This module contains Qt adapter of modbus driver
+#
+# (C) 2021 Maxim Kozyakov, Voronezh, Russia
+# Released under GNU Public License (MIT)
+# email kmmax@yandex.ru
+# -----------------------------------------------------------
+
+"""
+Модуль QtDriver.py
+Назначение:
+Необязательный Qt адаптер драйвера. Ядро (ModbusDriver, Device, Range) не использует Qt,
+его сигналы вызываются в потоках опроса. QtModbusDriver повторно выдает их как pyqtSignal,
+поэтому слоты объектов GUI (модели, окна, IOServer) вызываются в их собственном потоке
+через очередь событий Qt, как и раньше.
+dataChanged по умолчанию передается через Mailbox (conflate): в ящике хранится только последнее
+обновление каждого range, поток GUI получает одно уведомление и выдает dataChanged для всех
+обновленных ranges, затем один rangesChanged со списком этих ranges (обработка как одной транзакции).
+Если GUI занят, обновления одного range не копятся в очереди событий,
+память и задержка ограничены числом ranges. Range передается ссылкой (последнее состояние).
+Пачки драйвера (ModbusDriver.setBatchWindow) кладутся в ящик целиком, поэтому цикл опроса
+устройства не делится между двумя выдачами.
+conflate=False - каждое обновление (или пачка драйвера) ставится в очередь событий Qt отдельно.
+Остальные методы (addDevice, delDevice, devices, onCmdReady, ...) передаются ядру.
+"""
+
+from PyQt5 import QtCore
+
+from MBTools.drivers.modbus.ModbusDriver import ModbusDriver, DriverCreator, EngineType, Range
+from MBTools.drivers.modbus.Mailbox import Mailbox
+
+
+class QtModbusDriver(QtCore.QObject):
+    """ Re-emits signals of ModbusDriver as Qt signals """
+    dataChanged = QtCore.pyqtSignal(str, object)        # device name, Range
+    rangesChanged = QtCore.pyqtSignal(list)             # [(device name, Range), ...]
+    rangeNumberChanged = QtCore.pyqtSignal()
+    deviceNumberChanged = QtCore.pyqtSignal()
+    _dataReady = QtCore.pyqtSignal()                    # mailbox isn't empty
+
+    def __init__(self, driver: ModbusDriver, parent=None, conflate: bool = True):
+        super().__init__(parent)
+        self.__driver = driver
+        self.__mailbox = None
+        self.setObjectName(driver.objectName())
+        if conflate:
+            self.__mailbox = Mailbox()
+            self._dataReady.connect(self.__drain, QtCore.Qt.QueuedConnection)
+            driver.dataChanged.connect(self.__put)
+            driver.rangesChanged.connect(self.__putMany)
+        else:
+            driver.dataChanged.connect(self.dataChanged.emit)
+            driver.rangesChanged.connect(self.rangesChanged.emit)
+        driver.rangeNumberChanged.connect(self.rangeNumberChanged.emit)
+        driver.deviceNumberChanged.connect(self.deviceNumberChanged.emit)
+
+    def driver(self) -> ModbusDriver:
+        """ Returns core driver """
+        return self.__driver
+
+    def pending(self) -> int:
+        """ Returns number of updated ranges which aren't delivered yet """
+        return len(self.__mailbox) if self.__mailbox is not None else 0
+
+    def __put(self, dev_name: str, range_: Range):
+        """ Polling thread: keeps the latest update of the range, wakes the thread of the adapter once """
+        if self.__mailbox.put((dev_name, range_.dataId()), (dev_name, range_)):
+            self._dataReady.emit()
+
+    def __putMany(self, ranges: list):
+        """ Polling (or timer) thread: keeps the latest updates of the batch of the driver """
+        if self.__mailbox.putMany(((dev_name, range_.dataId()), (dev_name, range_)) for dev_name, range_ in ranges):
+            self._dataReady.emit()
+
+    @QtCore.pyqtSlot()
+    def __drain(self):
+        ranges = self.__mailbox.drain()
+        for dev_name, range_ in ranges:
+            self.dataChanged.emit(dev_name, range_)
+        if ranges:
+            self.rangesChanged.emit(ranges)
+
+    def __getattr__(self, name):
+        # QObject attributes are found before, the rest is the driver's interface.
+        # Before __init__ has set the driver (copy, pickle, error in __init__) nothing is delegated,
+        # otherwise reading of self.__driver would call __getattr__ again
+        driver = self.__dict__.get("_QtModbusDriver__driver")
+        if driver is None or name.startswith("_QtModbusDriver__"):
+            raise AttributeError("{0} has no attribute {1}".format(type(self).__name__, name))
+        return getattr(driver, name)
+
+
+class QtDriverCreator:
+    @staticmethod
+    def create(name: str, devices=None, engine: EngineType = EngineType.THREAD,
+               conflate: bool = True) -> QtModbusDriver:
+        return QtModbusDriver(DriverCreator.create(name, devices, engine), conflate=conflate)
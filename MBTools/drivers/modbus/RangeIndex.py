@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+# -----------------------------------------------------------
+# This module contains interval index of modbus ranges
+#
+# (C) 2021 Maxim Kozyakov, Voronezh, Russia
+# Released under GNU Public License (MIT)
+# email kmmax@yandex.ru
+# -----------------------------------------------------------
+
+"""
+Модуль RangeIndex.py
+Назначение:
+Поиск range по адресу регистра за O(log n) (bisect) вместо перебора всех ranges устройства.
+
+Интервалы [address, address + number) хранятся отсортированными по началу,
+для каждой позиции хранится максимум концов всех предыдущих интервалов,
+поэтому перекрывающиеся ranges тоже находятся (обычно ranges от RangePlanner не перекрываются
+и поиск сводится к одному bisect).
+Индекс обновляется при добавлении/удалении range вставкой в отсортированные списки (без сортировки всего),
+списки заменяются целиком, поэтому поиск из потоков опроса не требует блокировок.
+"""
+
+from bisect import bisect_left, bisect_right
+
+
+class RangeIndex(object):
+    """ Sorted interval index of ranges (any objects with address() and number()) """
+    def __init__(self, ranges=()):
+        # first addresses (sorted), last addresses + 1, max of ends[0..i], ranges
+        self.__items = ([], [], [], [])
+        for data in ranges:
+            self.add(data)
+
+    def add(self, data):
+        """ Inserts the range keeping order of first addresses """
+        starts, ends, max_ends, ranges = (list(items) for items in self.__items)
+        start = data.address()
+        i = bisect_right(starts, start)
+        starts.insert(i, start)
+        ends.insert(i, start + data.number())
+        ranges.insert(i, data)
+        max_ends.insert(i, 0)
+        self.__update(i, ends, max_ends)
+        self.__items = (starts, ends, max_ends, ranges)
+
+    def remove(self, data) -> bool:
+        """ Removes the range, returns False if it isn't indexed """
+        starts, ends, max_ends, ranges = (list(items) for items in self.__items)
+        i = bisect_left(starts, data.address())
+        while i < len(ranges) and starts[i] == data.address():
+            if ranges[i] is data:
+                for items in (starts, ends, max_ends, ranges):
+                    del items[i]
+                self.__update(i, ends, max_ends)
+                self.__items = (starts, ends, max_ends, ranges)
+                return True
+            i += 1
+        return False
+
+    def clear(self):
+        self.__items = ([], [], [], [])
+
+    def find(self, address: int, size: int = 1):
+        """ Returns range which holds all registers address..address+size-1, otherwise None """
+        starts, ends, max_ends, ranges = self.__items
+        i = bisect_right(starts, address) - 1
+        end = address + size
+        # ranges before i which end after address can overlap it
+        while i >= 0 and max_ends[i] >= end:
+            if ends[i] >= end:
+                return ranges[i]
+            i -= 1
+        return None
+
+    def ranges(self) -> list:
+        """ Returns ranges sorted by address """
+        return list(self.__items[3])
+
+    def __contains__(self, address: int) -> bool:
+        return self.find(address) is not None
+
+    def __len__(self):
+        return len(self.__items[3])
+
+    @staticmethod
+    def __update(i: int, ends: list, max_ends: list):
+        """ Recalculates max ends from position i """
+        current = max_ends[i - 1] if i > 0 else 0
+        for j in range(i, len(ends)):
+            current = max(current, ends[j])
+            max_ends[j] = current
@@ -0,0 +1,172 @@
+# -*- coding: utf-8 -*-
+# -----------------------------------------------------------
+# This module contains planner of modbus read requests
+#
+# (C) 2021 Maxim Kozyakov, Voronezh, Russia
+# Released under GNU Public License (MIT)
+# email kmmax@yandex.ru
+# -----------------------------------------------------------
+
+"""
+Модуль RangePlanner.py
+Назначение:
+Разбиение адресов устройства на запросы чтения (ranges) с минимальной стоимостью опроса.
+
+Стоимость одного запроса = request_cost + register_cost * (число регистров).
+Промежуток между адресами включается в запрос, если это дешевле отдельного запроса.
+Многорегистровые теги (REAL, DWORD) никогда не разделяются между запросами.
+Для классов опроса (scan classes) запросы планируются отдельно для каждого периода опроса.
+"""
+
+MAX_READ_REGISTERS = 125      # protocol limit of holding registers in one read request (FC3)
+DEFAULT_REQUEST_COST = 0.01   # default cost of one request (round-trip), sec
+DEFAULT_REGISTER_COST = 0.0002  # default cost of transfer of one register, sec
+
+
+class PlanCost(object):
+    """ Per-device cost parameters of read requests """
+    def __init__(self, request_cost: float = DEFAULT_REQUEST_COST,
+                 register_cost: float = DEFAULT_REGISTER_COST,
+                 max_registers: int = MAX_READ_REGISTERS):
+        assert 0 < max_registers <= MAX_READ_REGISTERS
+        self.request_cost = request_cost
+        self.register_cost = register_cost
+        self.max_registers = max_registers
+
+    def request_time(self, number: int) -> float:
+        """ Returns estimated time of one request of number registers """
+        return self.request_cost + self.register_cost * number
+
+    def __eq__(self, other):
+        return isinstance(other, PlanCost) and \
+            (self.request_cost, self.register_cost, self.max_registers) == \
+            (other.request_cost, other.register_cost, other.max_registers)
+
+    def __str__(self):
+        return "request={0}s; register={1}s; max={2}".format(
+            self.request_cost, self.register_cost, self.max_registers)
+
+
+class ReadPlan(object):
+    """ Result of planning: read requests [[first, last], ...] and estimated cycle time """
+    def __init__(self, requests: list, cycle_time: float):
+        self.requests = requests
+        self.cycle_time = cycle_time
+
+    def registers(self) -> int:
+        """ Returns number of registers read in one cycle """
+        return sum(last - first + 1 for first, last in self.requests)
+
+    def __len__(self):
+        return len(self.requests)
+
+    def __str__(self):
+        return "{0} requests, {1} registers, cycle={2:.4f}s".format(
+            len(self.requests), self.registers(), self.cycle_time)
+
+
+class RangePlanner(object):
+    """ Planner of read requests """
+    @staticmethod
+    def spans_from_tags(tags) -> list:
+        """ Returns (address, size) of every tag """
+        return [(tag.address, tag.size()) for tag in tags]
+
+    @staticmethod
+    def blocks(spans) -> list:
+        """Merges overlapping spans into blocks [first, last] which can't be split
+
+        param[iter] spans - (address, size) pairs or single addresses
+        """
+        items = []
+        for span in spans:
+            if isinstance(span, int):
+                items.append((span, span))
+            else:
+                address, size = span
+                items.append((address, address + max(size, 1) - 1))
+        items.sort()
+
+        blocks = []
+        for first, last in items:
+            if blocks and first <= blocks[-1][1]:
+                if last > blocks[-1][1]:
+                    blocks[-1][1] = last
+            else:
+                blocks.append([first, last])
+        return blocks
+
+    @staticmethod
+    def plan(spans, cost: PlanCost = None) -> ReadPlan:
+        """Returns the cheapest set of read requests covering all spans
+
+        Dynamic programming over sorted blocks: best[j] is the cost of reading
+        blocks 0..j, the last request covers blocks i..j.
+        raise ValueError - if overlapping tags can't fit in one request
+        """
+        cost = cost or PlanCost()
+        blocks = RangePlanner.blocks(spans)
+        n = len(blocks)
+        if not n:
+            return ReadPlan([], 0.0)
+
+        for first, last in blocks:
+            if last - first + 1 > cost.max_registers:
+                raise ValueError("block {0}..{1} exceeds {2} registers".format(first, last, cost.max_registers))
+
+        best = [0.0] * (n + 1)      # best[j + 1] - minimal cost of blocks 0..j
+        start = [0] * n             # first block of last request for blocks 0..j
+        for j in range(n):
+            last = blocks[j][1]
+            best[j + 1] = float("inf")
+            for i in range(j, -1, -1):
+                number = last - blocks[i][0] + 1
+                if number > cost.max_registers:
+                    break
+                value = best[i] + cost.request_time(number)
+                if value < best[j + 1]:
+                    best[j + 1] = value
+                    start[j] = i
+
+        requests = []
+        j = n - 1
+        while j >= 0:
+            i = start[j]
+            requests.append([blocks[i][0], blocks[j][1]])
+            j = i - 1
+        requests.reverse()
+
+        return ReadPlan(requests, best[n])
+
+    @staticmethod
+    def plan_classes(spans, cost: PlanCost = None) -> dict:
+        """Plans requests separately for every scan class
+
+        param[iter] spans - (address, size, scan_rate) triples
+        Overlapping spans of different classes are read by the fastest class.
+        return {scan_rate: ReadPlan}
+        """
+        items = sorted((address, address + max(size, 1) - 1, rate) for address, size, rate in spans)
+
+        blocks = []     # [first, last, rate]
+        for first, last, rate in items:
+            if blocks and first <= blocks[-1][1]:
+                block = blocks[-1]
+                block[1] = max(block[1], last)
+                block[2] = min(block[2], rate)
+            else:
+                blocks.append([first, last, rate])
+
+        classes = {}
+        for first, last, rate in blocks:
+            classes.setdefault(rate, []).append((first, last - first + 1))
+
+        return {rate: RangePlanner.plan(class_spans, cost) for rate, class_spans in classes.items()}
+
+    @staticmethod
+    def load(plans: dict) -> float:
+        """Returns busy time of the link per second for {scan_rate: ReadPlan}
+
+        Value > 1.0 means the device can't be polled with the required scan rates.
+        """
+        return sum(plan.cycle_time / rate for rate, plan in plans.items())
@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+# -----------------------------------------------------------
+# This module contains timestamps of modbus data
+#
+# (C) 2021 Maxim Kozyakov, Voronezh, Russia
+# Released under GNU Public License (MIT)
+# email kmmax@yandex.ru
+# -----------------------------------------------------------
+
+"""
+Модуль Timestamp.py
+Назначение:
+Метки времени данных опроса с наносекундным разрешением.
+- sent_ns, received_ns - время отправки запроса и получения ответа (time.monotonic_ns),
+  используются для упорядочивания и анализа задержек, не зависят от перевода часов;
+- wall_ns - астрономическое время (нс от эпохи), вычисляется от опорной точки WallClock,
+  которая снимается один раз за цикл опроса;
+- struct_time (для отображения) создается только по запросу.
+"""
+
+import time
+
+
+class Timestamp(object):
+    """ Time of one update of data """
+    __slots__ = ("sent_ns", "received_ns", "wall_ns")
+
+    def __init__(self, sent_ns: int, received_ns: int, wall_ns: int):
+        self.sent_ns = sent_ns              # request has been sent (time.monotonic_ns)
+        self.received_ns = received_ns      # response has been received (time.monotonic_ns)
+        self.wall_ns = wall_ns              # wall time of receiving, ns since epoch
+
+    @staticmethod
+    def now():
+        """ Returns timestamp of current moment (without request) """
+        received_ns = time.monotonic_ns()
+        return Timestamp(received_ns, received_ns, time.time_ns())
+
+    def latency_ns(self) -> int:
+        """ Returns time between request and response, ns """
+        return self.received_ns - self.sent_ns
+
+    def localtime(self) -> time.struct_time:
+        """ Returns wall time as struct_time (for displaying) """
+        return time.localtime(self.wall_ns // 1000000000)
+
+    def __lt__(self, other):
+        return self.received_ns < other.received_ns
+
+    def __str__(self):
+        return "{0}.{1:06d} ({2:.3f} ms)".format(
+            time.strftime("%H:%M:%S", self.localtime()), self.wall_ns // 1000 % 1000000,
+            self.latency_ns() / 1e6)
+
+
+class WallClock(object):
+    """ Converts time.monotonic_ns to wall time by anchor which is captured once per polling cycle """
+    def __init__(self):
+        self.__monotonic_ns = 0
+        self.__wall_ns = 0
+        self.sync()
+
+    def sync(self):
+        """ Captures anchor (monotonic and wall time of the same moment) """
+        self.__monotonic_ns = time.monotonic_ns()
+        self.__wall_ns = time.time_ns()
+
+    def wall_ns(self, monotonic_ns: int) -> int:
+        return self.__wall_ns + (monotonic_ns - self.__monotonic_ns)
+
+    def stamp(self, sent_ns: int, received_ns: int = None) -> Timestamp:
+        """ Returns timestamp of response which is received now (or at received_ns) """
+        if received_ns is None:
+            received_ns = time.monotonic_ns()
+        return Timestamp(sent_ns, received_ns, self.wall_ns(received_ns))
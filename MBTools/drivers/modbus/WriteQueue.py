@@ -0,0 +1,194 @@
+# -*- coding: utf-8 -*-
+# -----------------------------------------------------------
+# This module contains queue of write commands of modbus device
+#
+# (C) 2021 Maxim Kozyakov, Voronezh, Russia
+# Released under GNU Public License (MIT)
+# email kmmax@yandex.ru
+# -----------------------------------------------------------
+
+"""
+Модуль WriteQueue.py
+Назначение:
+Очередь команд записи регистров устройства.
+- повторная запись в тот же адрес заменяет значение (побеждает последнее);
+- соседние адреса объединяются в одну запись FC16 (не более 123 регистров);
+- каждый вызывающий получает concurrent.futures.Future с подтверждением или ошибкой;
+- запись битов одного регистра (теги BOOL) накапливается в маски AND/OR до выгрузки очереди
+  и выполняется одной командой MaskBatch: FC22 (mask write) или чтение-изменение-запись регистра,
+  поэтому пачка команд битов одного регистра не затирает соседние биты и дает 1-2 запроса вместо 16.
+  Если в очереди есть запись всего регистра, биты применяются к ее значению; последующая запись
+  регистра заменяет накопленные биты.
+
+Очередь заполняется из любого потока, выгружается потоком опроса устройства.
+"""
+
+import threading
+from concurrent.futures import Future
+from numbers import Integral
+
+MAX_WRITE_REGISTERS = 123     # protocol limit of registers in one write request (FC16)
+
+
+class WriteError(Exception):
+    """ Write request has been rejected by server """
+    pass
+
+
+class WriteBatch(object):
+    """ Continuous sequence of registers which is written by one request """
+    def __init__(self, address: int, values: list, futures: list):
+        self.address = address
+        self.values = values
+        self.futures = futures      # futures of callers waiting for this batch
+
+    def __len__(self):
+        return len(self.values)
+
+    def __str__(self):
+        return "[addr={0}:num={1}] {2}".format(self.address, len(self.values), self.values)
+
+
+class MaskBatch(object):
+    """ Bits of one register which are written by one mask write (or read-modify-write) """
+    def __init__(self, address: int, and_mask: int, or_mask: int, futures: list):
+        self.address = address
+        self.and_mask = and_mask    # bits which are kept
+        self.or_mask = or_mask      # bits which are set (of not kept ones)
+        self.futures = futures
+
+    def apply(self, register: int) -> int:
+        """ Returns value of register after writing of the bits (as FC22 does it) """
+        return (register & self.and_mask) | (self.or_mask & ~self.and_mask & 0xFFFF)
+
+    def __str__(self):
+        return "[addr={0}] and={1:#06x} or={2:#06x}".format(self.address, self.and_mask, self.or_mask)
+
+
+class WriteQueue(object):
+    """ Coalescing queue of write commands """
+    def __init__(self, max_registers: int = MAX_WRITE_REGISTERS):
+        assert 0 < max_registers <= MAX_WRITE_REGISTERS
+        self.__max_registers = max_registers
+        self.__lock = threading.Lock()
+        self.__values = {}          # address -> value (last value wins)
+        self.__masks = {}           # address -> [and_mask, or_mask] of pending bits
+        self.__futures = {}         # address -> futures of callers
+        self.__remaining = {}       # future -> number of not finished batches
+
+    def put(self, address: int, values) -> Future:
+        """Adds command of writing values (int or list) from address
+
+        return Future, its result is True when all registers have been written (at once for empty list),
+        otherwise it contains exception (ValueError - value isn't an integer 0..0xFFFF, it isn't queued)
+        """
+        return self.putMany([(address, values)])[0]
+
+    def putMany(self, commands) -> list:
+        """Adds commands [(address, values), ...] at once, so they are taken by the same batches
+
+        return list of Future (one per command, see put)
+        """
+        futures = []
+        with self.__lock:
+            for address, values in commands:
+                values = list(values) if hasattr(values, "__iter__") else [values]
+                future = Future()
+                future.set_running_or_notify_cancel()
+                futures.append(future)
+                bad = [value for value in values if not isinstance(value, Integral) or not 0 <= value <= 0xFFFF]
+                if bad:
+                    future.set_exception(ValueError("values {0} can't be written to registers from {1}"
+                                                    .format(bad, address)))
+                    continue
+                if not values:
+                    future.set_result(True)
+                    continue
+                for i, value in enumerate(values):
+                    self.__values[address + i] = int(value)
+                    self.__masks.pop(address + i, None)     # the whole register wins
+                    self.__futures.setdefault(address + i, []).append(future)
+        return futures
+
+    def putBits(self, bits) -> list:
+        """Adds commands of writing bits [(address, bit number, value), ...], other bits are kept
+
+        return list of Future (one per command, see put)
+        """
+        futures = []
+        with self.__lock:
+            for address, bit_number, value in bits:
+                assert 0 <= bit_number < 16
+                mask = 1 << bit_number
+                future = Future()
+                future.set_running_or_notify_cancel()
+                if address in self.__values:
+                    register = self.__values[address]
+                    self.__values[address] = (register | mask) if value else (register & ~mask & 0xFFFF)
+                else:
+                    masks = self.__masks.setdefault(address, [0xFFFF, 0])
+                    masks[0] &= ~mask & 0xFFFF
+                    masks[1] = (masks[1] | mask) if value else (masks[1] & ~mask)
+                self.__futures.setdefault(address, []).append(future)
+                futures.append(future)
+        return futures
+
+    def take(self) -> list:
+        """
+        Returns all pending commands as batches and clears the queue:
+        WriteBatch sorted by address, then MaskBatch of registers with pending bits
+        """
+        with self.__lock:
+            if not self.__values and not self.__masks:
+                return []
+            batches = []
+            batch = None
+            for address in sorted(self.__values):
+                if batch is None or address != batch.address + len(batch) or len(batch) >= self.__max_registers:
+                    batch = WriteBatch(address, [], [])
+                    batches.append(batch)
+                batch.values.append(self.__values[address])
+                for future in self.__futures[address]:
+                    if future not in batch.futures:
+                        batch.futures.append(future)
+            for address in sorted(self.__masks):
+                and_mask, or_mask = self.__masks[address]
+                batches.append(MaskBatch(address, and_mask, or_mask, list(self.__futures[address])))
+            self.__values.clear()
+            self.__masks.clear()
+            self.__futures.clear()
+
+            for batch in batches:
+                for future in batch.futures:
+                    self.__remaining[future] = self.__remaining.get(future, 0) + 1
+        return batches
+
+    def done(self, batch, error: Exception = None):
+        """ Finishes the batch, the caller is notified when all his batches are finished """
+        notify = []
+        with self.__lock:
+            for future in batch.futures:
+                if future not in self.__remaining:
+                    continue
+                if error is not None:
+                    del self.__remaining[future]
+                    notify.append(future)
+                else:
+                    self.__remaining[future] -= 1
+                    if not self.__remaining[future]:
+                        del self.__remaining[future]
+                        notify.append(future)
+        for future in notify:
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(True)
+
+    def fail(self, error: Exception):
+        """ Finishes all pending commands with error """
+        for batch in self.take():
+            self.done(batch, error)
+
+    def __len__(self):
+        with self.__lock:
+            return len(self.__values) + len(self.__masks)
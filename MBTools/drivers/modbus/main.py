@@ -4,7 +4,8 @@ import time
 
 from PyQt5 import QtWidgets
 
-from MBTools.drivers.modbus.ModbusDriver import DeviceCreator, DriverCreator
+from MBTools.drivers.modbus.ModbusDriver import DeviceCreator
+from MBTools.drivers.modbus.QtDriver import QtDriverCreator
 from MBTools.drivers.modbus.DriverConfig import AbcDriverConf, ModbusDriverConf
 from MBTools.drivers.modbus.tools.ModbusDriverViewer.ModbusDriverViewer import ModbusDriverViewer
 
@@ -12,7 +13,7 @@ from MBTools.drivers.modbus.tools.ModbusDriverViewer.ModbusDriverViewer import M
 def main(argv):
     app = QtWidgets.QApplication(sys.argv)
 
-    drv1 = DriverCreator.create("modbus")
+    drv1 = QtDriverCreator.create("modbus")
     cfg: AbcDriverConf = ModbusDriverConf()
     cfg.set_driver(drv1)
 
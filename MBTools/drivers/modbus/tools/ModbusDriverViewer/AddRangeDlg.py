@@ -1,6 +1,7 @@
 
 # -*- coding: utf-8 -*-
 from MBTools.drivers.modbus.tools.ModbusDriverViewer import ui_AddRangeDlg
+from PyQt5 import QtWidgets
 from MBTools.drivers.modbus.ModbusDriver import *
 import sys
 
@@ -1,8 +1,13 @@
 # -*- coding: utf-8 -*-
+import logging
+from MBTools.utilites import Log
+from PyQt5 import QtCore, QtWidgets
+from PyQt5.QtCore import pyqtSignal
 from MBTools.drivers.modbus import ModbusDriver
 from MBTools.drivers.modbus.tools.ModbusDriverViewer import ui_ModbusDriverViewer
 from MBTools.drivers.modbus.tools.ModbusDriverViewer.ModbusModel import *
 from MBTools.drivers.modbus.ModbusDriver import *
+from MBTools.drivers.modbus.QtDriver import QtDriverCreator
 from MBTools.drivers.modbus.tools.ModbusDriverViewer.AddDriverDlg import AddDriverDlg
 from MBTools.drivers.modbus.tools.ModbusDriverViewer.AddRangeDlg import AddRangeDlg
 from MBTools.utilites.Messages import DummyMessage
@@ -287,7 +292,7 @@ class ModbusDriverViewer(QtWidgets.QMainWindow):
 
             devices.append(device1)
 
-        drv1 = DriverCreator.create(driverName, devices)
+        drv1 = QtDriverCreator.create(driverName, devices)
         self.set_driver(drv1)
 
     # --- Events of this class ---
@@ -404,6 +409,7 @@ class ModbusDriverViewer(QtWidgets.QMainWindow):
 
 def main(argv):
     app = QtWidgets.QApplication(sys.argv)
+    Log.setup(logging.INFO)
 
     # drv1 = ModbusDriver()
     # drv1.setObjectName("Modbus")
@@ -422,7 +428,7 @@ def main(argv):
     device2.addRange(0, 10)
     devices.append(device2)
 
-    drv1 = DriverCreator.create("modbus", devices)
+    drv1 = QtDriverCreator.create("modbus", devices)
 
     viewer = ModbusDriverViewer()
     viewer.add_driver(drv1)
@@ -1,4 +1,6 @@
 import sys
+from PyQt5 import QtCore, QtWidgets
+from PyQt5.QtCore import *
 from PyQt5.QtWidgets import *
 from PyQt5.QtGui import *
 from MBTools.drivers.modbus.ModbusDriver import *
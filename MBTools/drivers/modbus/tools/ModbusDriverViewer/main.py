@@ -20,7 +20,7 @@ def main(argv):
     device2.addRange(0, 10, "data1")
     devices.append(device2)
 
-    drv1 = DriverCreator.create("modbus", devices)
+    drv1 = QtDriverCreator.create("modbus", devices)
 
     viewer = ModbusDriverViewer()
     viewer.add_driver(drv1)
@@ -14,12 +14,15 @@ sys.path.append(os.path.join(sys.path[0], "../"))
 from PyQt5 import QtWidgets
 
 import MBTools.oiserver.tools.OIServerViewer.OIServerViewer as oiv
+import logging
+from MBTools.utilites import Log
 from MBTools.oiserver.OIServer import IOServer
 from MBTools.oiserver.OIServerConfigure import JsonConfigure, create_config, FormatName
 
 
 def main(argv):
     app = QtWidgets.QApplication(sys.argv)
+    Log.setup(logging.INFO)
 
     # cur_path = os.path.dirname(__file__)
     # new_path = os.path.relpath("../config/qss.css", cur_path)
@@ -24,12 +24,17 @@ from typing import Final
 
 from MBTools.oiserver.Tag import Tag, TagType
 from MBTools.drivers.modbus.ModbusDriver import *
+from MBTools.drivers.modbus.RangePlanner import RangePlanner
 from MBTools.oiserver.constants import TagTypeFromStr, StrFromTagType
 from MBTools.oiserver.DataModel import DataModel, IDataModel
+from MBTools.oiserver import OIServerConfigure
 
 from PyQt5 import QtWidgets
 
 from abc import ABC, abstractmethod
+from MBTools.utilites.Log import getLogger
+
+log = getLogger("oiserver.config")
 
 
 # ------------ CONSTANTS BEGIN ------------------
@@ -56,6 +61,7 @@ class TAG_ALIASES:
     ADDRESS = "address"
     BIT = "bit"
     COMMENT = "comment"
+    SCAN = "scan"           # optional: polling period, ms or name of scan class (see ModbusDriver.SCAN_CLASSES)
 
 # ------------ CONSTANTS END ------------------
 
@@ -176,10 +182,13 @@ class JsonConf(AbcConf):
                     key = hash(device_name)
                     dev = devices.get(key)
                     if dev is None:
-                        print("{0}, {1}: Bag tag's device in configuration, Break".format(key, device_name))
+                        log.error("%s, %s: bad tag's device in configuration, break", key, device_name)
                         continue
 
                     tagr = Tag(device=dev, name=name, type_=type_, comment=comment, address=address)
+                    scan_rate = OIServerConfigure.ConfigCalculater.scan_rate_from_json(tag)
+                    if scan_rate is not None:
+                        tagr.scan_rate = scan_rate
                     if (TagType.BOOL == tagr.type):
                         bit_number = tag[TAG_ALIASES.BIT]
                         tagr.bit_number = bit_number
@@ -187,7 +196,7 @@ class JsonConf(AbcConf):
                     self._model.add(tagr)
 
         except IOError as ioe:
-            print("Error opening the file_name: ", ioe)
+            log.error("error opening the file: %s", ioe)
             return None
 
         self._valid = True
@@ -196,10 +205,11 @@ class JsonConf(AbcConf):
 
         self.__drv = DriverCreator.create("modbus")
         for dev in self._model.devices():
-            addresses = ConfigCalculater.addresses_from_tags(self._model.tags(), dev)
-            ranges = ModbusCalculator.split_numbers(addresses, 100)
-            for i, rng in enumerate(ranges):
-                dev.addRange(rng[0], rng[1] - rng[0] + 2, "range{}".format(i))
+            spans = ConfigCalculater.spans_from_tags(self._model.tags(), dev)
+            plans = RangePlanner.plan_classes(spans, dev.planCost())
+            for rate, plan in sorted(plans.items()):
+                for rng in plan.requests:
+                    dev.addRange(rng[0], rng[1] - rng[0] + 1, "range{}".format(len(dev.ranges())), rate)
                 # dev.start()
             # print(dev)
             self.__drv.addDevice(dev)
@@ -249,7 +259,7 @@ class JsonConf(AbcConf):
                 json.dump(data, f, indent=4, ensure_ascii=False)
 
         except IOError as ioe:
-            print("Error opening the file_name: ", ioe)
+            log.error("error opening the file: %s", ioe)
 
 
 class ConfigCalculater(object):
@@ -263,9 +273,15 @@ class ConfigCalculater(object):
         addresses = [tag.address for tag in tags if dev.name() == tag.device.name()]
         addr_set = set(addresses)
         addresses = list(addr_set)
-        print(dev.name(), addresses)
+        log.debug("%s: %s", dev.name(), addresses)
         return addresses
 
+    @staticmethod
+    def spans_from_tags(tags: list, dev: Device) -> list:
+        """Returns (address, size, scan_rate) of all tags of the device"""
+        return [(tag.address, tag.size(), tag.scan_rate or REQUEST_DELAY)
+                for tag in tags if dev.name() == tag.device.name()]
+
 
 class FormatName(Enum):
     JSON = 1
@@ -0,0 +1,115 @@
+# -*- coding: utf-8 -*-
+# -----------------------------------------------------------
+# This module contains cache of compiled server configuration
+#
+# (C) 2021 Maxim Kozyakov, Voronezh, Russia
+# Released under GNU Public License (MIT)
+# email kmmax@yandex.ru
+# -----------------------------------------------------------
+
+"""
+Модуль ConfigCache.py
+Назначение:
+Кэш разобранной конфигурации сервера рядом с файлом JSON (conf.json -> conf.json.cache),
+чтобы при запуске не разбирать JSON и не планировать запросы заново.
+- в кэше: конфигурации устройств, конфигурации тегов (по столбцам) и планы запросов устройств ({scan_rate: ReadPlan});
+- кэш читается одним чтением файла (pickle);
+- кэш действителен, если совпадают размер и mtime исходного файла, иначе сравнивается sha1 содержимого
+  (файл скопирован или сохранен без изменений), при совпадении sha1 в кэш записываются новые размер и mtime;
+- при несовпадении версии формата, ошибке чтения или записи кэш не используется (JSON разбирается как обычно).
+Кэш создается самим сервером и имеет то же доверие, что и файл конфигурации рядом с ним.
+"""
+
+import hashlib
+import os
+import pickle
+
+from MBTools.utilites.Log import getLogger
+
+log = getLogger("oiserver.config")
+
+CACHE_SUFFIX = ".cache"
+CACHE_VERSION = 2           # should be changed if format of cached objects is changed
+
+
+class ConfigCache(object):
+    """ Compiled configuration stored next to the source file """
+
+    @staticmethod
+    def path(file_name: str) -> str:
+        """ Returns name of cache file of the source file """
+        return file_name + CACHE_SUFFIX
+
+    @staticmethod
+    def load(file_name: str):
+        """
+        Returns (devices, tags, plans) saved for the source file if the cache is valid for it,
+        otherwise None
+        """
+        try:
+            with open(ConfigCache.path(file_name), 'rb') as f:
+                data = pickle.loads(f.read())
+            if CACHE_VERSION != data.get("version"):
+                return None
+            stat = ConfigCache.__stat(file_name)
+            if stat != data["stat"]:
+                if ConfigCache.__digest(file_name) != data["digest"]:
+                    return None
+                # content is the same (touch, checkout): next start uses the stat again
+                ConfigCache.save(file_name, (stat, data["digest"]), data["devices"], data["tags"], data["plans"])
+            return data["devices"], data["tags"], data["plans"]
+        except FileNotFoundError:
+            return None
+        except Exception as exc:    # broken or incompatible cache is only reason to parse the source
+            log.warning("%s: cache isn't used: %s", file_name, exc)
+            return None
+
+    @staticmethod
+    def key(file_name: str) -> tuple:
+        """
+        Returns (stat, digest) of the source file, should be taken before the file is parsed
+        (if the file is changed after that, the cache will be invalid for it)
+        """
+        return ConfigCache.__stat(file_name), ConfigCache.__digest(file_name)
+
+    @staticmethod
+    def save(file_name: str, key: tuple, devices: list, tags: list, plans: dict) -> bool:
+        """ Writes compiled configuration of the source file (key - see ConfigCache.key), returns False on error """
+        stat, digest = key
+        data = {
+            "version": CACHE_VERSION,
+            "stat": stat,
+            "digest": digest,
+            "devices": devices,
+            "tags": tags,
+            "plans": plans,
+        }
+        cache_name = ConfigCache.path(file_name)
+        temp_name = cache_name + ".tmp"
+        try:
+            with open(temp_name, 'wb') as f:
+                f.write(pickle.dumps(data, protocol=pickle.HIGHEST_PROTOCOL))
+            os.replace(temp_name, cache_name)     # readers never see half-written cache
+        except OSError as exc:
+            log.warning("%s: cache isn't saved: %s", file_name, exc)
+            return False
+        return True
+
+    @staticmethod
+    def remove(file_name: str):
+        """ Removes cache of the source file (if exists) """
+        try:
+            os.remove(ConfigCache.path(file_name))
+        except FileNotFoundError:
+            pass
+
+    # ---------- Privat -----------
+    @staticmethod
+    def __stat(file_name: str) -> tuple:
+        stat = os.stat(file_name)
+        return stat.st_size, stat.st_mtime_ns
+
+    @staticmethod
+    def __digest(file_name: str) -> str:
+        with open(file_name, 'rb') as f:
+            return hashlib.sha1(f.read()).hexdigest()
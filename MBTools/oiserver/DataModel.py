@@ -16,6 +16,9 @@ from MBTools.oiserver.Tag import Tag, TagType
 from MBTools.drivers.modbus.ModbusDriver import *
 from MBTools.drivers.modbus.ModbusDriver import DriverCreator, DeviceCreator
 from abc import ABC, abstractmethod
+from MBTools.utilites.Log import getLogger
+
+log = getLogger("oiserver.model")
 
 
 def profile(func):
@@ -69,28 +72,47 @@ class DataModel(IDataModel, set):
     - add(a)
     - clear()
     - discard(a)
+    bulk methods: add_many(tags), discard_many(tags)
+
+    Devices are reference-counted by tags, indexes (tags by device, tags by device and address)
+    are updated on every add/discard, so a change costs O(1) instead of scanning all tags.
+    Devices are kept in insertion-ordered dict, it is changed only when the first tag of a device is added
+    or the last one is discarded.
 
     @todo reload the remaining methods that change the content
     """
-    def __init__(self, tags=[]):
+    def __init__(self, tags=None):
         super().__init__()
-        self.__hash_tags = DataModel.__get_hash_from_tags(tags)
-        self.__drivers = self.__get_drivers_from_tags()
-        self.__devices = self.__get_drivers_from_tags()
+        self.__hash_tags = dict()
+        self.__device_refs = dict()     # device -> number of tags
+        self.__by_device = dict()       # device name -> {tag name: tag}
+        self.__by_address = dict()      # (device name, address) -> [tags]
+        self.__devices = dict()         # device -> None (ordered set of devices)
+        self.add_many(tags or [])
 
     # ---------- IDataModel overloaded ---------
     def drivers(self):
-        return self.__drivers
+        """Returns drivers of used devices (devices get their driver when they are added to it) """
+        drivers = dict()
+        for device in self.__devices:
+            driver = device.driver() if device is not None else None
+            if driver is not None:
+                drivers[id(driver)] = driver
+        return list(drivers.values())
 
     def devices(self):
-        return self.__devices
+        return list(self.__devices)
 
     def tags(self):
         return self.__hash_tags.values()
 
     def tags_by_device(self, device: Device) -> list:
         """Returns tags corresponds with the device """
-        return [tag for tag in self.__hash_tags.values() if device.name() == tag.device.name()]
+        return list(self.__by_device.get(device.name(), {}).values())
+
+    def tags_by_address(self, device: Device, address: int) -> list:
+        """Returns tags of the device with the address (BOOL tags of one register have the same address) """
+        return list(self.__by_address.get((device.name(), address), []))
 
     def find_tag_by_name(self, tagname: str) -> Tag:
         """Returns tag by his name"""
@@ -106,17 +128,8 @@ class DataModel(IDataModel, set):
         1. Если тэг с таким именем уже существует, то действие игнорируется
         2. Если отстутствует то тэг добавляется в существующий список тегов
         """
-        assert Tag is not None, " None instead of Tag"
-
-        key = hash(tag.name)
-        if key in self.__hash_tags:
-            print("Tag {0} has had dublicate (it ins't added)".format(tag.name))
-            return None
-
-        self.__hash_tags[hash(tag.name)] = tag
-        super().add(tag)
-        self.__devices = self.__get_devices_from_tags()
-        self.__drivers = self.__get_drivers_from_tags()
+        if self.__add(tag):
+            self.__devices[tag.device] = None
         return None
 
     def discard(self, tag: Tag) -> None:
@@ -124,22 +137,28 @@ class DataModel(IDataModel, set):
             - Удаляется тег с указанным именем
             - обновляются списки devices и drivers
         """
-        assert Tag is not None, " None instead of Tag"
+        last = self.__discard(tag)
+        if last is not None:
+            del self.__devices[last.device]
+        return None
 
-        key = hash(tag.name)
-        if key in self.__hash_tags:
-            super().discard(tag)
-            del self.__hash_tags[key]
-            self.__devices = self.__get_devices_from_tags()
-            self.__drivers = self.__get_drivers_from_tags()
+    def add_many(self, tags) -> None:
+        """Adds tags (duplicates are ignored as in add) """
+        for tag in tags:
+            self.add(tag)
 
-        return None
+    def discard_many(self, tags) -> None:
+        """Discards tags by their names """
+        for tag in tags:
+            self.discard(tag)
 
     def clear(self) -> None:
         super().clear()
         self.__hash_tags.clear()
+        self.__device_refs.clear()
+        self.__by_device.clear()
+        self.__by_address.clear()
         self.__devices.clear()
-        self.__drivers.clear()
 
     @staticmethod
     def find_by_name(name: str, collection):
@@ -159,33 +178,58 @@ class DataModel(IDataModel, set):
 
         return ret_item
 
-    @staticmethod
-    def __get_hash_from_tags(tags: list) -> dict:
-        """Creates hash table of tags from tags list"""
-        hash_tags = dict()
-        for tag in tags:
-            hash_tags[hash(tag.name)] = tag
-        return hash_tags
+    def __add(self, tag: Tag) -> bool:
+        """Adds tag to the set and indexes, returns True if it's the first tag of its device """
+        assert tag is not None, " None instead of Tag"
 
-    @staticmethod
-    def __get_tags_from_hash(hash_tags: dict) -> list:
-        """Creates tags list from tags hash table"""
-        return hash_tags.values()
+        key = hash(tag.name)
+        if key in self.__hash_tags:
+            log.warning("tag %s has a duplicate (it isn't added)", tag.name)
+            return False
 
-    def __get_devices_from_tags(self) -> list:
-        """Returns devices which is used by all tags"""
-        devices = set()
-        for tag in self.__hash_tags.values():
-            devices.add(tag.device)
+        self.__hash_tags[key] = tag
+        super().add(tag)
+        device = tag.device
+        refs = self.__device_refs.get(device, 0)
+        self.__device_refs[device] = refs + 1
+        dev_name = DataModel.__device_name(device)
+        self.__by_device.setdefault(dev_name, {})[tag.name] = tag
+        self.__by_address.setdefault((dev_name, tag.address), []).append(tag)
+        return 0 == refs
+
+    def __discard(self, tag: Tag) -> Tag:
+        """Removes tag with the name from the set and indexes,
+        returns the removed tag if it was the last tag of its device, otherwise None """
+        assert tag is not None, " None instead of Tag"
 
-        return list(devices)
+        key = hash(tag.name)
+        tag = self.__hash_tags.pop(key, None)
+        if tag is None:
+            return None
 
-    def __get_drivers_from_tags(self) -> list:
-        """Returns drivers which is used by all tags"""
-        drivers = list()
-        return drivers
+        super().discard(tag)
+        device = tag.device
+        refs = self.__device_refs[device] - 1
+        if refs:
+            self.__device_refs[device] = refs
+        else:
+            del self.__device_refs[device]
+
+        dev_name = DataModel.__device_name(device)
+        dev_tags = self.__by_device[dev_name]
+        del dev_tags[tag.name]
+        if not dev_tags:
+            del self.__by_device[dev_name]
+        address_key = (dev_name, tag.address)
+        same_address = self.__by_address[address_key]
+        same_address.remove(tag)
+        if not same_address:
+            del self.__by_address[address_key]
+        return None if refs else tag
 
-        return list(drivers)
+    @staticmethod
+    def __device_name(device: Device):
+        return None if device is None else device.name()
 
     def __str__(self):
         msg = "model:\n"
@@ -8,13 +8,24 @@
 # -----------------------------------------------------------
 from PyQt5 import QtWidgets, QtCore
 import sys
-import numpy as np
-from MBTools.oiserver.Tag import Tag, TagType, TagTypeSize
+import logging
+from concurrent.futures import Future
+from MBTools.utilites import Log
+from MBTools.oiserver.Tag import Tag, TagType
 from MBTools.oiserver.DataModel import DataModel
-from MBTools.oiserver.OIServerConfigure import JsonConfigure
+from MBTools.oiserver.TagIndex import TagIndex
+from MBTools.oiserver.TagTable import TagTable
+from MBTools.oiserver.TagEncoder import TagEncoder
+from MBTools.oiserver.Subscriptions import Subscriptions, Subscription
 from MBTools.drivers.modbus.ModbusDriver import Range, \
-    DeviceCreator, DriverCreator, QualityEnum
-from MBTools.oiserver.OIServerConfigure import JsonConfigure, create_config, FormatName
+    Device, DeviceCreator, QualityEnum, REQUEST_DELAY
+from MBTools.drivers.modbus.QtDriver import QtDriverCreator
+from MBTools.oiserver.OIServerConfigure import JsonConfigure, Configurator, DeviceConfig, TagConfig, \
+    create_config, FormatName
+from MBTools.drivers.modbus.RangePlanner import RangePlanner
+from MBTools.utilites.Log import getLogger
+
+log = getLogger("oiserver")
 
 lock = QtCore.QMutex()
 
@@ -23,7 +34,8 @@ class IOServer(QtCore.QObject):
     dataChanged = QtCore.pyqtSignal()
     configChanged = QtCore.pyqtSignal()
 
-    def __init__(self, data=None, conf=None, parent=None):
+    def __init__(self, data=None, conf=None, parent=None, columnar: bool = False):
+        """ columnar - tags are stored in TagTable (rows of the table instead of Tag objects) """
         super().__init__(parent)
 
         self.__conf = conf
@@ -33,6 +45,10 @@ class IOServer(QtCore.QObject):
         self.__drv = None
         self.__devices = []
         self.__tags = []
+        self.__by_name = {}     # name -> tag
+        self.__index = None     # tags by ranges (None - should be rebuilt)
+        self.__table = TagTable() if columnar else None
+        self.__subscriptions = Subscriptions()
 
         self.__model = DataModel()
         self.__configurator = JsonConfigure()
@@ -57,17 +73,34 @@ class IOServer(QtCore.QObject):
 
         # Удаляем все теги
         self.__tags.clear()
+        self.__by_name.clear()
+        self.__index = None
+        if self.__table is not None:
+            self.__table = TagTable()
 
+        if self.__drv is not None:
+            self.__drv.close()
         self.__drv = None
         self.configChanged.emit()
 
-    def set_config(self, conf: JsonConfigure):
-        """Sets new tags set by using tag configuration"""
+    def set_config(self, conf: JsonConfigure, reload: bool = False):
+        """Sets new tags set by using tag configuration
+
+        If reload, the new configuration is applied as a difference with the current one:
+        devices with the same parameters keep their connections and polling, their ranges
+        are re-planned only if their tags are changed, tags with the same parameters keep
+        their values. Otherwise the current configuration is cleared and built again.
+        """
         if not conf:
             return None
         if not conf.is_valid():
             return None
 
+        if reload and self.__drv is not None and self.__conf is not None:
+            self.__reloadConfig(conf)
+            self.configChanged.emit()
+            return None
+
         """1. Old configuration clearing"""
         self.clear_config()
 
@@ -82,40 +115,41 @@ class IOServer(QtCore.QObject):
             # for dev in self.__drv.devices():
             #     self.__drv.delDevice(dev)
         else:
-            self.__drv = DriverCreator.create("modbus")
-            self.__drv.dataChanged.connect(self.__onDataUpdated)
+            # data are delivered by Qt adapter to the thread of the server,
+            # ranges of one poll cycle of device come together
+            self.__drv = QtDriverCreator.create("modbus")
+            self.__drv.setBatchWindow(0)
+            self.__drv.rangesChanged.connect(self.__onRangesUpdated)
             self.__drv.rangeNumberChanged.connect(self.__onRangeNumberChanged)
 
         self.__devices.clear()
         for dev_cfg in devs_cfg:
-            print(dev_cfg)
-            dev = DeviceCreator.create(dev_cfg.ip, dev_cfg.port, dev_cfg.name)
-            self.__devices.append(dev)
+            self.__devices.append(self.__createDevice(dev_cfg))
 
         for dev in self.__devices:
             self.__drv.addDevice(dev)
 
-        print("OIServer: registered devices:")
         for dev in self.__devices:
-            print("\tOIServer: {} ({}:{})".
-                  format(dev.name(), dev.ip(), dev.port()))
+            log.info("registered device: %s (%s:%s)", dev.name(), dev.ip(), dev.port())
 
         """3. Tags configuration"""
+        plans = self.__conf.range_plans()
+        if plans is not None:
+            # requests are planned already (compiled configuration)
+            for dev in self.__devices:
+                self.__addPlannedRanges(dev, plans.get(dev.name(), {}))
+
+        devices = {dev.name(): dev for dev in self.__devices}
         tags = []
         self.__tags = []
-        self.__tags.clear()
+        self.__by_name = {}
+        self.__index = None
         for tag_cfg in tags_cfg:
-            print(tag_cfg)
-            for dev in self.__devices:
-                if dev.name() == tag_cfg.device_name:
-                    tag = Tag(device=dev,
-                              name=tag_cfg.name,
-                              type_=tag_cfg.type,
-                              comment=tag_cfg.comment,
-                              address=tag_cfg.address)
-                    if (TagType.BOOL == tag.type):
-                        tag.bit_number = tag_cfg.bit_number
-                    tags.append(tag)
+            log.debug("%s", tag_cfg)
+            dev = devices.get(tag_cfg.device_name)
+            if dev is None:
+                continue
+            tags.append(IOServer.__createTag(tag_cfg, dev))
         self.add_tags(tags)
 
         self.configChanged.emit()
@@ -139,60 +173,106 @@ class IOServer(QtCore.QObject):
         Args:
             tags: list of tags wich will be added in self.__tags
 
-        \bugs Если для адреса нового тега уже существует диапазон, то все равно создается
-        новый диапазон (запрос) для нового тега. Разобраться.
-        \todo Для последнего тега, если он больше 1 регистра, добавляется в конец еще адрес.
-        Сделать это сразу после формирования свписка, а не в блоке <if device_tags:> - подумать
+        Requests for new tags are planned by RangePlanner using the cost parameters
+        of each device, separately for every scan class (tag.scan_rate). Tags which
+        are already read by an existing range are skipped (the range is polled faster
+        if the tag requires it), a multi-register tag is never split between ranges.
         """
+        if self.__table is not None:
+            tags = self.__table.extend(tags)
         self.__tags.extend(tags)
-        addresses = []
-        ranges = []
-        """We split new tags numbers by devices.
-        Not consider tags which numbers is existed already.y"""
-        for i, dev in enumerate(self.__devices):
+        for tag in tags:
+            self.__by_name.setdefault(tag.name, tag)
+
+        dev_tags = {}       # device name -> new tags of the device
+        for tag in tags:
+            dev_tags.setdefault(tag.device.name(), []).append(tag)
+
+        for dev in self.__devices:
             dev_name = dev.name()
-            device_tags = [tag for tag in tags if tag.device.name() == dev_name]
-            device_addrs = [tag.address for tag in device_tags
-                            if not dev.isAddressExists(tag.address)]
-            """If the last tag is multy-register tag (larger than 1 register), 
-            we add tail (the required number of numbers to the end)."""
-            if device_tags:
-                last_tag = device_tags[-1]
-                if last_tag.size() > 1:
-                    device_addrs.append(last_tag.address + last_tag.size() - 1)
-                    """To ensure that a multi-register tag is not split between 
-                    ranges, we expand the new range from the beginning."""
-                    # if dev.isAddressExists(last_tag.address):
-                    #     device_addrs.append(last_tag.address - 1)
-                    device_addrs.append(last_tag.address)
-            device_addrs = list(set(device_addrs))  # Removing duplicates of numbers from the list
-
-            addresses.append(device_addrs)
-            print("numbers: {0}".format(addresses))
-
-        """We find numbers ranges for each device"""
-        for device_addrs in addresses:
-            range_ = IOServer.__calculateRanges(100, device_addrs)
-            ranges.append(range_)
-
-        """Configuring devices by setting numbers ranges"""
-        for dev, dev_ranges in zip(self.__devices, ranges):
-            if dev_ranges:
-                for i, range_ in enumerate(dev_ranges):
-                    dev.addRange(range_[0],
-                                 range_[1] - range_[0] + 1,
-                                 "range{}".format(i))
+            spans = []
+            for tag in dev_tags.get(dev_name, []):
+                rate = tag.scan_rate or REQUEST_DELAY
+                range_ = dev.spanRange(tag.address, tag.size())
+                if range_ is None:
+                    spans.append((tag.address, tag.size(), rate))
+                elif range_.scanRate() > rate:
+                    range_.setScanRate(rate)
+            if not spans:
+                continue
+
+            self.__addPlannedRanges(dev, RangePlanner.plan_classes(spans, dev.planCost()))
+
+        self.__index = None
+        self.__tagIndex()
 
     def tag(self, name: str) -> Tag:
         """ Returns tag by name """
-        res_tag = None
-        for tag in self.__tags:
-            # print(tag)
-            if tag.name == name:
-                res_tag = tag
-                break
+        return self.__by_name.get(name)
+
+    def subscribe(self, target, callback, absolute: float = None, percent: float = None) -> Subscription:
+        """Subscribes callback to changes of tags
+
+        Args:
+            target: tag name, pattern of names ("TAG1_*") or group (list of names, patterns or tags)
+            callback: callable(changes), changes - list of TagChange(tag, old, new, quality, timestamp)
+                of the subscribed tags changed by one update (ranges delivered together: poll cycle of device or more),
+                called in the thread of the server
+            absolute, percent: deadband of numeric values, absolute and/or in percent of the value
+                passed last time (by default any change is passed)
+
+        Subscription is kept by names, so it works for tags added or reloaded later.
+        Returns subscription for unsubscribe.
+        """
+        return self.__subscriptions.subscribe(target, callback, absolute, percent)
+
+    def unsubscribe(self, subscription: Subscription):
+        self.__subscriptions.unsubscribe(subscription)
+
+    def write_tags(self, values: dict) -> dict:
+        """Writes values of tags {name: value}
 
-        return res_tag
+        Values are encoded to registers by types of tags (see TagEncoder) and are sent only
+        to devices of the tags. Registers of all tags of one device are queued at once, so
+        adjacent registers are written by one request. BOOL tag changes only its bit: bits of one
+        register are merged to one mask write (see Device.writeBits), other bits are kept.
+
+        Returns {name: concurrent.futures.Future}, result of the future is True when the tag
+        has been written, otherwise it contains exception: KeyError - unknown tag,
+        ValueError - value can't be written to the tag, ConnectionError, WriteError.
+        """
+        results = {}
+        commands = {}       # device -> [(name, address, registers)]
+        bits = {}           # device -> [(name, address, bit number, value)]
+        devices = set(self.__drv.devices()) if self.__drv is not None else set()
+        for name, value in values.items():
+            tag = self.__by_name.get(name)
+            try:
+                if tag is None:
+                    raise KeyError("unknown tag {0}".format(name))
+                if tag.device not in devices:
+                    raise ConnectionError("device of tag {0} isn't polled".format(name))
+                if TagType.BOOL == tag.type:
+                    bit_number, bit = TagEncoder.bit(tag, value)
+                    bits.setdefault(tag.device, []).append((name, tag.address, bit_number, bit))
+                    continue
+                registers = TagEncoder.encode(tag, value)
+            except (KeyError, ValueError, TypeError, ConnectionError) as err:
+                results[name] = IOServer.__failed(err)
+                continue
+            commands.setdefault(tag.device, []).append((name, tag.address, registers))
+
+        for device, dev_commands in commands.items():
+            futures = device.writeMany([(address, registers) for name, address, registers in dev_commands])
+            for (name, address, registers), future in zip(dev_commands, futures):
+                results[name] = future
+            log.debug("%s: write %s", device.name(), [name for name, address, registers in dev_commands])
+        for device, dev_bits in bits.items():
+            futures = device.writeBits([(address, bit_number, bit) for name, address, bit_number, bit in dev_bits])
+            for (name, address, bit_number, bit), future in zip(dev_bits, futures):
+                results[name] = future
+            log.debug("%s: write bits %s", device.name(), [name for name, address, bit_number, bit in dev_bits])
+        return results
 
     def tags(self):
         """ Returns all tags """
@@ -201,89 +281,209 @@ class IOServer(QtCore.QObject):
     def driver(self):
         return self.__drv
 
+    def table(self) -> TagTable:
+        """ Returns table of tags (None if tags aren't columnar) """
+        return self.__table
+
     # --- private ---
     @staticmethod
-    def __calculateRanges(max_len: int, addresses: list) -> dict:
-        """ Method calculates ranges for modbus driver """
-        if len(addresses) < 1:
-            return None
-        ranges = []
-        addresses.sort()
-        min_value = min(addresses)
-        max_value = max(addresses)
-        first = min_value
-
-        x_old = min_value
-        print(addresses)
-        for x in addresses:
-            if (x - first) > max_len:
-                # last = x_old
-                pair = [first, x_old]
-                ranges.append(pair)
-                first = x
-            if x == max_value:
-                pair = [first, x]
-                ranges.append(pair)
-            x_old = x
-
-        return ranges
+    def __failed(error: Exception) -> Future:
+        future = Future()
+        future.set_exception(error)
+        return future
+
+    def __createDevice(self, dev_cfg: DeviceConfig) -> Device:
+        """ Creates device by its configuration (the device isn't added to the driver) """
+        log.debug("%s", dev_cfg)
+        if dev_cfg.unit is not None:
+            dev = DeviceCreator.create(dev_cfg.ip, dev_cfg.port, dev_cfg.name, dev_cfg.unit)
+        else:
+            dev = DeviceCreator.create(dev_cfg.ip, dev_cfg.port, dev_cfg.name)
+        if dev_cfg.sessions is not None:
+            self.__drv.setSessionLimit(dev_cfg.ip, dev_cfg.port, dev_cfg.sessions)
+        if dev_cfg.cost is not None:
+            dev.setPlanCost(dev_cfg.cost)
+        if dev_cfg.pipeline is not None:
+            dev.setPipelineDepth(dev_cfg.pipeline)
+        if dev_cfg.heartbeat is not None:
+            dev.setHeartbeat(dev_cfg.heartbeat)
+        if dev_cfg.mask_write is not None:
+            dev.setMaskWrite(dev_cfg.mask_write)
+        return dev
 
     @staticmethod
-    def __regsToValue(regs: [], type_: TagType, bit_number=None):
-        if regs is None or type_ is None:
-            return None
+    def __createTag(tag_cfg: TagConfig, dev: Device) -> Tag:
+        log.debug("%s", tag_cfg)
+        tag = Tag(device=dev,
+                  name=tag_cfg.name,
+                  type_=tag_cfg.type,
+                  comment=tag_cfg.comment,
+                  address=tag_cfg.address,
+                  scan_rate=tag_cfg.scan_rate)
+        if (TagType.BOOL == tag.type):
+            tag.bit_number = tag_cfg.bit_number
+        return tag
 
-        if len(regs) < TagTypeSize[type_]:
-            return None
+    @staticmethod
+    def __sameDevice(old: DeviceConfig, new: DeviceConfig) -> bool:
+        """ Checks that device may be kept (parameters of connection and polling aren't changed) """
+        return (old.protocol, old.ip, old.port, old.unit, old.cost, old.pipeline, old.sessions, old.heartbeat,
+                old.mask_write) == \
+            (new.protocol, new.ip, new.port, new.unit, new.cost, new.pipeline, new.sessions, new.heartbeat,
+             new.mask_write)
 
-        if TagType.INT == type_:
-            return regs[0]
-        elif TagType.WORD == type_:
-            return regs[0]
-        elif TagType.UINT == type_:
-            return regs[0]
-        elif TagType.REAL == type_:
-            data_bytes = np.array([regs[0], regs[1]], dtype=np.uint16)
-            data_as_float = data_bytes.view(dtype=np.float32)
-            return data_as_float[0]
-        elif TagType.DWORD == type_:
-            data_as_dword = (regs[1] << 16) + regs[0]
-            return data_as_dword
-        elif TagType.BOOL == type_:
-            assert (bit_number is not None)
-            output = [int(x) for x in '{:08b}'.format(regs[0])]
-            output.reverse()
-            # Заполняем старшие биты нулями (пока просто добавляем 16 нулей, потом сделать лучуше)
-            output.extend([0 for i in range(16)])
-            return bool(output[bit_number])
-
-    @QtCore.pyqtSlot(str, Range)
-    def __onDataUpdated(self, dev_name, range_):
-        for tag in self.__tags:
-            address = tag.address
-            if range_.isAddressExists(address):
-                sz = TagTypeSize[tag.type]
-                regs = range_.reristersNum(address, sz)
-                if dev_name == tag.device.name():
-                    if TagType.BOOL == tag.type:
-                        tag.value = IOServer.__regsToValue(regs, tag.type, tag.bit_number)
-                    else:
-                        tag.value = IOServer.__regsToValue(regs, tag.type, tag.bit_number)
-                    tag.quality = range_.quality()
-                    tag.time = range_.time()
-            # print(tag)
+    @staticmethod
+    def __sameTag(tag: Tag, tag_cfg: TagConfig) -> bool:
+        """ Checks that tag reads the same data (comment may be changed) """
+        bit_number = tag_cfg.bit_number if TagType.BOOL == tag_cfg.type else None
+        return (tag.type, tag.address, tag.bit_number, tag.scan_rate) == \
+            (tag_cfg.type, tag_cfg.address, bit_number, tag_cfg.scan_rate)
+
+    def __reloadConfig(self, conf: Configurator):
+        """ Applies difference of the new configuration with the current one """
+        old_cfgs = {dev_cfg.name: dev_cfg for dev_cfg in self.__conf.devices_config()}
+        old_devices = {dev.name(): dev for dev in self.__devices}
+        old_tags = {tag.name: tag for tag in self.__tags}
+        index = self.__index            # changing of ranges resets the index
+        self.__conf = conf
+
+        # devices
+        devices = []
+        kept = set()        # names of kept devices
+        for dev_cfg in conf.devices_config():
+            dev = old_devices.pop(dev_cfg.name, None)
+            old_cfg = old_cfgs.get(dev_cfg.name)
+            if dev is not None and old_cfg is not None and IOServer.__sameDevice(old_cfg, dev_cfg):
+                kept.add(dev_cfg.name)
+                devices.append(dev)
+                continue
+            if dev is not None:
+                self.__drv.delDevice(dev)
+            dev = self.__createDevice(dev_cfg)
+            self.__drv.addDevice(dev)
+            log.info("registered device: %s (%s:%s)", dev.name(), dev.ip(), dev.port())
+            devices.append(dev)
+        for dev in old_devices.values():
+            self.__drv.delDevice(dev)
+            log.info("removed device: %s", dev.name())
+        self.__devices = devices
+        by_name = {dev.name(): dev for dev in devices}
+
+        # tags: tags of kept devices which read the same data are kept with their values
+        tags = []
+        dev_tags = {}       # device name -> tags
+        changed = set()     # names of devices whose tags are changed
+        for tag_cfg in conf.tags_config():
+            dev = by_name.get(tag_cfg.device_name)
+            if dev is None:
+                continue
+            tag = old_tags.pop(tag_cfg.name, None)
+            if tag is not None and tag.device is dev and IOServer.__sameTag(tag, tag_cfg):
+                tag.comment = tag_cfg.comment
+            else:
+                if tag is not None:
+                    changed.add(tag.device.name())
+                tag = IOServer.__createTag(tag_cfg, dev)
+                changed.add(dev.name())
+            tags.append(tag)
+            dev_tags.setdefault(dev.name(), []).append(tag)
+        for tag in old_tags.values():
+            changed.add(tag.device.name())
+
+        # ranges: only requests of changed or new devices are planned
+        plans = conf.range_plans()
+        updated = [dev for dev in devices if dev.name() not in kept or dev.name() in changed]
+        for dev in updated:
+            name = dev.name()
+            if plans is not None:
+                dev_plans = plans.get(name, {})
+            else:
+                spans = [(tag.address, tag.size(), tag.scan_rate or REQUEST_DELAY) for tag in dev_tags.get(name, [])]
+                dev_plans = RangePlanner.plan_classes(spans, dev.planCost()) if spans else {}
+            self.__replaceRanges(dev, dev_plans)
+
+        if self.__table is not None:
+            self.__table = TagTable()
+            tags = self.__table.extend(tags)
+            index = None                # rows of the new table
+        self.__tags = tags
+        self.__by_name = {}
+        for tag in tags:
+            self.__by_name.setdefault(tag.name, tag)
+        self.__index = index
+        if index is not None:
+            # only parts of removed and re-planned devices are rebuilt
+            for name in old_devices:
+                index.remove(name)
+            for dev in updated:
+                index.update(dev, dev_tags.get(dev.name(), []))
+            for tag in index.unconfigured():
+                tag.quality = QualityEnum.NOT_CONFIGURED
+        self.__tagIndex()
+        log.info("configuration is reloaded: %d devices (%d kept), %d tags", len(devices), len(kept), len(tags))
+
+    def __replaceRanges(self, dev: Device, plans: dict):
+        """ Replaces ranges of the device by planned requests {scan_rate: ReadPlan}, same ranges are kept """
+        planned = {(first, last - first + 1, rate) for rate, plan in plans.items() for first, last in plan.requests}
+        for range_ in list(dev.ranges()):
+            key = (range_.address(), range_.number(), range_.scanRate())
+            if key in planned:
+                planned.discard(key)
+            else:
+                dev.delRange(range_)
+        names = {range_.objectName() for range_ in dev.ranges()}
+        number = len(dev.ranges())
+        for address, count, rate in sorted(planned, key=lambda item: (item[2], item[0])):
+            while "range{}".format(number) in names:
+                number += 1
+            dev.addRange(address, count, "range{}".format(number), rate)
+            number += 1
+
+    @staticmethod
+    def __addPlannedRanges(dev, plans: dict):
+        """ Adds ranges of planned requests {scan_rate: ReadPlan} to the device """
+        for rate, plan in sorted(plans.items()):
+            for range_ in plan.requests:
+                dev.addRange(range_[0],
+                             range_[1] - range_[0] + 1,
+                             "range{}".format(len(dev.ranges())),
+                             rate)
+            log.info("%s: scan %ss: %s", dev.name(), rate, plan)
+        if plans:
+            log.info("%s: link load %.3f", dev.name(), RangePlanner.load(plans))
+
+    def __tagIndex(self) -> TagIndex:
+        """ Returns index of tags by ranges, rebuilds it after changing tags or ranges """
+        if self.__index is None:
+            self.__index = TagIndex(self.__tags)
+            for tag in self.__index.unconfigured():
+                tag.quality = QualityEnum.NOT_CONFIGURED
+        return self.__index
+
+    @QtCore.pyqtSlot(list)
+    def __onRangesUpdated(self, ranges: list):
+        """ Updates tags of the ranges [(device name, Range), ...], notifies about all of them at once """
+        index = self.__tagIndex()
+        watched = []
+        for dev_name, range_ in ranges:
+            batch = index.batch(dev_name, range_.dataId())
+            if len(batch):
+                watched.extend(self.__subscriptions.watched(batch.tags))
+                batch.store(batch.decode(range_.registers()), range_.quality(), range_.timestamp())
+        if watched:
+            self.__subscriptions.notify(watched)
 
         self.dataChanged.emit()
 
     @QtCore.pyqtSlot()
     def __onRangeNumberChanged(self):
-        for i in range(len(self.__tags)):
-            if not self.__drv.isAddressExists(self.__tags[i].address):
-                self.__tags[i].quality = QualityEnum.NOT_CONFIGURED
+        # ranges are added one by one on configuring, so the index is rebuilt on demand
+        self.__index = None
 
 
 def main(argv):
     app = QtWidgets.QApplication(sys.argv)
+    Log.setup(logging.INFO)
 
     conf = create_config(FormatName.JSON, "conf.json")
     if conf is None:
@@ -12,12 +12,17 @@ from typing import Final
 
 from MBTools.oiserver.Tag import Tag, TagType
 from MBTools.drivers.modbus.ModbusDriver import *
-from MBTools.oiserver.constants import TagTypeFromStr, StrFromTagType
+from MBTools.drivers.modbus.RangePlanner import RangePlanner, PlanCost
+from MBTools.oiserver.constants import TagTypeFromStr, StrFromTagType, TagTypeSize
 from MBTools.oiserver.DataModel import DataModel
+from MBTools.oiserver.ConfigCache import ConfigCache
 
 from PyQt5 import QtWidgets
 
 from abc import ABC, abstractmethod
+from MBTools.utilites.Log import getLogger
+
+log = getLogger("oiserver.config")
 
 
 # ------------ CONSTANTS BEGIN ------------------
@@ -34,6 +39,14 @@ class DEVICE_ALIASES:
     IP = "ip"
     PORT = "port"
     COMMENT = "comment"
+    REQUEST_COST = "request_cost"       # optional: cost of one request, sec
+    REGISTER_COST = "register_cost"     # optional: cost of one register, sec
+    MAX_REGISTERS = "max_registers"     # optional: max registers in one request
+    PIPELINE = "pipeline"               # optional: number of in-flight requests (async engine)
+    UNIT = "unit"                       # optional: modbus unit id
+    SESSIONS = "sessions"               # optional: max TCP sessions to ip:port (shared by devices)
+    HEARTBEAT = "heartbeat"             # optional: period of re-emitting not changed ranges, sec
+    MASK_WRITE = "mask_write"           # optional: true - bits are written by FC22 (mask write register)
 
 
 class TAG_ALIASES:
@@ -44,18 +57,27 @@ class TAG_ALIASES:
     ADDRESS = "address"
     BIT = "bit"
     COMMENT = "comment"
+    SCAN = "scan"                       # optional: polling period, ms or name of scan class
 
 # ------------ CONSTANTS END ------------------
 
 
 class DeviceConfig:
     """ Container which contains device configuration """
-    def __init__(self, name: str, protocol: str, ip: str, port: int, comment=''):
+    def __init__(self, name: str, protocol: str, ip: str, port: int, comment='', cost: PlanCost = None,
+                 pipeline: int = None, unit: int = None, sessions: int = None, heartbeat: float = None,
+                 mask_write: bool = None):
         self.name = name
         self.protocol = protocol
         self.ip = ip
         self.port = port
         self.comment = comment
+        self.cost = cost        # cost parameters of requests, None - default
+        self.pipeline = pipeline    # number of in-flight requests, None - default
+        self.unit = unit            # modbus unit id, None - default
+        self.sessions = sessions    # max sessions to ip:port, None - default
+        self.heartbeat = heartbeat  # period of re-emitting not changed ranges, None - never
+        self.mask_write = mask_write    # bits are written by FC22, None - default (read-modify-write)
 
     def __str__(self):
         return "{0}: {1}; {2}; {3}; {4}".format(
@@ -65,18 +87,33 @@ class DeviceConfig:
 
 class TagConfig:
     """ Container which contains tag configuration """
-    def __init__(self, name: str, device_name: str, address: int, type_: TagType, comment='', bit_number=None):
+    def __init__(self, name: str, device_name: str, address: int, type_: TagType, comment='', bit_number=None,
+                 scan_rate: float = None):
         self.name = name
         self.device_name = device_name
         self.address = address  # register address
         self.bit_number = bit_number          # bit number
         self.type = type_       # type of register
         self.comment = comment
+        self.scan_rate = scan_rate            # polling period, sec (None - default)
 
     def set_bit(self, bit_number: int):
         assert (bit_number >= 0 & bit_number < 16)
         self.bit_number = bit_number
 
+    @staticmethod
+    def to_columns(tags: list) -> tuple:
+        """ Returns fields of tags by columns (compact for saving: pickle of objects is much slower) """
+        return tuple(list(column) for column in zip(*[
+            (tag.name, tag.device_name, tag.address, tag.type, tag.comment, tag.bit_number, tag.scan_rate)
+            for tag in tags])) or ([],) * 7
+
+    @staticmethod
+    def from_columns(columns: tuple) -> list:
+        """ Returns tags from columns of TagConfig.to_columns """
+        return [TagConfig(name, device_name, address, type_, comment, bit_number, scan_rate)
+                for name, device_name, address, type_, comment, bit_number, scan_rate in zip(*columns)]
+
     def __str__(self):
         return "{0}: {1}; {2}; {3}; {4}".format(
             self.name, self.device_name, self.address, self.type, self.comment
@@ -94,6 +131,7 @@ class Configurator(ABC):
         # self._devices = []
         self._valid = False        # has valid configuration
         self._model = None
+        self._plans = None         # {device name: {scan_rate: ReadPlan}}, None - aren't planned
 
     def set_model(self, model: DataModel):
         self._model = model
@@ -104,6 +142,10 @@ class Configurator(ABC):
     def is_valid(self):
         return self._valid
 
+    def range_plans(self):
+        """ Returns planned requests of devices {device name: {scan_rate: ReadPlan}}, otherwise None """
+        return self._plans
+
     @abstractmethod
     def read_model_config(self, filename: str):
         """Reads config file and write configuration to model data"""
@@ -138,6 +180,7 @@ class Configurator(ABC):
         # self._tags.clear()
         # self._devices.clear()
         self._valid = False
+        self._plans = None
 
     def tags_config(self):
         """ Returns current tags configuration """
@@ -150,18 +193,22 @@ class Configurator(ABC):
     def add_tag(self, tag: TagConfig):
         """ Adds new tag in tag list """
         self._tags_config.append(tag)
+        self._plans = None
 
     def rem_tag(self, name: str):
         """ Removes tag by name """
-        pass
+        self._tags_config = [tag for tag in self._tags_config if tag.name != name]
+        self._plans = None
 
     def add_device(self, dev: DeviceConfig):
         """ Adds new device in devices list """
         self._devices_config.append(dev)
+        self._plans = None
 
     def rem_device(self, name: str):
         """ Removes device by name """
-        pass
+        self._devices_config = [dev for dev in self._devices_config if dev.name != name]
+        self._plans = None
 
     def __str__(self):
         devs_str = "\n\t".join([str(dev) for dev in self._devices_config])
@@ -208,12 +255,25 @@ class JsonConfigure(Configurator):
                     protocol=dev[DEVICE_ALIASES.PROTOCOL]
                     ip=dev[DEVICE_ALIASES.IP]
                     port=dev[DEVICE_ALIASES.PORT]
-                    dev = DeviceCreator.create(ip, port, name)
+                    cost = ConfigCalculater.plan_cost_from_json(dev)
+                    pipeline = dev.get(DEVICE_ALIASES.PIPELINE)
+                    heartbeat = dev.get(DEVICE_ALIASES.HEARTBEAT)
+                    mask_write = dev.get(DEVICE_ALIASES.MASK_WRITE)
+                    dev = DeviceCreator.create(ip, port, name, dev.get(DEVICE_ALIASES.UNIT, DEFAULT_UNIT))
+                    if cost is not None:
+                        dev.setPlanCost(cost)
+                    if pipeline is not None:
+                        dev.setPipelineDepth(pipeline)
+                    if heartbeat is not None:
+                        dev.setHeartbeat(heartbeat)
+                    if mask_write is not None:
+                        dev.setMaskWrite(mask_write)
                     key = hash(dev.name())
                     devices[key] = dev
 
                 # tags
                 tags = self.__data[TAG_BLOCK_ALIASE]
+                model_tags = []
                 for tag in tags:
                     tag_type = None
                     if tag[TAG_ALIASES.TYPE] in TagTypeFromStr:
@@ -231,18 +291,20 @@ class JsonConfigure(Configurator):
                     key = hash(device_name)
                     dev = devices.get(key)
                     if dev is None:
-                        print("{0}, {1}: Bag tag's device in configuration, Break".format(key, device_name))
+                        log.error("%s, %s: bad tag's device in configuration, break", key, device_name)
                         continue
 
-                    tagr = Tag(device=dev, name=name, type_=type_, comment=comment, address=address)
+                    tagr = Tag(device=dev, name=name, type_=type_, comment=comment, address=address,
+                               scan_rate=ConfigCalculater.scan_rate_from_json(tag))
                     if (TagType.BOOL == tagr.type):
                         bit_number = tag[TAG_ALIASES.BIT]
                         tagr.bit_number = bit_number
 
-                    self._model.add(tagr)
+                    model_tags.append(tagr)
+                self._model.add_many(model_tags)
 
         except IOError as ioe:
-            print("Error opening the file_name: ", ioe)
+            log.error("error opening the file: %s", ioe)
             return None
 
         self._valid = True
@@ -251,12 +313,14 @@ class JsonConfigure(Configurator):
 
         self.__drv = DriverCreator.create("modbus")
         for dev in self._model.devices():
-            addresses = ConfigCalculater.addresses_from_tags(self._model.tags(), dev)
-            ranges = ModbusCalculator.split_numbers(addresses, 100)
-            for i, rng in enumerate(ranges):
-                dev.addRange(rng[0], rng[1] - rng[0] + 2, "range{}".format(i))
+            spans = ConfigCalculater.spans_from_tags(self._model.tags(), dev)
+            plans = RangePlanner.plan_classes(spans, dev.planCost())
+            for rate, plan in sorted(plans.items()):
+                for rng in plan.requests:
+                    dev.addRange(rng[0], rng[1] - rng[0] + 1, "range{}".format(len(dev.ranges())), rate)
                 # dev.start()
-            print(dev)
+            log.debug("%s", dev)
+            log.info("%s: link load %.3f", dev.name(), RangePlanner.load(plans))
             self.__drv.addDevice(dev)
 
         return True
@@ -295,6 +359,8 @@ class JsonConfigure(Configurator):
                     tag[TAG_ALIASES.ADDRESS] = itag.address
                     if TagType.BOOL == itag.type:
                         tag[TAG_ALIASES.BIT] = itag.bit_number
+                    if itag.scan_rate is not None:
+                        tag[TAG_ALIASES.SCAN] = round(itag.scan_rate * 1000)
                     tag[TAG_ALIASES.COMMENT] = itag.comment
 
                     tags.append(tag)
@@ -304,9 +370,38 @@ class JsonConfigure(Configurator):
                 json.dump(data, f, indent=4, ensure_ascii=False)
 
         except IOError as ioe:
-            print("Error opening the file_name: ", ioe)
+            log.error("error opening the file: %s", ioe)
 
-    def read_config(self, file_name: str):
+    def read_config(self, file_name: str, use_cache: bool = True):
+        """Returns (devices, tags) configuration of the file, otherwise None
+
+        If use_cache, the configuration and range plans are loaded from the compiled cache
+        (see ConfigCache) while the file isn't changed, otherwise the cache is rebuilt.
+        """
+        key = None
+        if use_cache:
+            cached = ConfigCache.load(file_name)
+            if cached is not None:
+                self.clear()
+                devices, tags, self._plans = cached
+                self._devices_config.extend(devices)
+                self._tags_config.extend(TagConfig.from_columns(tags))
+                self._valid = True
+                log.info("%s: configuration is loaded from cache", file_name)
+                return self._devices_config, self._tags_config
+            try:
+                key = ConfigCache.key(file_name)
+            except OSError:
+                pass
+
+        result = self.__read_json_config(file_name)
+        if result is not None and key is not None:
+            self._plans = ConfigCalculater.plans_from_configs(self._devices_config, self._tags_config)
+            ConfigCache.save(file_name, key, self._devices_config, TagConfig.to_columns(self._tags_config),
+                             self._plans)
+        return result
+
+    def __read_json_config(self, file_name: str):
         try:
             with open(file_name, 'r') as f:
                 self.__data = json.load(f)
@@ -317,7 +412,13 @@ class JsonConfigure(Configurator):
                     dev_config = DeviceConfig(name=dev[DEVICE_ALIASES.NAME],
                                               protocol=dev[DEVICE_ALIASES.PROTOCOL],
                                               ip=dev[DEVICE_ALIASES.IP],
-                                              port=dev[DEVICE_ALIASES.PORT])
+                                              port=dev[DEVICE_ALIASES.PORT],
+                                              cost=ConfigCalculater.plan_cost_from_json(dev),
+                                              pipeline=dev.get(DEVICE_ALIASES.PIPELINE),
+                                              unit=dev.get(DEVICE_ALIASES.UNIT),
+                                              sessions=dev.get(DEVICE_ALIASES.SESSIONS),
+                                              heartbeat=dev.get(DEVICE_ALIASES.HEARTBEAT),
+                                              mask_write=dev.get(DEVICE_ALIASES.MASK_WRITE))
                     self._devices_config.append(dev_config)
 
                 tags = self.__data[TAG_BLOCK_ALIASE]
@@ -331,13 +432,14 @@ class JsonConfigure(Configurator):
                                            type_=tag_type,
                                            device_name=tag[TAG_ALIASES.DEVICE],
                                            address=tag[TAG_ALIASES.ADDRESS],
-                                           comment=tag[TAG_ALIASES.COMMENT])
+                                           comment=tag[TAG_ALIASES.COMMENT],
+                                           scan_rate=ConfigCalculater.scan_rate_from_json(tag))
                     if (TagType.BOOL == tag_type):
                         bit_number = tag[TAG_ALIASES.BIT]
                         tag_config.set_bit(bit_number)
                     self._tags_config.append(tag_config)
         except IOError as ioe:
-            print("Error opening the file_name: ", ioe)
+            log.error("error opening the file: %s", ioe)
             return None
 
         self._valid = True
@@ -354,6 +456,20 @@ class JsonConfigure(Configurator):
                     device[DEVICE_ALIASES.PROTOCOL] = device_config.protocol
                     device[DEVICE_ALIASES.IP] = device_config.ip
                     device[DEVICE_ALIASES.PORT] = device_config.port
+                    if device_config.cost is not None:
+                        device[DEVICE_ALIASES.REQUEST_COST] = device_config.cost.request_cost
+                        device[DEVICE_ALIASES.REGISTER_COST] = device_config.cost.register_cost
+                        device[DEVICE_ALIASES.MAX_REGISTERS] = device_config.cost.max_registers
+                    if device_config.pipeline is not None:
+                        device[DEVICE_ALIASES.PIPELINE] = device_config.pipeline
+                    if device_config.unit is not None:
+                        device[DEVICE_ALIASES.UNIT] = device_config.unit
+                    if device_config.sessions is not None:
+                        device[DEVICE_ALIASES.SESSIONS] = device_config.sessions
+                    if device_config.heartbeat is not None:
+                        device[DEVICE_ALIASES.HEARTBEAT] = device_config.heartbeat
+                    if device_config.mask_write is not None:
+                        device[DEVICE_ALIASES.MASK_WRITE] = device_config.mask_write
 
                     devices.append(device)
 
@@ -368,6 +484,8 @@ class JsonConfigure(Configurator):
                     tag[TAG_ALIASES.ADDRESS] = tag_config.address
                     if TagType.BOOL == tag_config.type:
                         tag[TAG_ALIASES.BIT] = tag_config.bit_number
+                    if tag_config.scan_rate is not None:
+                        tag[TAG_ALIASES.SCAN] = round(tag_config.scan_rate * 1000)
                     tag[TAG_ALIASES.COMMENT] = tag_config.comment
 
                     tags.append(tag)
@@ -377,7 +495,7 @@ class JsonConfigure(Configurator):
                 json.dump(data, f, indent=4, ensure_ascii=False)
 
         except IOError as ioe:
-            print("Error opening the file_name: ", ioe)
+            log.error("error opening the file: %s", ioe)
         pass
 
 
@@ -392,9 +510,59 @@ class ConfigCalculater(object):
         addresses = [tag.address for tag in tags if dev.name() == tag.device.name()]
         addr_set = set(addresses)
         addresses = list(addr_set)
-        print(dev.name(), addresses)
+        log.debug("%s: %s", dev.name(), addresses)
         return addresses
 
+    @staticmethod
+    def spans_from_tags(tags: list, dev: Device) -> list:
+        """Returns (address, size, scan_rate) of all tags of the device"""
+        return [(tag.address, tag.size(), tag.scan_rate or REQUEST_DELAY)
+                for tag in tags if dev.name() == tag.device.name()]
+
+    @staticmethod
+    def plans_from_configs(devices_config: list, tags_config: list) -> dict:
+        """Returns planned requests of devices {device name: {scan_rate: ReadPlan}}
+
+        Tags are grouped by device in one pass, requests are planned as IOServer.add_tags does it.
+        """
+        spans = {dev_cfg.name: [] for dev_cfg in devices_config}
+        for tag_cfg in tags_config:
+            dev_spans = spans.get(tag_cfg.device_name)
+            if dev_spans is not None:
+                dev_spans.append((tag_cfg.address, TagTypeSize[tag_cfg.type], tag_cfg.scan_rate or REQUEST_DELAY))
+        return {dev_cfg.name: RangePlanner.plan_classes(spans[dev_cfg.name], dev_cfg.cost or PlanCost())
+                for dev_cfg in devices_config if spans[dev_cfg.name]}
+
+    @staticmethod
+    def scan_rate_from_json(tag: dict):
+        """Returns polling period (sec) from tag json block, otherwise None (default period)
+
+        The period is set in milliseconds or by name of scan class (see SCAN_CLASSES)
+        """
+        scan = tag.get(TAG_ALIASES.SCAN)
+        if scan is None:
+            return None
+        if isinstance(scan, str):
+            if scan not in SCAN_CLASSES:
+                log.warning("%s: unknown scan class '%s', default is used", tag.get(TAG_ALIASES.NAME), scan)
+                return None
+            return SCAN_CLASSES[scan]
+        if scan <= 0:
+            log.warning("%s: bad scan period %s, default is used", tag.get(TAG_ALIASES.NAME), scan)
+            return None
+        return scan / 1000.0
+
+    @staticmethod
+    def plan_cost_from_json(dev: dict):
+        """Returns cost parameters from device json block, otherwise None (default costs)"""
+        keys = (DEVICE_ALIASES.REQUEST_COST, DEVICE_ALIASES.REGISTER_COST, DEVICE_ALIASES.MAX_REGISTERS)
+        if not any(key in dev for key in keys):
+            return None
+        default = PlanCost()
+        return PlanCost(request_cost=dev.get(DEVICE_ALIASES.REQUEST_COST, default.request_cost),
+                        register_cost=dev.get(DEVICE_ALIASES.REGISTER_COST, default.register_cost),
+                        max_registers=dev.get(DEVICE_ALIASES.MAX_REGISTERS, default.max_registers))
+
 
 class FormatName(Enum):
     JSON = 1
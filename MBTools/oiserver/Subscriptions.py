@@ -0,0 +1,130 @@
+# -*- coding: utf-8 -*-
+# -----------------------------------------------------------
+# This module contains subscriptions to changes of tags
+#
+# (C) 2021 Maxim Kozyakov, Voronezh, Russia
+# Released under GNU Public License (MIT)
+# email kmmax@yandex.ru
+# -----------------------------------------------------------
+
+"""
+Модуль Subscriptions.py
+Назначение:
+Подписки на изменения тегов сервера (вместо общего сигнала IOServer.dataChanged без аргументов,
+после которого каждый потребитель перебирает все теги).
+- подписка на имя тега, шаблон имен (fnmatch: "TAG1_*") или группу (список имен, шаблонов или тегов);
+- зона нечувствительности (deadband): абсолютная (|new - old| > absolute) и/или в процентах
+  от последнего переданного значения (|new - old| > percent * |old| / 100);
+  old - значение, последнее переданное подписчику, поэтому медленный дрейф тоже будет передан;
+- изменение качества передается всегда, нечисловые значения (BOOL, None) - при любом изменении;
+- подписчик получает один список TagChange(tag, old, new, quality, timestamp) на обновление
+  (ranges, доставленные вместе: цикл опроса устройства или больше), в нем только его измененные теги.
+Подписчики по имени тега находятся по словарю (кэш имя -> подписки сбрасывается при изменении подписок),
+поэтому обновление range стоит O(тегов range), а виджет одного тега получает только свои изменения.
+Подписки хранят имена, а не теги, и продолжают работать после перезагрузки конфигурации.
+"""
+
+from collections import namedtuple
+from fnmatch import fnmatchcase
+from numbers import Number
+
+TagChange = namedtuple("TagChange", ["tag", "old", "new", "quality", "timestamp"])
+
+PATTERN_CHARS = "*?["
+
+
+class Subscription(object):
+    """ Subscription of the callback to changes of tags (see Subscriptions.subscribe) """
+    def __init__(self, target, callback, absolute: float = None, percent: float = None):
+        """
+        :param target: tag name, pattern of names or group (iterable of names, patterns or tags)
+        :param callback: callable(changes: list of TagChange)
+        """
+        if isinstance(target, str):
+            target = [target]
+        names = [getattr(item, "name", item) for item in target]
+        self.names = {name for name in names if not Subscription.isPattern(name)}
+        self.patterns = [name for name in names if Subscription.isPattern(name)]
+        self.callback = callback
+        self.absolute = absolute
+        self.percent = percent
+        self.__last = {}        # tag name -> value last passed to the callback
+
+    @staticmethod
+    def isPattern(name: str) -> bool:
+        return any(char in name for char in PATTERN_CHARS)
+
+    def matches(self, name: str) -> bool:
+        return name in self.names or any(fnmatchcase(name, pattern) for pattern in self.patterns)
+
+    def change(self, tag, value, quality):
+        """
+        Returns TagChange of the tag if the change passes the deadband, otherwise None
+        :param value, quality: previous value and quality of the tag
+        """
+        # the first observed value is the reference until a change is passed
+        old = self.__last.setdefault(tag.name, value)
+        new = tag.value
+        if quality == tag.quality and not self.__exceeds(old, new):
+            return None
+        self.__last[tag.name] = new
+        return TagChange(tag, old, new, tag.quality, tag.timestamp)
+
+    def __exceeds(self, old, new) -> bool:
+        if old is None or new is None or isinstance(new, bool) or \
+                not isinstance(old, Number) or not isinstance(new, Number):
+            return old != new
+        delta = abs(new - old)
+        if self.absolute is None and self.percent is None:
+            return delta != 0
+        if self.absolute is not None and delta <= self.absolute:
+            return False
+        if self.percent is not None and delta <= abs(old) * self.percent / 100:
+            return False
+        return True
+
+
+class Subscriptions(object):
+    """ Subscriptions of the server, dispatches changes of tags of updated ranges """
+    def __init__(self):
+        self.__subscriptions = []
+        self.__by_name = {}     # tag name -> subscriptions (cache, filled on demand)
+
+    def subscribe(self, target, callback, absolute: float = None, percent: float = None) -> Subscription:
+        """ Adds subscription (see Subscription), returns it for unsubscribing """
+        subscription = Subscription(target, callback, absolute, percent)
+        self.__subscriptions.append(subscription)
+        self.__by_name.clear()
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        if subscription in self.__subscriptions:
+            self.__subscriptions.remove(subscription)
+            self.__by_name.clear()
+
+    def watched(self, tags) -> list:
+        """ Returns [(tag, value, quality)] of the tags which have subscribers (to be called before update) """
+        if not self.__subscriptions:
+            return []
+        return [(tag, tag.value, tag.quality) for tag in tags if self.__subscribers(tag.name)]
+
+    def notify(self, watched: list):
+        """ Passes changes of the watched tags (see watched) to their subscribers, one call per subscriber """
+        changes = {}            # subscription -> list of TagChange
+        for tag, value, quality in watched:
+            for subscription in self.__subscribers(tag.name):
+                change = subscription.change(tag, value, quality)
+                if change is not None:
+                    changes.setdefault(subscription, []).append(change)
+        for subscription, sub_changes in changes.items():
+            subscription.callback(sub_changes)
+
+    def __len__(self):
+        return len(self.__subscriptions)
+
+    def __subscribers(self, name: str) -> list:
+        subscribers = self.__by_name.get(name)
+        if subscribers is None:
+            subscribers = [s for s in self.__subscriptions if s.matches(name)]
+            self.__by_name[name] = subscribers
+        return subscribers
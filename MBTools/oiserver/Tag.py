@@ -5,6 +5,7 @@ from PyQt5 import QtWidgets, QtCore
 import sys
 from MBTools.oiserver.constants import TagType, TagTypeSize
 from MBTools.drivers.modbus.ModbusDriver import ModbusDriver, Device, DeviceCreator, QualityEnum, DriverCreator
+from MBTools.drivers.modbus.Timestamp import Timestamp
 
 
 class Tag:
@@ -16,11 +17,13 @@ class Tag:
     - address
     - type
     - comment
-    - time
+    - time (struct_time for displaying), timestamp (ns times of request, response and wall time)
     - quality
+    - scan_rate (polling period, sec; None - default period of driver)
     TODO make quality and time fields
     """
-    def __init__(self, device: Device, name: str, type_: TagType, comment: str = "???", address: int = 0, bit_number=None):
+    def __init__(self, device: Device, name: str, type_: TagType, comment: str = "???", address: int = 0, bit_number=None,
+                 scan_rate: float = None):
         self.__name = name
         self.__address = address
         self.__bit_number = bit_number
@@ -29,7 +32,9 @@ class Tag:
         self.__type = type_
         self.__comment = comment
         self.__time = None
+        self.__timestamp = None
         self.__device = device
+        self.__scan_rate = scan_rate
         # print("{0}: Tag constructor".format(self.__name))
 
     @property
@@ -58,8 +63,14 @@ class Tag:
 
     @property
     def time(self):
+        if self.__time is None and self.__timestamp is not None:
+            return self.__timestamp.localtime()
         return self.__time
 
+    @property
+    def timestamp(self) -> Timestamp:
+        return self.__timestamp
+
     @device.setter
     def device(self, device: Device):
         self.__device = device
@@ -83,6 +94,12 @@ class Tag:
     def time(self, time):
         self.__time = time
 
+    @timestamp.setter
+    def timestamp(self, timestamp: Timestamp):
+        """ Sets time of update, struct_time (time) is built from it on demand """
+        self.__timestamp = timestamp
+        self.__time = None
+
     @property
     def type(self):
         return self.__type
@@ -91,6 +108,14 @@ class Tag:
     def type(self, type):
         self.__type = type
 
+    @property
+    def scan_rate(self):
+        return self.__scan_rate
+
+    @scan_rate.setter
+    def scan_rate(self, scan_rate):
+        self.__scan_rate = scan_rate
+
     @property
     def comment(self):
         return self.__comment
@@ -109,8 +134,9 @@ class Tag:
         if self.__type in TagTypeSize:
             size = TagTypeSize[self.__type]
 
-        if self.__time:
-            str_time = "{:02}:{:02}:{:02}".format(self.__time.tm_hour, self.__time.tm_min, self.__time.tm_sec)
+        tag_time = self.time
+        if tag_time:
+            str_time = "{:02}:{:02}:{:02}".format(tag_time.tm_hour, tag_time.tm_min, tag_time.tm_sec)
         else:
             str_time = None
 
@@ -0,0 +1,120 @@
+# -*- coding: utf-8 -*-
+# -----------------------------------------------------------
+# This module contains batch decoder of tag values
+#
+# (C) 2021 Maxim Kozyakov, Voronezh, Russia
+# Released under GNU Public License (MIT)
+# email kmmax@yandex.ru
+# -----------------------------------------------------------
+
+"""
+Модуль TagDecoder.py
+Назначение:
+Декодирование значений всех тегов одного range за один проход numpy
+(вместо преобразования каждого тега отдельно).
+Смещения, типы и номера битов тегов range вычисляются один раз (TagBatch),
+при обновлении range регистры копируются один раз (снимок, т.к. поток опроса меняет их на месте)
+и выбираются индексами массивов:
+- INT, UINT, WORD - значение регистра;
+- DWORD - (reg[1] << 16) + reg[0];
+- REAL - пара регистров [reg[0], reg[1]] как float32 (view без копирования значений);
+- BOOL - бит регистра (np.unpackbits, младший бит первый).
+Результаты совпадают с поэлементным декодированием Converter (тип и биты значения),
+теги, не помещающиеся в регистры range, получают None.
+Если все теги range - строки одной TagTable, значения записываются в ее столбцы сразу (TagTable.update).
+"""
+
+import numpy as np
+
+from MBTools.oiserver.constants import TagType, TagTypeSize
+
+WORD_TYPES = (TagType.INT, TagType.UINT, TagType.WORD)    # value of single register
+
+
+class TagBatch(object):
+    """ Tags of one range with precomputed offsets, decodes all of them at once """
+    def __init__(self, entries: list):
+        """ :param entries: list of (tag, offset, size), offset - index of first register of tag in range """
+        self.tags = [tag for tag, offset, size in entries]
+        positions = {}              # type -> positions of tags in the batch
+        for i, tag in enumerate(self.tags):
+            positions.setdefault(tag.type, []).append(i)
+
+        offsets = np.array([offset for tag, offset, size in entries], dtype=np.intp)
+        self.__words = self.__group(positions, offsets, WORD_TYPES)
+        self.__dwords = self.__group(positions, offsets, (TagType.DWORD,))
+        self.__reals = self.__group(positions, offsets, (TagType.REAL,))
+        # BOOL tags without bit number aren't decoded
+        bool_pos = [i for i in positions.get(TagType.BOOL, []) if self.tags[i].bit_number is not None]
+        self.__bools = (np.array(bool_pos, dtype=np.intp), offsets[bool_pos],
+                        np.array([self.tags[i].bit_number for i in bool_pos], dtype=np.intp))
+
+        # rows of TagTable (TagRow) are updated by columns
+        self.__table = getattr(self.tags[0], "table", None) if self.tags else None
+        self.__rows = None
+        if self.__table is not None and all(getattr(tag, "table", None) is self.__table for tag in self.tags):
+            self.__rows = np.array([tag.row for tag in self.tags], dtype=np.intp)
+
+    def decode(self, registers) -> list:
+        """ Returns values of tags (in order of self.tags) decoded from registers of the range """
+        # registers of the range are changed in place by the polling thread: all values are decoded
+        # from one snapshot, so both words of DWORD and REAL are taken from the same poll
+        buf = np.frombuffer(registers, dtype=np.uint16).copy()
+        size = len(buf)
+        values = [None] * len(self.tags)
+
+        pos, offsets = self.__valid(self.__words, size, TagTypeSize[TagType.WORD])
+        self.__scatter(values, pos, buf[offsets].tolist())
+
+        pos, offsets = self.__valid(self.__dwords, size, TagTypeSize[TagType.DWORD])
+        dwords = (buf[offsets + 1].astype(np.uint32) << 16) | buf[offsets]
+        self.__scatter(values, pos, dwords.tolist())
+
+        pos, offsets = self.__valid(self.__reals, size, TagTypeSize[TagType.REAL])
+        pairs = np.empty((len(offsets), 2), dtype=np.uint16)
+        pairs[:, 0] = buf[offsets]
+        pairs[:, 1] = buf[offsets + 1]
+        self.__scatter(values, pos, list(pairs.view(np.float32).ravel()))
+
+        pos, offsets, bits = self.__bools
+        valid = offsets < size
+        pos, offsets, bits = pos[valid], offsets[valid], bits[valid]
+        unpacked = np.unpackbits(buf[offsets].astype('<u2').view(np.uint8).reshape(-1, 2),
+                                 axis=1, bitorder='little')
+        # bits out of register are zeros (as the padding of the scalar decoder)
+        inside = (bits >= 0) & (bits < 16)
+        flags = np.zeros(len(pos), dtype=bool)
+        flags[inside] = unpacked[np.nonzero(inside)[0], bits[inside]].astype(bool)
+        self.__scatter(values, pos, flags.tolist())
+        return values
+
+    def store(self, values: list, quality, timestamp):
+        """ Sets decoded values, quality and timestamp to the tags """
+        if self.__rows is not None:
+            self.__table.update(self.__rows, values, quality, timestamp)
+            return
+        for tag, value in zip(self.tags, values):
+            tag.value = value
+            tag.quality = quality
+            tag.timestamp = timestamp
+
+    def __len__(self):
+        return len(self.tags)
+
+    @staticmethod
+    def __group(positions: dict, offsets: np.ndarray, types: tuple) -> tuple:
+        pos = sorted(i for type_ in types for i in positions.get(type_, []))
+        pos = np.array(pos, dtype=np.intp)
+        return pos, offsets[pos]
+
+    @staticmethod
+    def __valid(group: tuple, size: int, number: int) -> tuple:
+        """ Leaves tags whose registers are inside the range """
+        pos, offsets = group
+        valid = offsets + number <= size
+        return pos[valid], offsets[valid]
+
+    @staticmethod
+    def __scatter(values: list, pos: np.ndarray, decoded: list):
+        for i, value in zip(pos.tolist(), decoded):
+            values[i] = value
@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+# -----------------------------------------------------------
+# This module contains encoder of tag values to registers
+#
+# (C) 2021 Maxim Kozyakov, Voronezh, Russia
+# Released under GNU Public License (MIT)
+# email kmmax@yandex.ru
+# -----------------------------------------------------------
+
+"""
+Модуль TagEncoder.py
+Назначение:
+Преобразование значения тега в регистры для записи (обратное декодированию TagDecoder/IOServer):
+- INT - int16 (отрицательные значения) или uint16 (как читается регистр);
+- UINT, WORD - uint16;
+- DWORD - uint32, младшее слово первым (reg[0] - младшее);
+- REAL - float32, младшее слово первым;
+- BOOL - регистр тега с измененным битом, исходное значение регистра передается вызывающим
+  (IOServer пишет биты масками, см. TagEncoder.bit и WriteQueue.putBits).
+Значение, которое не помещается в тип тега, вызывает ValueError (см. Converter).
+"""
+
+from MBTools.oiserver.constants import TagType
+from MBTools.utilites.Converter import Converter, DataType, ByteOrder
+
+# tag type -> (type of registers, order of registers)
+TagTypeCodec = {
+    TagType.UINT: (DataType.UINT16, ByteOrder.ABCD),
+    TagType.WORD: (DataType.UINT16, ByteOrder.ABCD),
+    TagType.DWORD: (DataType.UINT32, ByteOrder.CDAB),
+    TagType.REAL: (DataType.FLOAT32, ByteOrder.CDAB),
+}
+
+
+class TagEncoder(object):
+    """ Encodes values of tags to registers """
+
+    @staticmethod
+    def encode(tag, value, register: int = None) -> list:
+        """
+        Returns registers of the value of the tag
+        :param register: current value of register of BOOL tag (other bits are kept)
+        raise ValueError - value can't be written to the tag
+        """
+        type_ = tag.type
+        if TagType.BOOL == type_:
+            return [TagEncoder.setBit(register, tag.bit_number, value)]
+        if TagType.INT == type_:
+            data_type = DataType.INT16 if value < 0 else DataType.UINT16
+            return Converter.encode([value], data_type).tolist()
+        if type_ not in TagTypeCodec:
+            raise ValueError("tag {0} of type {1} can't be written".format(tag.name, type_))
+        data_type, order = TagTypeCodec[type_]
+        return Converter.encode([value], data_type, order).tolist()
+
+    @staticmethod
+    def bit(tag, value) -> tuple:
+        """
+        Returns (bit number, bool value) of BOOL tag for writing by mask
+        raise ValueError - value can't be written to the tag
+        """
+        if TagType.BOOL != tag.type:
+            raise ValueError("tag {0} of type {1} isn't bit".format(tag.name, tag.type))
+        TagEncoder.__checkBit(tag.bit_number, value)
+        return tag.bit_number, bool(value)
+
+    @staticmethod
+    def setBit(register: int, bit_number: int, value) -> int:
+        """ Returns register with the bit set to value (bool or 0/1) """
+        TagEncoder.__checkBit(bit_number, value)
+        if register is None:
+            raise ValueError("value of register isn't known")
+        mask = 1 << bit_number
+        return (register | mask) if value else (register & ~mask & 0xFFFF)
+
+    # ---------- Privat -----------
+    @staticmethod
+    def __checkBit(bit_number: int, value):
+        if bit_number is None or not 0 <= bit_number < 16:
+            raise ValueError("wrong bit number {0}".format(bit_number))
+        if value not in (0, 1):     # True, False too
+            raise ValueError("value {0} isn't bit".format(value))
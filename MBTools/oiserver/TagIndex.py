@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+# -----------------------------------------------------------
+# This module contains index of tags by modbus ranges
+#
+# (C) 2021 Maxim Kozyakov, Voronezh, Russia
+# Released under GNU Public License (MIT)
+# email kmmax@yandex.ru
+# -----------------------------------------------------------
+
+"""
+Модуль TagIndex.py
+Назначение:
+Индекс тегов сервера по ranges драйвера: (имя устройства, id range) -> [(тег, смещение, размер)],
+чтобы при обновлении range обрабатывались только его теги, а не все теги сервера.
+Смещение - номер первого регистра тега внутри range.
+Индекс строится заново при изменении тегов или ranges (сортировка тегов устройства и bisect на range),
+при изменении одного устройства перестраивается только его часть (update, remove).
+Для каждого range создается TagBatch, который декодирует все его теги за один проход numpy.
+"""
+
+from bisect import bisect_left
+
+from MBTools.oiserver.TagDecoder import TagBatch
+
+EMPTY_BATCH = TagBatch([])
+
+
+class TagIndex(object):
+    """ Tags of the server grouped by ranges which hold their first register """
+    def __init__(self, tags=()):
+        self.__entries = {}         # (device name, range id) -> list of (tag, offset, size)
+        self.__batches = {}         # (device name, range id) -> TagBatch
+        self.__unconfigured = []    # tags which aren't read by any range
+        self.__build(tags)
+
+    def entries(self, dev_name: str, range_id: int) -> list:
+        """ Returns list of (tag, offset, size) of the range """
+        return self.__entries.get((dev_name, range_id), [])
+
+    def batch(self, dev_name: str, range_id: int) -> TagBatch:
+        """ Returns decoder of tags of the range """
+        return self.__batches.get((dev_name, range_id), EMPTY_BATCH)
+
+    def unconfigured(self) -> list:
+        """ Returns tags whose addresses aren't read by ranges of their devices """
+        return self.__unconfigured
+
+    def update(self, device, tags):
+        """ Replaces part of the index of the device by its tags (all tags of the device) """
+        self.remove(device.name())
+        self.__addDevice(device, list(tags))
+
+    def remove(self, dev_name: str):
+        """ Removes tags of the device from the index """
+        for key in [key for key in self.__entries if key[0] == dev_name]:
+            del self.__entries[key]
+            del self.__batches[key]
+        self.__unconfigured = [tag for tag in self.__unconfigured
+                               if tag.device is None or tag.device.name() != dev_name]
+
+    def __len__(self):
+        return sum(len(entries) for entries in self.__entries.values())
+
+    def __build(self, tags):
+        by_device = {}              # device -> tags
+        for tag in tags:
+            if tag.device is None:
+                self.__unconfigured.append(tag)
+                continue
+            by_device.setdefault(tag.device, []).append(tag)
+
+        for device, dev_tags in by_device.items():
+            self.__addDevice(device, dev_tags)
+
+    def __addDevice(self, device, dev_tags: list):
+        dev_tags.sort(key=lambda tag: tag.address)
+        addresses = [tag.address for tag in dev_tags]
+        indexed = set()
+        for range_ in device.ranges():
+            first = range_.address()
+            begin = bisect_left(addresses, first)
+            end = bisect_left(addresses, first + range_.number())
+            if begin == end:
+                continue
+            key = (device.name(), range_.dataId())
+            entries = self.__entries.setdefault(key, [])
+            for i in range(begin, end):
+                tag = dev_tags[i]
+                entries.append((tag, tag.address - first, tag.size() or 1))
+                indexed.add(i)
+            self.__batches[key] = TagBatch(entries)
+        self.__unconfigured.extend(tag for i, tag in enumerate(dev_tags) if i not in indexed)
@@ -0,0 +1,332 @@
+# -*- coding: utf-8 -*-
+# -----------------------------------------------------------
+# This module contains columnar storage of tags
+#
+# (C) 2021 Maxim Kozyakov, Voronezh, Russia
+# Released under GNU Public License (MIT)
+# email kmmax@yandex.ru
+# -----------------------------------------------------------
+
+"""
+Модуль TagTable.py
+Назначение:
+Хранение большого числа тегов (100k и более) по столбцам numpy вместо отдельного объекта Tag на каждый тег.
+- столбцы: значение, признак наличия значения, код качества, метка времени (3 x int64 нс),
+  адрес, код типа, номер бита, номер устройства, период опроса;
+- имя -> номер строки (словарь), имена и комментарии - списки строк;
+- TagRow - легкое представление строки таблицы с интерфейсом Tag (name, value, quality, timestamp, ...),
+  поэтому строки можно передавать в IOServer, TagIndex и окна просмотра вместо Tag;
+- групповые операции без циклов Python: выборка по качеству, снимок (структурный массив numpy),
+  запись значений тегов range (update).
+Значения хранятся как float64 (точно для всех типов тегов), при чтении приводятся к типу тега
+(int, bool, np.float32 для REAL), как в Tag.
+"""
+
+import time
+
+import numpy as np
+
+from MBTools.oiserver.constants import TagType, TagTypeSize
+from MBTools.drivers.modbus.ModbusDriver import Device, QualityEnum
+from MBTools.drivers.modbus.Timestamp import Timestamp
+from MBTools.utilites.Log import getLogger
+
+log = getLogger("oiserver.table")
+
+INITIAL_CAPACITY = 1024       # rows allocated at first
+NO_TIME = -1                  # wall_ns of tag without timestamp
+NO_BIT = -1                   # bit of tag without bit number
+
+TAG_TYPES = list(TagType)                   # type code -> TagType (-1 - None)
+QUALITIES = list(QualityEnum)               # quality code -> QualityEnum
+TYPE_CODE = {type_: code for code, type_ in enumerate(TAG_TYPES)}
+QUALITY_CODE = {quality: code for code, quality in enumerate(QUALITIES)}
+
+COLUMNS = np.dtype([
+    ("value", np.float64),
+    ("valid", np.bool_),        # value isn't None
+    ("quality", np.int8),
+    ("sent_ns", np.int64),
+    ("received_ns", np.int64),
+    ("wall_ns", np.int64),
+    ("address", np.int32),
+    ("type", np.int8),
+    ("bit", np.int8),
+    ("device", np.int16),       # index in devices of the table (-1 - None)
+    ("scan_rate", np.float64),  # nan - default period
+])
+
+
+class TagTable(object):
+    """ Struct-of-arrays storage of tags """
+    def __init__(self, capacity: int = INITIAL_CAPACITY):
+        self.__size = 0
+        self.__columns = {}
+        for name in COLUMNS.names:
+            self.__columns[name] = np.zeros(max(capacity, 1), dtype=COLUMNS.fields[name][0])
+        self.__names = []
+        self.__comments = []
+        self.__rows = {}            # name -> row
+        self.__devices = []         # devices of tags (index is stored in "device" column)
+        self.__device_index = {}    # id(device) -> index in devices
+
+    # ---------- Public ----------
+    def add(self, tag) -> 'TagRow':
+        """ Copies tag (Tag or TagRow) to new row, returns the row (existing row if the name is used) """
+        if tag.name in self.__rows:
+            log.warning("tag %s has a duplicate (it isn't added)", tag.name)
+            return TagRow(self, self.__rows[tag.name])
+        if self.__size == len(self.__columns["value"]):
+            self.__grow(2 * self.__size)
+        row = self.__size
+        self.__size += 1
+        self.__names.append(tag.name)
+        self.__comments.append(tag.comment)
+        self.__rows[tag.name] = row
+
+        view = TagRow(self, row)
+        view.device = tag.device
+        view.type = tag.type
+        view.address = tag.address
+        view.bit_number = tag.bit_number
+        view.scan_rate = tag.scan_rate
+        view.value = tag.value
+        view.quality = tag.quality if isinstance(tag.quality, QualityEnum) else QualityEnum.UNDEF
+        view.timestamp = tag.timestamp
+        return view
+
+    def extend(self, tags) -> list:
+        """ Adds tags, returns list of their rows """
+        return [self.add(tag) for tag in tags]
+
+    def row(self, name: str) -> 'TagRow':
+        """ Returns row by tag name, otherwise None """
+        row = self.__rows.get(name)
+        return None if row is None else TagRow(self, row)
+
+    def rows(self) -> list:
+        return [TagRow(self, row) for row in range(self.__size)]
+
+    def column(self, name: str) -> np.ndarray:
+        """ Returns column (view of used rows, changes of the view change the table) """
+        return self.__columns[name][:self.__size]
+
+    def byQuality(self, quality: QualityEnum) -> np.ndarray:
+        """ Returns numbers of rows with the quality """
+        return np.flatnonzero(self.column("quality") == QUALITY_CODE[quality])
+
+    def update(self, rows: np.ndarray, values: list, quality: QualityEnum, timestamp: Timestamp):
+        """ Sets values (None - no value), quality and timestamp of rows at once """
+        valid = np.array([value is not None for value in values], dtype=bool)
+        numbers = np.array([value if value is not None else np.nan for value in values], dtype=np.float64)
+        columns = self.__columns
+        columns["value"][rows] = numbers
+        columns["valid"][rows] = valid
+        columns["quality"][rows] = QUALITY_CODE[quality]
+        sent_ns, received_ns, wall_ns = TagTable.__stamp(timestamp)
+        columns["sent_ns"][rows] = sent_ns
+        columns["received_ns"][rows] = received_ns
+        columns["wall_ns"][rows] = wall_ns
+
+    def snapshot(self) -> np.ndarray:
+        """ Returns copy of numeric columns as numpy structured array (for saving or sending) """
+        result = np.empty(self.__size, dtype=COLUMNS)
+        for name in COLUMNS.names:
+            result[name] = self.column(name)
+        return result
+
+    def names(self) -> list:
+        return list(self.__names)
+
+    def nbytes(self) -> int:
+        """ Returns memory of numeric columns of used rows """
+        return self.__size * COLUMNS.itemsize
+
+    def __len__(self):
+        return self.__size
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.__rows
+
+    # ---------- Protected (used by TagRow) ----------
+    def _get(self, column: str, row: int):
+        return self.__columns[column][row]
+
+    def _set(self, column: str, row: int, value):
+        self.__columns[column][row] = value
+
+    def _name(self, row: int) -> str:
+        return self.__names[row]
+
+    def _comment(self, row: int) -> str:
+        return self.__comments[row]
+
+    def _setComment(self, row: int, comment: str):
+        self.__comments[row] = comment
+
+    def _device(self, row: int):
+        index = self.__columns["device"][row]
+        return None if index < 0 else self.__devices[index]
+
+    def _deviceIndex(self, device) -> int:
+        if device is None:
+            return -1
+        index = self.__device_index.get(id(device))
+        if index is None:
+            # devices are kept by the table, so their ids aren't reused
+            index = len(self.__devices)
+            self.__devices.append(device)
+            self.__device_index[id(device)] = index
+        return index
+
+    # ---------- Privat -----------
+    def __grow(self, capacity: int):
+        for name, column in self.__columns.items():
+            grown = np.zeros(capacity, dtype=column.dtype)
+            grown[:len(column)] = column
+            self.__columns[name] = grown
+
+    @staticmethod
+    def __stamp(timestamp: Timestamp) -> tuple:
+        if timestamp is None:
+            return 0, 0, NO_TIME
+        return timestamp.sent_ns, timestamp.received_ns, timestamp.wall_ns
+
+
+class TagRow(object):
+    """ Row of TagTable with interface of Tag """
+    __slots__ = ("table", "row")
+
+    def __init__(self, table: TagTable, row: int):
+        self.table = table
+        self.row = row
+
+    @property
+    def device(self) -> Device:
+        return self.table._device(self.row)
+
+    @device.setter
+    def device(self, device: Device):
+        self.table._set("device", self.row, self.table._deviceIndex(device))
+
+    @property
+    def name(self) -> str:
+        return self.table._name(self.row)
+
+    @property
+    def value(self):
+        if not self.table._get("valid", self.row):
+            return None
+        value = self.table._get("value", self.row)
+        type_ = self.type
+        if TagType.REAL == type_:
+            return np.float32(value)
+        if TagType.BOOL == type_:
+            return bool(value)
+        if value.is_integer():
+            return int(value)
+        return float(value)
+
+    @value.setter
+    def value(self, value):
+        self.table._set("valid", self.row, value is not None)
+        self.table._set("value", self.row, np.nan if value is None else value)
+
+    @property
+    def address(self) -> int:
+        return int(self.table._get("address", self.row))
+
+    @address.setter
+    def address(self, address: int):
+        self.table._set("address", self.row, address)
+
+    @property
+    def bit_number(self):
+        bit = self.table._get("bit", self.row)
+        return None if NO_BIT == bit else int(bit)
+
+    @bit_number.setter
+    def bit_number(self, bit_number):
+        self.table._set("bit", self.row, NO_BIT if bit_number is None else bit_number)
+
+    @property
+    def quality(self) -> QualityEnum:
+        return QUALITIES[self.table._get("quality", self.row)]
+
+    @quality.setter
+    def quality(self, quality: QualityEnum):
+        self.table._set("quality", self.row, QUALITY_CODE[quality])
+
+    @property
+    def timestamp(self) -> Timestamp:
+        wall_ns = int(self.table._get("wall_ns", self.row))
+        if NO_TIME == wall_ns:
+            return None
+        return Timestamp(int(self.table._get("sent_ns", self.row)),
+                         int(self.table._get("received_ns", self.row)), wall_ns)
+
+    @timestamp.setter
+    def timestamp(self, timestamp: Timestamp):
+        if timestamp is None:
+            self.table._set("wall_ns", self.row, NO_TIME)
+            return
+        self.table._set("sent_ns", self.row, timestamp.sent_ns)
+        self.table._set("received_ns", self.row, timestamp.received_ns)
+        self.table._set("wall_ns", self.row, timestamp.wall_ns)
+
+    @property
+    def time(self):
+        timestamp = self.timestamp
+        return None if timestamp is None else timestamp.localtime()
+
+    @time.setter
+    def time(self, struct_time):
+        """ Sets wall time (struct_time) without request times """
+        if struct_time is None:
+            self.timestamp = None
+            return
+        wall_ns = int(time.mktime(struct_time)) * 1000000000
+        self.timestamp = Timestamp(0, 0, wall_ns)
+
+    @property
+    def type(self):
+        code = self.table._get("type", self.row)
+        return None if code < 0 else TAG_TYPES[code]
+
+    @type.setter
+    def type(self, type_):
+        self.table._set("type", self.row, TYPE_CODE.get(type_, -1))
+
+    @property
+    def scan_rate(self):
+        rate = self.table._get("scan_rate", self.row)
+        return None if np.isnan(rate) else float(rate)
+
+    @scan_rate.setter
+    def scan_rate(self, scan_rate):
+        self.table._set("scan_rate", self.row, np.nan if scan_rate is None else scan_rate)
+
+    @property
+    def comment(self) -> str:
+        return self.table._comment(self.row)
+
+    @comment.setter
+    def comment(self, comment: str):
+        self.table._setComment(self.row, comment)
+
+    def size(self) -> int:
+        return TagTypeSize.get(self.type)
+
+    def __eq__(self, other):
+        return isinstance(other, TagRow) and self.table is other.table and self.row == other.row
+
+    def __hash__(self):
+        return hash((id(self.table), self.row))
+
+    def __str__(self):
+        tag_time = self.time
+        str_time = time.strftime("%H:%M:%S", tag_time) if tag_time else None
+        device = self.device
+        return "{0}.{1} ; {2}; {3}[{4}]; [{5}:{6} : {7}]; {8}".format(
+            device.name() if device is not None else None, self.address, self.name, self.type,
+            self.size() or 0, self.value, self.quality, str_time, self.comment)
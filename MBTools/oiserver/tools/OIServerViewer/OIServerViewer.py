@@ -84,6 +84,8 @@ class OIServerViewer(QtWidgets.QMainWindow):
         self._ui = Ui_OIServerViewer()
         self._ui.setupUi(self)
         self._oi: IOServer = None
+        self.__subscription = None
+        self.__rows = {}        # tag name -> row of the table
         self.__edit_delegate = EditDelegate()
         self._model = DataModel()
 
@@ -209,17 +211,24 @@ class OIServerViewer(QtWidgets.QMainWindow):
         if oi is None:
             return None
         self._oi = oi
-        self._oi.dataChanged.connect(self.onDataChanged)
+        self.__subscription = self._oi.subscribe("*", self.onTagsChanged)
         self._oi.configChanged.connect(self.onConfigChanged)
         self.onConfigChanged()
 
-    @QtCore.pyqtSlot()
-    def onDataChanged(self):
-        self.updateGui()
+    def onTagsChanged(self, changes: list):
+        """ Updates rows of changed tags only (changes - list of TagChange) """
+        for change in changes:
+            row = self.__rows.get(change.tag.name)
+            hidden = self.__flags.quality_filter and QualityEnum.GOOD != change.quality
+            if (row is None) != hidden:
+                self.updateGui()    # set of shown tags is changed
+                return
+            if row is not None:
+                self.__updateRow(row, change.tag)
 
     @QtCore.pyqtSlot()
     def onConfigChanged(self):
-        pass
+        self.updateGui()
 
     @QtCore.pyqtSlot()
     def onDriverViewerShow(self):
@@ -289,6 +298,7 @@ class OIServerViewer(QtWidgets.QMainWindow):
             |-------------------------------------------------------------------|
             """
             self._ui.tableWidget.setRowCount(len(tags))
+            self.__rows = {tag.name: i for i, tag in enumerate(tags)}
             for i, tag in enumerate(tags):
 
                 # Name
@@ -327,6 +337,13 @@ class OIServerViewer(QtWidgets.QMainWindow):
                 self._ui.tableWidget.setItem(i, 7, QtWidgets.QTableWidgetItem(tag.comment))
         # print("end of update GUI")
 
+    def __updateRow(self, row: int, tag: Tag):
+        """ Updates value, quality and time of the row of the tag """
+        table = self._ui.tableWidget
+        table.item(row, 1).setText(str(tag.value))
+        table.item(row, 2).setText(str(tag.quality).replace("QualityEnum.", ''))
+        table.item(row, 6).setText(self.timeFormat(tag.time))
+
     def timeFormat(self, time):
         str_time = ''
         if time:
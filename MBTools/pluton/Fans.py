@@ -21,6 +21,7 @@ class Fan(QtWidgets.QLabel):
         super().__init__(parent)
         self.__tag_name = None
         self.__oi = None
+        self.__subscription = None
         self.resize(300, 100)
         self.setText("No data")
         self.setStyleSheet("QLabel {"
@@ -50,10 +51,11 @@ class Fan(QtWidgets.QLabel):
     def setTagName(self, tag_name: str):
         self.__tag_name = tag_name
         self.setWindowTitle(self.__tag_name)
+        self.__subscribe()
 
     def setOiServer(self, oi: IOServer):
         self.__oi = oi
-        self.__oi.dataChanged.connect(self.onDataChanged)
+        self.__subscribe()
         # self.__combo.clear()
         # if self.__oi:
         #     tags = self.__oi.tags()
@@ -61,14 +63,21 @@ class Fan(QtWidgets.QLabel):
         #     for item in tag_names:
         #         self.__combo.addItem(item)
 
-    @QtCore.pyqtSlot()
-    def onDataChanged(self):
-        if self.__oi:
-            self.setText(self.__tag_name)
-            tags = self.__oi.tags()
-            for tag in tags:
-                if tag.name == self.__tag_name:
-                    self.setText(str(tag.value))
+    def onDataChanged(self, changes: list):
+        """ Shows the last value of the tag (changes - list of TagChange of the tag) """
+        self.setText(str(changes[-1].new))
+
+    def __subscribe(self):
+        """ Subscribes to changes of the shown tag only """
+        if self.__oi is None:
+            return
+        if self.__subscription is not None:
+            self.__oi.unsubscribe(self.__subscription)
+            self.__subscription = None
+        if self.__tag_name:
+            self.__subscription = self.__oi.subscribe(self.__tag_name, self.onDataChanged)
+            tag = self.__oi.tag(self.__tag_name)
+            self.setText(str(tag.value) if tag is not None else self.__tag_name)
 
 
 def main(argv):
@@ -0,0 +1,219 @@
+# -*- coding: utf-8 -*-
+# -----------------------------------------------------------
+# This module contains codec of values to modbus registers and back
+#
+# (C) 2021 Maxim Kozyakov, Voronezh, Russia
+# Released under GNU Public License (MIT)
+# email kmmax@yandex.ru
+# -----------------------------------------------------------
+
+"""
+Модуль Converter.py
+Назначение:
+Преобразование массивов значений в 16-битные регистры modbus и обратно (numpy, без циклов по значениям).
+
+Порядок байтов (ByteOrder) задается для значения из байтов A B C D (A - старший):
+- ABCD - big-endian (стандарт modbus): reg[0] = AB, reg[1] = CD;
+- CDAB - переставлены слова: reg[0] = CD, reg[1] = AB;
+- BADC - переставлены байты в словах: reg[0] = BA, reg[1] = DC;
+- DCBA - little-endian: reg[0] = DC, reg[1] = BA.
+Для 64-битных типов слова переставляются так же (CDAB, DCBA - младшее слово первым),
+для 16-битных типов важна только перестановка байтов (BADC, DCBA).
+STRING - строка из count регистров по 2 символа (latin-1), при ABCD/CDAB первый символ в старшем байте,
+нули в конце строки отбрасываются. BCD - 4 десятичные цифры в регистре (0..9999).
+
+Кодирование точное: значение, которое не помещается в тип или не является целым для целого типа,
+вызывает ValueError (для команд записи недопустимо молча записать другое значение).
+"""
+
+import enum
+import sys
+import time
+
+import numpy as np
+
+
+@enum.unique
+class DataType(enum.Enum):
+    INT16 = 1
+    UINT16 = 2
+    INT32 = 3
+    UINT32 = 4
+    FLOAT32 = 5
+    FLOAT64 = 6
+    INT64 = 7
+    STRING = 8
+    BCD = 9
+
+
+@enum.unique
+class ByteOrder(enum.Enum):
+    ABCD = 1    # big-endian
+    CDAB = 2    # word swap
+    BADC = 3    # byte swap
+    DCBA = 4    # little-endian
+
+
+# Size of numeric types in 16 bit registers
+DataTypeSize = {
+    DataType.INT16: 1,
+    DataType.UINT16: 1,
+    DataType.INT32: 2,
+    DataType.UINT32: 2,
+    DataType.FLOAT32: 2,
+    DataType.FLOAT64: 4,
+    DataType.INT64: 4,
+    DataType.BCD: 1,
+}
+
+# Big-endian numpy types of values
+DataTypeDtype = {
+    DataType.INT16: np.dtype('>i2'),
+    DataType.UINT16: np.dtype('>u2'),
+    DataType.INT32: np.dtype('>i4'),
+    DataType.UINT32: np.dtype('>u4'),
+    DataType.FLOAT32: np.dtype('>f4'),
+    DataType.FLOAT64: np.dtype('>f8'),
+    DataType.INT64: np.dtype('>i8'),
+    DataType.BCD: np.dtype('>u2'),
+}
+
+WORD_SWAP = (ByteOrder.CDAB, ByteOrder.DCBA)
+BYTE_SWAP = (ByteOrder.BADC, ByteOrder.DCBA)
+BCD_WEIGHTS = np.array([1000, 100, 10, 1], dtype=np.uint16)
+BCD_SHIFTS = np.array([12, 8, 4, 0], dtype=np.uint16)
+
+
+class Converter(object):
+    """ Vectorized codec of values to uint16 registers """
+
+    @staticmethod
+    def size(type_: DataType, count: int = 1) -> int:
+        """ Returns number of registers of one value (count - registers of STRING) """
+        if DataType.STRING == type_:
+            return count
+        return DataTypeSize[type_]
+
+    @staticmethod
+    def decode(registers, type_: DataType, order: ByteOrder = ByteOrder.ABCD, count: int = 1) -> np.ndarray:
+        """
+        Returns array of values decoded from registers (list, array('H'), memoryview or numpy array)
+        :param count: number of registers of one STRING value
+        raise ValueError - number of registers isn't multiple of the type size, wrong BCD digit
+        """
+        width = Converter.size(type_, count)
+        regs = np.asarray(registers, dtype=np.uint16)
+        if len(regs) % width:
+            raise ValueError("{0} registers can't be decoded as {1} of {2} registers".format(
+                len(regs), type_.name, width))
+        words = Converter.__order(regs.reshape(-1, width), order, type_)
+        # words are big-endian now (A is the most significant byte)
+        data = words.astype('>u2').tobytes()
+
+        if DataType.STRING == type_:
+            return np.char.decode(np.frombuffer(data, dtype='S{0}'.format(2 * width)), 'latin-1')
+        if DataType.BCD == type_:
+            return Converter.__fromBcd(np.frombuffer(data, dtype='>u2'))
+        return np.frombuffer(data, dtype=DataTypeDtype[type_]).astype(DataTypeDtype[type_].newbyteorder('='))
+
+    @staticmethod
+    def encode(values, type_: DataType, order: ByteOrder = ByteOrder.ABCD, count: int = 1) -> np.ndarray:
+        """
+        Returns uint16 registers of values (value after value)
+        :param count: number of registers of one STRING value (string is padded by zeros)
+        raise ValueError - value can't be represented by the type exactly
+        """
+        width = Converter.size(type_, count)
+        if DataType.STRING == type_:
+            strings = np.char.encode(np.asarray(values, dtype=str).reshape(-1), 'latin-1')
+            if strings.dtype.itemsize > 2 * width:
+                raise ValueError("string is longer than {0} registers".format(width))
+            data = strings.astype('S{0}'.format(2 * width)).tobytes()
+        elif DataType.BCD == type_:
+            data = Converter.__toBcd(values).astype('>u2').tobytes()
+        else:
+            data = Converter.__exact(values, DataTypeDtype[type_]).tobytes()
+
+        words = np.frombuffer(data, dtype='>u2').reshape(-1, width).astype(np.uint16)
+        return Converter.__order(words, order, type_).reshape(-1)
+
+    # ---------- Privat -----------
+    @staticmethod
+    def __order(words: np.ndarray, order: ByteOrder, type_: DataType) -> np.ndarray:
+        """ Converts words (rows of registers of values) between the order and ABCD, the same both ways """
+        if order in WORD_SWAP and DataType.STRING != type_:
+            words = words[:, ::-1]
+        if order in BYTE_SWAP:
+            words = words.byteswap()
+        return words
+
+    @staticmethod
+    def __exact(values, dtype: np.dtype) -> np.ndarray:
+        """ Returns values converted to dtype, raise ValueError if any value is changed by conversion """
+        source = np.asarray(values).reshape(-1)
+        if source.dtype.kind not in "biuf":
+            source = source.astype(np.float64 if 'f' == dtype.kind else object)
+        if 'f' == dtype.kind:
+            # floats are rounded to the nearest value of the type, integers must be kept
+            with np.errstate(over='ignore'):
+                result = source.astype(dtype)
+            finite = np.isfinite(source.astype(np.float64))
+            if not np.isfinite(result[finite]).all():
+                raise ValueError("value is out of range of {0}".format(dtype))
+            if source.dtype.kind in "iuO" and (result.astype(source.dtype) != source).any():
+                raise ValueError("integer can't be represented by {0} exactly".format(dtype))
+            return result
+
+        info = np.iinfo(dtype)
+        if source.dtype.kind in "f" and not (np.floor(source) == source).all():
+            raise ValueError("value isn't integer")
+        # float(info.max) may be rounded up (2.0 ** 63), so floats are compared with the exact info.max + 1
+        upper = float(info.max + 1) if source.dtype.kind in "f" else info.max + 1
+        if len(source) and (source.min() < info.min or source.max() >= upper):
+            raise ValueError("value is out of range {0}..{1}".format(info.min, info.max))
+        return source.astype(dtype)
+
+    @staticmethod
+    def __fromBcd(regs: np.ndarray) -> np.ndarray:
+        digits = (regs[:, None] >> BCD_SHIFTS) & 0xF
+        if (digits > 9).any():
+            raise ValueError("wrong BCD digit")
+        return (digits * BCD_WEIGHTS).sum(axis=1).astype(np.uint16)
+
+    @staticmethod
+    def __toBcd(values) -> np.ndarray:
+        values = Converter.__exact(values, np.dtype(np.int32))
+        if len(values) and (values.min() < 0 or values.max() > 9999):
+            raise ValueError("BCD value is out of range 0..9999")
+        digits = (values[:, None] // BCD_WEIGHTS) % 10
+        return (digits << BCD_SHIFTS).sum(axis=1).astype(np.uint16)
+
+
+def main(argv):
+    """ Throughput of decoding and encoding of 1M values """
+    number = 1000000
+    rnd = np.random.default_rng(1)
+    for type_ in DataType:
+        if DataType.STRING == type_:
+            values = np.array(["S{0:06d}".format(i % 1000000) for i in range(number)])
+            count = 4
+        elif DataType.BCD == type_:
+            values, count = rnd.integers(0, 10000, number), 1
+        elif type_ in (DataType.FLOAT32, DataType.FLOAT64):
+            values, count = rnd.standard_normal(number), 1
+        else:
+            info = np.iinfo(DataTypeDtype[type_])
+            values, count = rnd.integers(info.min, info.max, number, dtype=np.int64, endpoint=True), 1
+        for order in (ByteOrder.ABCD, ByteOrder.DCBA):
+            start = time.perf_counter()
+            regs = Converter.encode(values, type_, order, count)
+            encoded = time.perf_counter()
+            Converter.decode(regs, type_, order, count)
+            decoded = time.perf_counter()
+            print("{0:8} {1}: encode {2:6.1f} Mvalues/s, decode {3:6.1f} Mvalues/s".format(
+                type_.name, order.name, number / (encoded - start) / 1e6, number / (decoded - encoded) / 1e6))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
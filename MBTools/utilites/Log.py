@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+# -----------------------------------------------------------
+# This module contains diagnostics (logging) of MBTools
+#
+# (C) 2021 Maxim Kozyakov, Voronezh, Russia
+# Released under GNU Public License (MIT)
+# email kmmax@yandex.ru
+# -----------------------------------------------------------
+
+"""
+Модуль Log.py
+Назначение:
+Диагностика на основе logging.
+- у каждой подсистемы свой логгер: MBTools.<subsystem> (modbus.device, modbus.pool, oiserver, ...);
+- сообщения форматируются лениво: log.debug("%s", data) не вызывает str(data), если debug выключен;
+- повторяющиеся сообщения (ошибки опроса недоступного устройства) ограничиваются RateLimitFilter:
+  одно и то же сообщение выводится не чаще одного раза в interval секунд,
+  число подавленных передается в поле записи repeated (запись не изменяется для других обработчиков),
+  RepeatFormatter добавляет его к следующему выведенному сообщению.
+
+По умолчанию уровень WARNING (вывод опроса отключен), setup(logging.DEBUG) включает подробный вывод.
+"""
+
+import logging
+import sys
+import threading
+import time
+
+ROOT = "MBTools"              # name of root logger of the package
+RATE_INTERVAL = 10.0          # min interval of repeated messages, sec
+FORMAT = "%(asctime)s %(levelname)s %(name)s: %(message)s"
+
+
+def getLogger(subsystem: str) -> logging.Logger:
+    """ Returns logger of subsystem (e.g. "modbus.device") """
+    return logging.getLogger("{0}.{1}".format(ROOT, subsystem))
+
+
+class RateLimitFilter(logging.Filter):
+    """
+    Passes a repeated message not more often than once per interval.
+    Messages are the same if logger, level and format string are the same (arguments are ignored),
+    so "%s: no connection" of one device limits the message of other devices too,
+    use the key extra field (log.warning(..., extra={"key": name})) to separate them.
+    Number of suppressed messages is set to record.repeated (see RepeatFormatter), the message isn't changed.
+    """
+    def __init__(self, interval: float = RATE_INTERVAL):
+        super().__init__()
+        self.interval = interval
+        self.__lock = threading.Lock()
+        self.__last = {}            # key -> [time of last output, number of suppressed]
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        key = (record.name, record.levelno, record.msg, getattr(record, "key", None))
+        now = time.monotonic()
+        with self.__lock:
+            last = self.__last.get(key)
+            if last is not None and now - last[0] < self.interval:
+                last[1] += 1
+                return False
+            record.repeated = last[1] if last is not None else 0
+            self.__last[key] = [now, 0]
+        return True
+
+
+class RepeatFormatter(logging.Formatter):
+    """ Adds number of suppressed messages (see RateLimitFilter) to the message """
+    def formatMessage(self, record: logging.LogRecord) -> str:
+        text = super().formatMessage(record)
+        repeated = getattr(record, "repeated", 0)
+        if repeated:
+            text = "{0} (repeated {1} times)".format(text, repeated)
+        return text
+
+
+def setup(level: int = logging.WARNING, stream=None, interval: float = RATE_INTERVAL) -> logging.Logger:
+    """ Configures output of MBTools loggers (for applications, libraries leave it to the caller) """
+    logger = logging.getLogger(ROOT)
+    logger.setLevel(level)
+    if not logger.handlers:
+        handler = logging.StreamHandler(stream or sys.stderr)
+        handler.setFormatter(RepeatFormatter(FORMAT))
+        handler.addFilter(RateLimitFilter(interval))
+        logger.addHandler(handler)
+    return logger
@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+# -----------------------------------------------------------
+# This module contains signals (callbacks) of MBTools core objects
+#
+# (C) 2021 Maxim Kozyakov, Voronezh, Russia
+# Released under GNU Public License (MIT)
+# email kmmax@yandex.ru
+# -----------------------------------------------------------
+
+"""
+Модуль Signal.py
+Назначение:
+Сигналы на чистом Python для ядра драйвера (без QObject и Qt).
+Интерфейс повторяет pyqtSignal: signal.connect(slot), signal.disconnect(slot), signal.emit(*args).
+Слоты вызываются сразу в потоке, выдавшем сигнал (аналог Qt.DirectConnection),
+доставку в поток GUI выполняет Qt адаптер (см. drivers/modbus/QtDriver.py).
+"""
+
+import threading
+
+
+class BoundSignal(object):
+    """ Signal of one object: list of connected slots """
+    __slots__ = ("__callbacks", "__lock")
+
+    def __init__(self):
+        self.__callbacks = ()
+        self.__lock = threading.Lock()
+
+    def connect(self, slot):
+        """ Connects callable, the same slot can be connected several times (as in Qt) """
+        assert callable(slot)
+        with self.__lock:
+            self.__callbacks = self.__callbacks + (slot,)
+
+    def disconnect(self, slot=None):
+        """ Disconnects slot (all slots if slot is None) """
+        with self.__lock:
+            if slot is None:
+                self.__callbacks = ()
+                return
+            callbacks = list(self.__callbacks)
+            if slot not in callbacks:
+                raise TypeError("slot {0} is not connected".format(slot))
+            callbacks.remove(slot)
+            self.__callbacks = tuple(callbacks)
+
+    def emit(self, *args):
+        # tuple is replaced on connecting, so slots can be connected and disconnected while emitting
+        for slot in self.__callbacks:
+            slot(*args)
+
+    def __call__(self, *args):
+        self.emit(*args)
+
+    def __len__(self):
+        return len(self.__callbacks)
+
+
+class Signal(object):
+    """
+    Class attribute which gives own BoundSignal to every instance:
+        class Device(object):
+            dataChanged = Signal(Range)
+    """
+    def __init__(self, *types):
+        self.types = types          # types of arguments (for documentation only)
+        self.__name = None
+
+    def __set_name__(self, owner, name):
+        self.__name = "_signal_" + name
+
+    def __get__(self, instance, owner):
+        if instance is None:
+            return self
+        try:
+            return instance.__dict__[self.__name]
+        except KeyError:
+            return instance.__dict__.setdefault(self.__name, BoundSignal())
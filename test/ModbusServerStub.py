@@ -0,0 +1,99 @@
+"""Minimal Modbus TCP server for tests (runs asyncio loop in its own thread)"""
+import asyncio
+import struct
+import threading
+
+MBAP_HEADER = struct.Struct(">HHHB")
+
+
+class ModbusServerStub(object):
+    """Holding registers server. Registers which are not set are read as 0"""
+    def __init__(self, registers: dict = None, delay: float = 0.0):
+        self.registers = dict(registers or {})
+        self.delay = delay                  # delay before each reply (link latency), sec
+        self.requests = []                  # log of (unit, function code, address, count)
+        self.connections = 0
+        self.in_flight = 0
+        self.max_in_flight = 0              # max number of requests waiting for reply
+        self.port = None
+        self.__loop = asyncio.new_event_loop()
+        self.__server = None
+        self.__thread = threading.Thread(target=self.__loop.run_forever, daemon=True)
+
+    def start(self):
+        self.__thread.start()
+        future = asyncio.run_coroutine_threadsafe(self.__start(), self.__loop)
+        future.result()
+        return self
+
+    def stop(self):
+        async def close():
+            self.__server.close()
+            for task in asyncio.all_tasks():
+                if task is not asyncio.current_task():
+                    task.cancel()
+            await self.__server.wait_closed()
+        asyncio.run_coroutine_threadsafe(close(), self.__loop).result()
+        self.__loop.call_soon_threadsafe(self.__loop.stop)
+        self.__thread.join()
+
+    def functions(self) -> list:
+        return [request[1] for request in self.requests]
+
+    async def __start(self):
+        self.__server = await asyncio.start_server(self.__handle, "127.0.0.1", 0)
+        self.port = self.__server.sockets[0].getsockname()[1]
+
+    async def __handle(self, reader, writer):
+        self.connections += 1
+        try:
+            while True:
+                header = await reader.readexactly(MBAP_HEADER.size)
+                tid, pid, length, unit = MBAP_HEADER.unpack(header)
+                pdu = await reader.readexactly(length - 1)
+                # requests are answered concurrently, as if delay was latency of the link
+                asyncio.get_running_loop().create_task(self.__answer(writer, tid, pid, unit, pdu))
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def __answer(self, writer, tid, pid, unit, pdu):
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            if self.delay:
+                await asyncio.sleep(self.delay)
+            reply = self.__reply(unit, pdu)
+            if not writer.is_closing():
+                writer.write(MBAP_HEADER.pack(tid, pid, len(reply) + 1, unit) + reply)
+        finally:
+            self.in_flight -= 1
+
+    def __reply(self, unit: int, pdu: bytes) -> bytes:
+        fc = pdu[0]
+        if fc == 0x03:
+            address, count = struct.unpack(">HH", pdu[1:5])
+            self.requests.append((unit, fc, address, count))
+            values = [self.registers.get(address + i, 0) for i in range(count)]
+            return struct.pack(">BB{0}H".format(count), fc, 2 * count, *values)
+        if fc == 0x06:
+            address, value = struct.unpack(">HH", pdu[1:5])
+            self.requests.append((unit, fc, address, 1))
+            self.registers[address] = value
+            return pdu[:5]
+        if fc == 0x10:
+            address, count = struct.unpack(">HH", pdu[1:5])
+            self.requests.append((unit, fc, address, count))
+            values = struct.unpack(">{0}H".format(count), pdu[6:6 + 2 * count])
+            for i, value in enumerate(values):
+                self.registers[address + i] = value
+            return pdu[:5]
+        if fc == 0x16:
+            address, and_mask, or_mask = struct.unpack(">HHH", pdu[1:7])
+            self.requests.append((unit, fc, address, 1))
+            value = self.registers.get(address, 0)
+            self.registers[address] = (value & and_mask) | (or_mask & ~and_mask & 0xFFFF)
+            return pdu[:7]
+        self.requests.append((unit, fc, None, 0))
+        return struct.pack(">BB", fc | 0x80, 1)
@@ -1,7 +1,16 @@
 import sys
 import unittest
-from MBTools.oiserver.OIServer import IOServer
+from array import array
+from MBTools.drivers.modbus.RangePlanner import RangePlanner, PlanCost
 from MBTools.oiserver.constants import TagTypeSize, TagType
+from MBTools.oiserver.Tag import Tag
+from MBTools.oiserver.TagDecoder import TagBatch
+
+
+def decode(regs: list, type_: TagType, bit_number=None):
+    """ Decodes single tag from the beginning of registers as IOServer does it (see TagBatch) """
+    tag = Tag(None, "tag", type_, bit_number=bit_number)
+    return TagBatch([(tag, 0, TagTypeSize[type_])]).decode(array('H', regs))[0]
 
 
 class TestCalculator(unittest.TestCase):
@@ -9,50 +18,50 @@ class TestCalculator(unittest.TestCase):
         pass
 
     def test_calculateRanges(self):
+        # ranges of IOServer are planned by RangePlanner, max_len is the distance between first and last address
         max_len = 50
         addresses = [0, 5, 22, 8, 33, 105, 122, 111, 1050, 222, 555]
         res = [[0, 33], [105, 122], [222, 222], [555, 555], [1050, 1050]]
-        ret = IOServer.__calculateRanges(max_len, addresses)
+        ret = RangePlanner.plan(addresses, PlanCost(max_registers=max_len + 1)).requests
         self.assertListEqual(res, ret, "Range=50")
 
         addresses = [22]
         res = [[22, 22]]
-        ret = IOServer.__calculateRanges(max_len, addresses)
+        ret = RangePlanner.plan(addresses, PlanCost(max_registers=max_len + 1)).requests
         self.assertListEqual(res, ret)
 
         max_len = 100
         addresses = [0, 5, 22, 8, 33, 105, 122, 111, 1050, 222, 555, 1052]
         res = [[0, 33], [105, 122], [222, 222], [555, 555], [1050, 1052]]
-        ret = IOServer.__calculateRanges(max_len, addresses)
+        ret = RangePlanner.plan(addresses, PlanCost(max_registers=max_len + 1)).requests
         self.assertListEqual(res, ret)
 
     def test_regsToValue(self):
-        regs = None
+        regs = []
         type_ = TagType.INT
-        ret = IOServer.__regsToValue(regs, type_)
-        self.assertEqual(ret, None)
-
-        regs = [10, 20, 30]
-        type_ = None
-        ret = IOServer.__regsToValue(regs, type_)
+        ret = decode(regs, type_)
         self.assertEqual(ret, None)
 
-        regs = []
-        type_ = TagType.INT
-        ret = IOServer.__regsToValue(regs, type_)
+        regs = [10]
+        type_ = TagType.DWORD
+        ret = decode(regs, type_)
         self.assertEqual(ret, None)
 
         regs = [10, 20]
         types = [TagType.INT, TagType.WORD, TagType.UINT, TagType.DWORD]
-        rets = [10, 10, 10, 1020]
+        rets = [10, 10, 10, (20 << 16) + 10]
         for tp, rt in zip(types, rets):
-            self.assertEqual(IOServer.__regsToValue(regs, tp), rt)
+            self.assertEqual(decode(regs, tp), rt)
 
         regs = [0, 16224]
         types = [TagType.REAL]
         rets = [0.875]
         for tp, rt in zip(types, rets):
-            self.assertEqual(IOServer.__regsToValue(regs, tp), rt)
+            self.assertEqual(decode(regs, tp), rt)
+
+        regs = [0b1010]
+        self.assertEqual([False, True, False, True, False],
+                         [decode(regs, TagType.BOOL, bit) for bit in (0, 1, 2, 3, 16)])
 
 
 if __name__ == "__main__":
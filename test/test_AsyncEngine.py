@@ -0,0 +1,212 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from MBTools.drivers.modbus.ModbusDriver import DeviceCreator, DriverCreator, EngineType, QualityEnum
+from MBTools.drivers.modbus.AsyncClient import AsyncModbusTcpClient, ModbusError
+from MBTools.drivers.modbus.AsyncEngine import AsyncEngine
+from test.ModbusServerStub import ModbusServerStub
+
+
+@pytest.fixture
+def server():
+    srv = ModbusServerStub({100: 11, 101: 12, 102: 13}).start()
+    yield srv
+    srv.stop()
+
+
+# ------------ AsyncModbusTcpClient --------------
+
+
+def test_client_read_write(server):
+    async def run():
+        client = AsyncModbusTcpClient("127.0.0.1", server.port, timeout=1.0)
+        await client.connect()
+        regs = await client.read_holding_registers(100, 4)
+        await client.write_register(103, 14)
+        await client.write_registers(104, [15, 16])
+        regs2 = await client.read_holding_registers(103, 3)
+        client.close()
+        return regs, regs2
+
+    assert asyncio.run(run()) == ([11, 12, 13, 0], [14, 15, 16])
+
+
+def test_client_exception_response(server):
+    async def run():
+        client = AsyncModbusTcpClient("127.0.0.1", server.port, timeout=1.0)
+        await client.connect()
+        try:
+            await client._execute(bytes([0x2B]))
+        finally:
+            client.close()
+
+    with pytest.raises(ModbusError):
+        asyncio.run(run())
+
+
+# ------------ AsyncEngine --------------
+
+
+def collect(device, count):
+    """Connects to device.dataChanged, returns (event, list of (range, quality))"""
+    received = []
+    done = threading.Event()
+
+    def on_data(data):
+        received.append((data, data.quality()))
+        if len(received) >= count:
+            done.set()
+
+    device.dataChanged.connect(on_data)
+    return done, received
+
+
+def test_engine_polls_devices(server):
+    devices = []
+    for i in range(20):
+        dev = DeviceCreator.create("127.0.0.1", server.port, "dev{}".format(i))
+        dev.addRange(100, 3, "range0")
+        devices.append(dev)
+
+    engine = AsyncEngine(request_delay=0.01, timeout=1.0)
+    waiters = [collect(dev, 1) for dev in devices]
+    for dev in devices:
+        engine.addDevice(dev)
+    try:
+        for done, received in waiters:
+            assert done.wait(5)
+            data, quality = received[0]
+            assert QualityEnum.GOOD == quality
+            assert [11, 12, 13] == list(data.registers())
+        # single polling thread for all devices
+        assert 1 == len([t for t in threading.enumerate() if t.name == "modbus-asyncio"])
+    finally:
+        engine.stop()
+
+    for dev in devices:
+        assert QualityEnum.DRV_NOT_STARTED == dev.ranges()[0].quality()
+
+
+def test_engine_no_connection():
+    dev = DeviceCreator.create("127.0.0.1", 1, "dev1")
+    dev.addRange(0, 2, "range0")
+    done, received = collect(dev, 1)
+
+    engine = AsyncEngine(request_delay=0.01, timeout=0.5)
+    engine.addDevice(dev)
+    try:
+        assert done.wait(5)
+        assert QualityEnum.NO_CONNET == received[0][1]
+    finally:
+        engine.stop()
+
+
+def test_driver_async_engine_write(server):
+    dev = DeviceCreator.create("127.0.0.1", server.port, "dev1")
+    dev.addRange(100, 3, "range0")
+    drv = DriverCreator.create("modbus", engine=EngineType.ASYNC)
+    assert EngineType.ASYNC == drv.engineType()
+
+    done, received = collect(dev, 1)
+    drv.addDevice(dev)
+    try:
+        assert done.wait(5)
+        drv.onCmdReady(101, 42)
+        written = threading.Event()
+        dev.dataChanged.connect(lambda data: data.register(101) == 42 and written.set())
+        assert written.wait(5)
+        assert 42 == server.registers[101]
+    finally:
+        assert drv.delDevice(dev)
+
+
+def test_engine_batches_writes(server):
+    dev = DeviceCreator.create("127.0.0.1", server.port, "dev1")
+    dev.addRange(100, 3, "range0")
+    futures = [dev.write(200 + i, i) for i in range(10)]
+
+    engine = AsyncEngine(request_delay=0.01, timeout=1.0)
+    engine.addDevice(dev)
+    try:
+        for future in futures:
+            assert future.result(5)
+        assert [i for i in range(10)] == [server.registers[200 + i] for i in range(10)]
+        # adjacent registers are written by one FC16 request
+        writes = [r for r in server.requests if r[1] in (0x06, 0x10)]
+        assert [(1, 0x10, 200, 10)] == writes
+    finally:
+        engine.stop()
+
+
+def test_client_pipeline(server):
+    server.delay = 0.1
+
+    async def run(depth):
+        client = AsyncModbusTcpClient("127.0.0.1", server.port, timeout=2.0, pipeline_depth=depth)
+        await client.connect()
+        start = time.monotonic()
+        replies = await asyncio.gather(*[client.read_holding_registers(100 + i, 1) for i in range(3)])
+        elapsed = time.monotonic() - start
+        client.close()
+        return replies, elapsed
+
+    replies, elapsed = asyncio.run(run(3))
+    # replies are matched to requests by transaction id
+    assert [[11], [12], [13]] == replies
+    assert elapsed < 0.25
+    assert 3 == server.max_in_flight
+
+    server.max_in_flight = 0
+    replies, elapsed = asyncio.run(run(1))
+    assert [[11], [12], [13]] == replies
+    assert elapsed >= 0.3
+    assert 1 == server.max_in_flight
+
+
+def test_engine_pipeline(server):
+    server.delay = 0.05
+    dev = DeviceCreator.create("127.0.0.1", server.port, "dev1")
+    for i in range(20):
+        dev.addRange(100 + 10 * i, 1, "range{}".format(i))
+    dev.setPipelineDepth(20)
+    done, received = collect(dev, 20)
+
+    engine = AsyncEngine(request_delay=0.01, timeout=2.0)
+    start = time.monotonic()
+    engine.addDevice(dev)
+    try:
+        assert done.wait(5)
+        # 20 ranges are polled in about one round-trip
+        assert time.monotonic() - start < 0.5
+        assert 20 == server.max_in_flight
+        assert all(QualityEnum.GOOD == quality for _, quality in received[:20])
+    finally:
+        engine.stop()
+
+
+def test_engine_pipeline_depth_per_device(server):
+    server.delay = 0.02
+    devices = [DeviceCreator.create("127.0.0.1", server.port, "dev{}".format(unit), unit) for unit in (1, 2)]
+    for dev in devices:
+        for i in range(8):
+            dev.addRange(100 + 10 * i, 1, "range{}".format(i), scan_rate=0.05)
+    devices[1].setPipelineDepth(4)       # session is opened by the device with depth 1
+    waiters = [collect(dev, 8)[0] for dev in devices]
+
+    engine = AsyncEngine(request_delay=0.01, timeout=2.0)
+    engine.addDevice(devices[0])
+    try:
+        assert waiters[0].wait(5)
+        assert 1 == server.max_in_flight
+        engine.addDevice(devices[1])
+        assert waiters[1].wait(5)
+        engine.delDevice(devices[0])
+        server.max_in_flight = 0
+        time.sleep(0.3)
+        assert 4 == server.max_in_flight
+    finally:
+        engine.stop()
+    assert 1 == server.connections
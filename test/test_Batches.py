@@ -0,0 +1,179 @@
+import threading
+import time
+
+import pytest
+
+from MBTools.drivers.modbus.ModbusDriver import DeviceCreator, DriverCreator, EngineType, QualityEnum
+from test.ModbusServerStub import ModbusServerStub
+
+
+@pytest.fixture
+def server():
+    srv = ModbusServerStub({0: 1, 10: 2, 20: 3}).start()
+    yield srv
+    srv.stop()
+
+
+def wait(condition, timeout: float = 5.0):
+    finish = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < finish, "timeout"
+        time.sleep(0.01)
+
+
+# ------------ Device --------------
+
+
+def test_cycle_is_one_batch():
+    dev = DeviceCreator.create("127.0.0.1", 502, "dev1")
+    ranges = [dev.addRange(address, 1, "range{}".format(address)) for address in (0, 10, 20)]
+    batches = []
+    dev.rangesChanged.connect(batches.append)
+
+    dev._beginCycle()
+    for i, data in enumerate(ranges[:2]):
+        data.setRegisters([i + 1], QualityEnum.GOOD)
+        dev._publish(data)
+    assert [] == batches
+    dev._endCycle()
+    assert [ranges[:2]] == batches
+
+    dev._beginCycle()       # nothing is changed - nothing is emitted
+    dev._endCycle()
+    assert 1 == len(batches)
+
+    dev._setQuality(QualityEnum.NO_CONNET)      # out of cycle: all ranges at once
+    assert [ranges] == batches[1:]
+    ranges[0].setRegisters([7], QualityEnum.GOOD)
+    dev._publish(ranges[0])
+    assert [[ranges[0]]] == batches[2:]
+
+
+# ------------ ModbusDriver --------------
+
+
+@pytest.mark.parametrize("engine", [EngineType.THREAD, EngineType.ASYNC])
+def test_driver_batch_per_cycle(server, engine):
+    drv = DriverCreator.create("modbus", engine=engine)
+    drv.setBatchWindow(0)
+    dev = DeviceCreator.create("127.0.0.1", server.port, "dev1")
+    for address in (0, 10, 20):
+        dev.addRange(address, 1, "range{}".format(address), scan_rate=0.05)
+    single, batches = [], []
+    drv.dataChanged.connect(lambda name, data: single.append(data))
+    drv.rangesChanged.connect(batches.append)
+
+    drv.addDevice(dev)
+    try:
+        wait(lambda: batches)
+        assert [("dev1", data) for data in dev.ranges()] == batches[0]
+        server.registers[10] = 5
+        wait(lambda: 1 < len(batches))
+        assert [("dev1", dev.rangeByAddress(10))] == batches[1]
+    finally:
+        drv.delDevice(dev)
+    assert [] == single
+
+
+def test_driver_batch_window(server):
+    drv = DriverCreator.create("modbus")
+    drv.setBatchWindow(0.3)
+    devices = [DeviceCreator.create("127.0.0.1", server.port, "dev{}".format(i)) for i in range(2)]
+    for dev in devices:
+        dev.addRange(0, 1, "range0", scan_rate=0.02)
+    batches = []
+    drv.rangesChanged.connect(lambda batch: batches.append((time.monotonic(), batch)))
+
+    for dev in devices:
+        drv.addDevice(dev)
+    try:
+        wait(lambda: batches)
+        server.registers[0] = 9         # changed by many cycles of both devices during the window
+        wait(lambda: any(9 == batch[-1][1].register(0) for stamp, batch in batches[1:]))
+    finally:
+        for dev in devices:
+            drv.delDevice(dev)
+    assert ["dev0", "dev1"] == sorted(name for name, data in batches[0][1])
+    stamps = [stamp for stamp, batch in batches]
+    assert all(b - a >= 0.25 for a, b in zip(stamps, stamps[1:]))
+
+
+# ------------ QtModbusDriver, IOServer --------------
+
+
+def test_qt_adapter_forwards_batches():
+    import sys
+    from PyQt5.QtCore import QCoreApplication
+    from MBTools.drivers.modbus.QtDriver import QtModbusDriver
+
+    app = QCoreApplication.instance() or QCoreApplication(sys.argv)
+    dev = DeviceCreator.create("127.0.0.1", 502, "dev1")
+    ranges = [dev.addRange(address, 1, "range{}".format(address)) for address in (0, 10)]
+    for conflate in (True, False):
+        drv = QtModbusDriver(DriverCreator.create("modbus"), conflate=conflate)
+        drv.setBatchWindow(0)
+        batches = []
+        drv.rangesChanged.connect(batches.append)
+        thread = threading.Thread(target=drv.driver().onRangesChanged, args=(ranges, dev))
+        thread.start()
+        thread.join()
+        app.processEvents()
+        assert [[("dev1", data) for data in ranges]] == batches
+
+
+def test_qt_adapter_keeps_batch_window():
+    import sys
+    from PyQt5.QtCore import QCoreApplication
+    from MBTools.drivers.modbus.QtDriver import QtModbusDriver
+
+    app = QCoreApplication.instance() or QCoreApplication(sys.argv)
+    dev = DeviceCreator.create("127.0.0.1", 502, "dev1")
+    ranges = [dev.addRange(address, 1, "range{}".format(address)) for address in (0, 10)]
+    drv = QtModbusDriver(DriverCreator.create("modbus"))
+    drv.setBatchWindow(0.2)
+    batches = []
+    drv.rangesChanged.connect(batches.append)
+    for data in ranges:
+        thread = threading.Thread(target=drv.driver().onRangesChanged, args=([data], dev))
+        thread.start()
+        thread.join()
+    app.processEvents()
+    assert [] == batches            # conflated updates wait for the end of the window
+    time.sleep(0.3)
+    app.processEvents()
+    assert [[("dev1", data) for data in ranges]] == batches
+
+
+def test_server_handles_batch_at_once(tmp_path):
+    import json
+    from PyQt5.QtCore import QCoreApplication
+    from MBTools.oiserver.OIServer import IOServer
+    from MBTools.oiserver.OIServerConfigure import create_config, FormatName
+
+    app = QCoreApplication.instance() or QCoreApplication([])
+    conf = {
+        "devices": [{"name": "dev1", "protocol": "modbus", "ip": "127.0.0.1", "port": 1}],
+        "tags": [{"name": "A", "type": "WORD", "device": "dev1", "address": 10, "comment": ""},
+                 {"name": "B", "type": "WORD", "device": "dev1", "address": 500, "comment": ""}],
+    }
+    path = tmp_path / "conf.json"
+    path.write_text(json.dumps(conf))
+    io = IOServer()
+    io.set_config(create_config(FormatName.JSON, str(path)))
+    try:
+        assert 0 == io.driver().batchWindow()
+        dev = io.devices()[0]
+        refreshes, changes = [], []
+        io.dataChanged.connect(lambda: refreshes.append(1))
+        io.subscribe("*", changes.append)
+        batch = []
+        for address, value in ((10, 7), (500, 8)):
+            data = dev.rangeByAddress(address)
+            data.setRegisters([value], QualityEnum.GOOD)
+            batch.append(("dev1", data))
+        io._IOServer__onRangesUpdated(batch)
+        assert [1] == refreshes
+        assert [[("A", 7), ("B", 8)]] == [[(c.tag.name, c.new) for c in sub_changes] for sub_changes in changes]
+    finally:
+        io.clear_config()
+        app.processEvents()
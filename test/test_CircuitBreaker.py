@@ -0,0 +1,100 @@
+import threading
+
+import pytest
+
+from MBTools.drivers.modbus.ModbusDriver import DeviceCreator, QualityEnum
+from MBTools.drivers.modbus.AsyncEngine import AsyncEngine
+from MBTools.drivers.modbus.CircuitBreaker import CircuitBreaker, BreakerState
+from test.ModbusServerStub import ModbusServerStub
+
+
+# ------------ CircuitBreaker --------------
+
+
+def test_opens_after_threshold():
+    breaker = CircuitBreaker(threshold=3, base_delay=1.0, jitter=0.0)
+    assert not breaker.failure(0.0)
+    assert not breaker.failure(0.0)
+    assert breaker.failure(0.0)
+    assert BreakerState.OPEN == breaker.state()
+    assert not breaker.allow(0.5)
+    assert pytest.approx(0.5) == breaker.retryIn(0.5)
+    # probe is allowed after the delay
+    assert breaker.allow(1.0)
+    assert BreakerState.HALF_OPEN == breaker.state()
+    breaker.success()
+    assert BreakerState.CLOSED == breaker.state()
+    assert 0 == breaker.failures()
+
+
+def test_success_resets_counter():
+    breaker = CircuitBreaker(threshold=2)
+    breaker.failure(0.0)
+    breaker.success()
+    assert not breaker.failure(0.0)
+    assert BreakerState.CLOSED == breaker.state()
+
+
+def test_exponential_backoff():
+    breaker = CircuitBreaker(threshold=1, base_delay=1.0, max_delay=5.0, jitter=0.0)
+    now = 0.0
+    delays = []
+    for _ in range(5):
+        assert breaker.failure(now)
+        delays.append(breaker.retryIn(now))
+        now += delays[-1]
+        assert breaker.allow(now)
+    assert [1.0, 2.0, 4.0, 5.0, 5.0] == delays
+
+
+@pytest.mark.parametrize("rand, expect", [(0.0, 0.8), (0.5, 1.0), (1.0, 1.2)])
+def test_jitter(rand, expect):
+    breaker = CircuitBreaker(threshold=1, base_delay=1.0, jitter=0.2, rand=lambda: rand)
+    breaker.failure(0.0)
+    assert pytest.approx(expect) == breaker.retryIn(0.0)
+
+
+def test_fatal_failure():
+    breaker = CircuitBreaker(threshold=3)
+    assert breaker.failure(0.0, fatal=True)
+    assert BreakerState.OPEN == breaker.state()
+
+
+# ------------ Device polling --------------
+
+
+def test_engine_breaker():
+    server = ModbusServerStub({100: 11}, delay=1.0).start()
+    dev = DeviceCreator.create("127.0.0.1", server.port, "dev1")
+    for i in range(3):
+        dev.addRange(100 + 10 * i, 5, "range{}".format(i))
+    dev.setCircuitBreaker(CircuitBreaker(threshold=2, base_delay=0.3, jitter=0.0))
+
+    received = []
+    recovered = threading.Event()
+
+    def on_data(data):
+        received.append((data.address(), data.quality()))
+        if QualityEnum.GOOD == data.quality():
+            recovered.set()
+    dev.dataChanged.connect(on_data)
+
+    engine = AsyncEngine(request_delay=0.01, timeout=0.1)
+    engine.addDevice(dev)
+    try:
+        # requests time out: after 2 failures all ranges are NO_CONNET at once
+        for _ in range(50):
+            if BreakerState.OPEN == dev.circuitBreaker().state():
+                break
+            threading.Event().wait(0.05)
+        assert BreakerState.OPEN == dev.circuitBreaker().state()
+        assert {100, 110, 120} <= set(address for address, quality in received
+                                      if QualityEnum.NO_CONNET == quality)
+        server.delay = 0.0
+        server.requests.clear()
+        assert recovered.wait(5)
+        # recovery starts from single cheap probe request
+        assert (1, 0x03, 100, 1) == server.requests[0]
+    finally:
+        engine.stop()
+        server.stop()
@@ -0,0 +1,26 @@
+import json
+
+from MBTools.drivers.modbus.ModbusDriver import SCAN_CLASSES
+from MBTools.oiserver.Config import JsonConf
+
+
+# ------------ JsonConf --------------
+
+
+def test_scan_periods(tmp_path):
+    conf = {
+        "devices": [{"name": "dev1", "protocol": "modbus", "ip": "127.0.0.1", "port": 502}],
+        "tags": [{"name": "MS", "type": "WORD", "device": "dev1", "address": 10, "comment": "", "scan": 200},
+                 {"name": "CLASS", "type": "WORD", "device": "dev1", "address": 11, "comment": "", "scan": "fast"},
+                 {"name": "ZERO", "type": "WORD", "device": "dev1", "address": 12, "comment": "", "scan": 0},
+                 {"name": "DEFAULT", "type": "WORD", "device": "dev1", "address": 13, "comment": ""}],
+    }
+    path = tmp_path / "conf.json"
+    path.write_text(json.dumps(conf))
+    reader = JsonConf()
+    reader.read_model_config(str(path))
+    model = reader.model()
+    default = model.find_tag_by_name("DEFAULT").scan_rate
+    assert 0.2 == model.find_tag_by_name("MS").scan_rate
+    assert SCAN_CLASSES["fast"] == model.find_tag_by_name("CLASS").scan_rate
+    assert default == model.find_tag_by_name("ZERO").scan_rate
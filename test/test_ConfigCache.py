@@ -0,0 +1,115 @@
+import json
+import os
+
+import pytest
+
+from MBTools.oiserver.ConfigCache import ConfigCache
+from MBTools.oiserver.OIServerConfigure import JsonConfigure, ConfigCalculater, TagConfig
+
+
+CONF = {
+    "devices": [
+        {"name": "dev1", "protocol": "modbus", "ip": "127.0.0.1", "port": 1, "max_registers": 10},
+        {"name": "dev2", "protocol": "modbus", "ip": "127.0.0.1", "port": 2},
+    ],
+    "tags": [
+        {"name": "A", "type": "WORD", "device": "dev1", "address": 10, "comment": "a"},
+        {"name": "B", "type": "REAL", "device": "dev1", "address": 30, "comment": "", "scan": 100},
+        {"name": "C", "type": "BOOL", "device": "dev2", "address": 5, "bit": 3, "comment": ""},
+    ],
+}
+
+
+@pytest.fixture
+def conf_file(tmp_path):
+    path = tmp_path / "conf.json"
+    path.write_text(json.dumps(CONF))
+    return str(path)
+
+
+def summary(conf: JsonConfigure) -> tuple:
+    devices = [(dev.name, dev.ip, dev.port, dev.cost and dev.cost.max_registers) for dev in conf.devices_config()]
+    tags = [(tag.name, tag.device_name, tag.address, tag.type, tag.bit_number, tag.scan_rate, tag.comment)
+            for tag in conf.tags_config()]
+    plans = {name: {rate: plan.requests for rate, plan in dev_plans.items()}
+             for name, dev_plans in conf.range_plans().items()}
+    return devices, tags, plans
+
+
+def test_cache_is_created_and_used(conf_file, monkeypatch):
+    parsed = JsonConfigure()
+    parsed.read_config(conf_file)
+    assert os.path.exists(ConfigCache.path(conf_file))
+    assert {"dev1": {0.1: [[30, 31]], 0.5: [[10, 10]]}, "dev2": {0.5: [[5, 5]]}} == summary(parsed)[2]
+
+    # the source isn't parsed while the cache is valid
+    monkeypatch.setattr(json, "load", lambda f: pytest.fail("JSON is parsed"))
+    cached = JsonConfigure()
+    assert cached.read_config(conf_file) is not None
+    assert cached.is_valid()
+    assert summary(parsed) == summary(cached)
+
+
+def test_changed_source_is_parsed(conf_file):
+    JsonConfigure().read_config(conf_file)
+    changed = dict(CONF, tags=CONF["tags"][:1])
+    with open(conf_file, "w") as f:
+        f.write(json.dumps(changed) + " ")
+    conf = JsonConfigure()
+    conf.read_config(conf_file)
+    assert ["A"] == [tag.name for tag in conf.tags_config()]
+
+
+def test_touched_source_is_checked_by_digest(conf_file, monkeypatch):
+    JsonConfigure().read_config(conf_file)
+    stat = os.stat(conf_file)
+    os.utime(conf_file, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+    monkeypatch.setattr(json, "load", lambda f: pytest.fail("JSON is parsed"))
+    assert 3 == len(JsonConfigure().read_config(conf_file)[1])
+
+    # the new stat is saved: the next load doesn't read the source
+    monkeypatch.setattr(ConfigCache, "_ConfigCache__digest", lambda file_name: pytest.fail("source is hashed"))
+    assert ConfigCache.load(conf_file) is not None
+
+
+def test_broken_cache_is_ignored(conf_file):
+    with open(ConfigCache.path(conf_file), "wb") as f:
+        f.write(b"broken")
+    conf = JsonConfigure()
+    conf.read_config(conf_file)
+    assert 3 == len(conf.tags_config())
+    assert ConfigCache.load(conf_file) is not None       # cache is rebuilt
+
+
+def test_without_cache(conf_file):
+    conf = JsonConfigure()
+    conf.read_config(conf_file, use_cache=False)
+    assert conf.range_plans() is None
+    assert not os.path.exists(ConfigCache.path(conf_file))
+    conf.read_config(conf_file)
+    conf.add_tag(TagConfig("D", "dev2", 6, conf.tags_config()[0].type))
+    assert conf.range_plans() is None
+    for remove, name in ((conf.rem_tag, "A"), (conf.rem_device, "dev2")):
+        conf.read_config(conf_file)
+        assert conf.range_plans() is not None
+        remove(name)
+        assert conf.range_plans() is None
+    assert ["dev1"] == [dev.name for dev in conf.devices_config()]
+
+
+def test_server_uses_planned_ranges(conf_file):
+    from PyQt5.QtCore import QCoreApplication
+    from MBTools.oiserver.OIServer import IOServer
+    from MBTools.oiserver.OIServerConfigure import create_config, FormatName
+
+    app = QCoreApplication.instance() or QCoreApplication([])
+    ranges = []
+    for _ in range(2):      # parsed, then from cache
+        io = IOServer()
+        io.set_config(create_config(FormatName.JSON, conf_file))
+        ranges.append([(dev.name(), r.address(), r.number(), r.scanRate()) for dev in io.devices() for r in dev.ranges()])
+        assert 3 == len(io.tags())
+        io.clear_config()
+        app.processEvents()
+    assert [("dev1", 30, 2, 0.1), ("dev1", 10, 1, 0.5), ("dev2", 5, 1, 0.5)] == ranges[0]
+    assert ranges[0] == ranges[1]
@@ -0,0 +1,109 @@
+import json
+
+import pytest
+
+from MBTools.drivers.modbus.ModbusDriver import QualityEnum
+
+
+def device(name: str, port: int) -> dict:
+    return {"name": name, "protocol": "modbus", "ip": "127.0.0.1", "port": port}
+
+
+def tag(name: str, dev: str, address: int, type_: str = "WORD", comment: str = "") -> dict:
+    return {"name": name, "type": type_, "device": dev, "address": address, "comment": comment}
+
+
+BASE = {
+    "devices": [device("dev1", 1), device("dev2", 2)],
+    "tags": [tag("A", "dev1", 10), tag("B", "dev1", 11), tag("C", "dev2", 10)],
+}
+
+
+@pytest.fixture
+def server(tmp_path):
+    from PyQt5.QtCore import QCoreApplication
+    from MBTools.oiserver.OIServer import IOServer
+    from MBTools.oiserver.OIServerConfigure import create_config, FormatName
+
+    app = QCoreApplication.instance() or QCoreApplication([])
+    files = []
+
+    def config(data: dict):
+        path = tmp_path / "conf{}.json".format(len(files))
+        path.write_text(json.dumps(data))
+        files.append(path)
+        return create_config(FormatName.JSON, str(path))
+
+    io = IOServer()
+    io.set_config(config(BASE))
+    io.config_for = config
+    yield io
+    io.clear_config()
+    app.processEvents()
+
+
+def by_name(io) -> dict:
+    return {dev.name(): dev for dev in io.devices()}
+
+
+def ranges(dev) -> list:
+    return [(r.address(), r.number(), r.scanRate()) for r in dev.ranges()]
+
+
+def test_unchanged_devices_are_kept(server):
+    dev1, dev2 = by_name(server)["dev1"], by_name(server)["dev2"]
+    range_ = dev1.rangeByAddress(10)
+    range_.setRegisters([7, 5], QualityEnum.GOOD)
+    server._IOServer__onRangesUpdated([("dev1", range_)])
+    tag_a = server.tag("A")
+
+    data = dict(BASE, devices=BASE["devices"] + [device("dev3", 3)],
+                tags=[tag("A", "dev1", 10, comment="new"), tag("B", "dev1", 11), tag("C", "dev2", 10),
+                      tag("D", "dev2", 500), tag("E", "dev3", 1)])
+    server.set_config(server.config_for(data), reload=True)
+
+    devices = by_name(server)
+    assert dev1 is devices["dev1"] and dev2 is devices["dev2"]
+    assert {dev1, dev2, devices["dev3"]} == set(server.driver().devices())
+    # dev1 isn't re-planned: the same range, the tag keeps its value
+    assert [range_] == dev1.ranges()
+    assert tag_a is server.tag("A")
+    assert (7, QualityEnum.GOOD, "new") == (tag_a.value, tag_a.quality, tag_a.comment)
+    assert [(10, 1, 0.5), (500, 1, 0.5)] == sorted(ranges(dev2))
+    assert ["A", "B", "C", "D", "E"] == [t.name for t in server.tags()]
+
+    # new tags are decoded by the new ranges
+    range_ = dev2.rangeByAddress(500)
+    range_.setRegisters([9], QualityEnum.GOOD)
+    server._IOServer__onRangesUpdated([("dev2", range_)])
+    assert 9 == server.tag("D").value
+
+
+def test_changed_devices_and_tags(server):
+    dev1, dev2 = by_name(server)["dev1"], by_name(server)["dev2"]
+    kept = dev1.rangeByAddress(10)
+
+    # dev2 is moved to other port, B is removed, F is polled faster
+    data = dict(BASE, devices=[device("dev1", 1), device("dev2", 20)],
+                tags=[tag("A", "dev1", 10), dict(tag("F", "dev1", 40), scan=100), tag("C", "dev2", 10)])
+    server.set_config(server.config_for(data), reload=True)
+
+    devices = by_name(server)
+    assert dev1 is devices["dev1"]
+    assert dev2 is not devices["dev2"] and 20 == devices["dev2"].port()
+    assert dev2 not in set(server.driver().devices())
+    assert devices["dev2"] is server.tag("C").device
+    assert server.tag("B") is None
+    assert [(10, 1, 0.5), (40, 1, 0.1)] == sorted(ranges(dev1))
+    assert kept.address() == 10 and kept not in dev1.ranges()     # size of the request is changed
+    assert len({r.objectName() for r in dev1.ranges()}) == len(dev1.ranges())
+
+
+def test_removed_device(server):
+    dev2 = by_name(server)["dev2"]
+    data = dict(BASE, devices=[device("dev1", 1)], tags=BASE["tags"])
+    server.set_config(server.config_for(data), reload=True)
+
+    assert ["dev1"] == [dev.name() for dev in server.devices()]
+    assert dev2 not in set(server.driver().devices())
+    assert ["A", "B"] == [t.name for t in server.tags()]
@@ -0,0 +1,138 @@
+import threading
+
+import pytest
+from pymodbus.client.sync import ModbusTcpClient
+
+from MBTools.drivers.modbus.ModbusDriver import DeviceCreator, DriverCreator, QualityEnum
+from MBTools.drivers.modbus.AsyncEngine import AsyncEngine
+from MBTools.drivers.modbus.ConnectionPool import ConnectionPool, LinkState
+from test.ModbusServerStub import ModbusServerStub
+
+
+@pytest.fixture
+def server():
+    srv = ModbusServerStub({100: 11, 101: 12}).start()
+    yield srv
+    srv.stop()
+
+
+class CountingClient(ModbusTcpClient):
+    """Client which counts connection attempts"""
+    attempts = 0
+
+    def connect(self):
+        CountingClient.attempts += 1
+        return super().connect()
+
+
+# ------------ ConnectionPool --------------
+
+
+def test_session_limit(server):
+    pool = ConnectionPool(max_sessions=2)
+    errors = []
+
+    def work(unit):
+        try:
+            for _ in range(20):
+                with pool.session("127.0.0.1", server.port) as client:
+                    assert [11, 12] == client.read_holding_registers(100, 2, unit=unit).registers
+        except Exception as err:
+            errors.append(err)
+
+    threads = [threading.Thread(target=work, args=(unit,)) for unit in range(1, 7)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    pool.close()
+
+    assert [] == errors
+    assert server.connections <= 2
+    assert {1, 2, 3, 4, 5, 6} == set(request[0] for request in server.requests)
+
+
+def test_single_reconnect():
+    CountingClient.attempts = 0
+    pool = ConnectionPool(reconnect_delay=10.0, factory=CountingClient)
+    for _ in range(5):
+        with pytest.raises(ConnectionError):
+            with pool.session("127.0.0.1", 1):
+                pass
+    # next attempts are delayed after the fail
+    assert 1 == CountingClient.attempts
+    assert LinkState.WAITING == pool.endpoint("127.0.0.1", 1).state()
+
+
+def test_broken_session_is_closed(server):
+    pool = ConnectionPool()
+    with pytest.raises(RuntimeError):
+        with pool.session("127.0.0.1", server.port):
+            raise RuntimeError()
+    assert LinkState.DISCONNECTED == pool.endpoint("127.0.0.1", server.port).state()
+    with pool.session("127.0.0.1", server.port) as client:
+        assert client.is_socket_open()
+    assert LinkState.CONNECTED == pool.endpoint("127.0.0.1", server.port).state()
+    pool.close()
+
+
+def test_last_detach_closes_endpoint(server):
+    pool = ConnectionPool()
+    endpoint = pool.attach("127.0.0.1", server.port)
+    assert endpoint is pool.attach("127.0.0.1", server.port)
+    with pool.session("127.0.0.1", server.port) as client:
+        pass
+    pool.detach("127.0.0.1", server.port)
+    assert client.is_socket_open()
+    with pool.session("127.0.0.1", server.port) as used:
+        pool.detach("127.0.0.1", server.port)       # session in use is closed on release
+        assert used.is_socket_open()
+    assert not used.is_socket_open()
+    assert endpoint is not pool.endpoint("127.0.0.1", server.port)
+
+
+def test_driver_closes_sessions(server):
+    drv = DriverCreator.create("modbus")
+    devices = [DeviceCreator.create("127.0.0.1", server.port, "dev{}".format(unit), unit) for unit in (1, 2)]
+    waiters = []
+    for dev in devices:
+        dev.addRange(100, 2, "range0", scan_rate=0.05)
+        done = threading.Event()
+        dev.dataChanged.connect(lambda data, done=done: data.quality() == QualityEnum.GOOD and done.set())
+        waiters.append(done)
+        drv.addDevice(dev)
+    try:
+        for done in waiters:
+            assert done.wait(5)
+        drv.delDevice(devices[0])
+        endpoint = drv._ModbusDriver__pool.endpoint("127.0.0.1", server.port)
+        assert LinkState.CONNECTED == endpoint.state()
+    finally:
+        drv.close()
+    assert [] == list(drv.devices())
+    assert LinkState.DISCONNECTED == endpoint.state()
+
+
+# ------------ AsyncConnectionPool --------------
+
+
+def test_engine_shares_connection(server):
+    devices = [DeviceCreator.create("127.0.0.1", server.port, "dev{}".format(unit), unit) for unit in (1, 2, 3)]
+    waiters = []
+    for dev in devices:
+        dev.addRange(100, 2, "range0")
+        done = threading.Event()
+        dev.dataChanged.connect(lambda data, done=done: data.quality() == QualityEnum.GOOD and done.set())
+        waiters.append(done)
+
+    engine = AsyncEngine(request_delay=0.01, timeout=1.0)
+    for dev in devices:
+        engine.addDevice(dev)
+    try:
+        for done in waiters:
+            assert done.wait(5)
+    finally:
+        engine.stop()
+
+    assert 1 == server.connections
+    assert {1, 2, 3} == set(request[0] for request in server.requests)
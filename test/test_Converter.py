@@ -0,0 +1,105 @@
+import struct
+
+import numpy as np
+import pytest
+
+from MBTools.utilites.Converter import Converter, DataType, ByteOrder
+
+
+def registers(data: bytes) -> list:
+    """ Big-endian bytes as registers """
+    return list(struct.unpack(">{0}H".format(len(data) // 2), data))
+
+
+# ------------ Converter --------------
+
+
+@pytest.mark.parametrize("order, regs", [
+    (ByteOrder.ABCD, [0x3F60, 0x0000]),
+    (ByteOrder.CDAB, [0x0000, 0x3F60]),
+    (ByteOrder.BADC, [0x603F, 0x0000]),
+    (ByteOrder.DCBA, [0x0000, 0x603F]),
+])
+def test_byte_orders(order, regs):
+    # 0x3F600000 = 0.875
+    assert [0.875] == Converter.decode(regs, DataType.FLOAT32, order).tolist()
+    assert regs == Converter.encode([0.875], DataType.FLOAT32, order).tolist()
+
+
+def test_same_as_server_real():
+    # IOServer decodes REAL and DWORD with low word first
+    assert [0.875] == Converter.decode([0, 16224], DataType.FLOAT32, ByteOrder.CDAB).tolist()
+    assert [(20 << 16) + 10] == Converter.decode([10, 20], DataType.UINT32, ByteOrder.CDAB).tolist()
+
+
+def test_round_trip():
+    rnd = np.random.default_rng(3)
+    samples = {
+        DataType.INT16: rnd.integers(-2 ** 15, 2 ** 15, 100),
+        DataType.UINT16: rnd.integers(0, 2 ** 16, 100),
+        DataType.INT32: rnd.integers(-2 ** 31, 2 ** 31, 100),
+        DataType.UINT32: rnd.integers(0, 2 ** 32, 100),
+        DataType.INT64: rnd.integers(-2 ** 63, 2 ** 63 - 1, 100, dtype=np.int64),
+        DataType.FLOAT32: rnd.standard_normal(100).astype(np.float32),
+        DataType.FLOAT64: rnd.standard_normal(100),
+        DataType.BCD: rnd.integers(0, 10000, 100),
+    }
+    for type_, values in samples.items():
+        for order in ByteOrder:
+            regs = Converter.encode(values, type_, order)
+            assert np.uint16 == regs.dtype
+            assert len(values) * Converter.size(type_) == len(regs)
+            assert values.tolist() == Converter.decode(regs, type_, order).tolist(), (type_, order)
+
+
+def test_wide_types():
+    value = -1234567890123456789
+    regs = registers(struct.pack(">q", value))
+    assert regs == Converter.encode([value], DataType.INT64).tolist()
+    assert [value] == Converter.decode(regs[::-1], DataType.INT64, ByteOrder.CDAB).tolist()
+    regs = registers(struct.pack(">d", 1.0 / 3))
+    assert [1.0 / 3] == Converter.decode(regs, DataType.FLOAT64).tolist()
+    assert [-2] == Converter.decode([0xFFFF, 0xFFFE], DataType.INT32).tolist()
+
+
+def test_string():
+    regs = Converter.encode(["AB", "xyz"], DataType.STRING, count=2)
+    assert [0x4142, 0, 0x7879, 0x7A00] == regs.tolist()
+    assert ["AB", "xyz"] == Converter.decode(regs, DataType.STRING, count=2).tolist()
+    swapped = Converter.encode(["xyz"], DataType.STRING, ByteOrder.BADC, count=2)
+    assert [0x7978, 0x007A] == swapped.tolist()
+    assert ["xyz"] == Converter.decode(swapped, DataType.STRING, ByteOrder.BADC, count=2).tolist()
+    with pytest.raises(ValueError):
+        Converter.encode(["12345"], DataType.STRING, count=2)
+
+
+def test_bcd():
+    assert [0x1234] == Converter.encode([1234], DataType.BCD).tolist()
+    assert [9870] == Converter.decode([0x9870], DataType.BCD).tolist()
+    with pytest.raises(ValueError):
+        Converter.decode([0x00A0], DataType.BCD)
+    with pytest.raises(ValueError):
+        Converter.encode([10000], DataType.BCD)
+
+
+@pytest.mark.parametrize("values, type_", [
+    ([70000], DataType.INT16), ([-1], DataType.UINT16), ([1.5], DataType.INT32),
+    ([2 ** 32], DataType.UINT32), ([float("nan")], DataType.INT16),
+    ([1e39], DataType.FLOAT32), ([2 ** 53 + 1], DataType.FLOAT64),
+    ([float(2 ** 63 - 1)], DataType.INT64), ([2.0 ** 32], DataType.UINT32),
+])
+def test_inexact_encoding_is_rejected(values, type_):
+    with pytest.raises(ValueError):
+        Converter.encode(values, type_)
+
+
+def test_exact_encoding():
+    assert [-2 ** 63] == Converter.decode(Converter.encode([-2.0 ** 63], DataType.INT64), DataType.INT64).tolist()
+    assert [2 ** 63 - 1] == Converter.decode(Converter.encode([2 ** 63 - 1], DataType.INT64), DataType.INT64).tolist()
+    assert [0x7FFF] == Converter.encode([32767.0], DataType.INT16).tolist()
+    assert np.isnan(Converter.decode(Converter.encode([float("nan")], DataType.FLOAT32), DataType.FLOAT32)[0])
+
+
+def test_wrong_number_of_registers():
+    with pytest.raises(ValueError):
+        Converter.decode([1, 2, 3], DataType.FLOAT32)
@@ -0,0 +1,100 @@
+import pytest
+
+from MBTools.drivers.modbus.ModbusDriver import DriverCreator, DeviceCreator
+from MBTools.oiserver.DataModel import DataModel
+from MBTools.oiserver.Tag import Tag, TagType
+
+
+@pytest.fixture
+def devices():
+    return DeviceCreator.create("127.0.0.1", 502, "dev1"), DeviceCreator.create("127.0.0.1", 10502, "dev2")
+
+
+@pytest.fixture
+def tags(devices):
+    dev1, dev2 = devices
+    return [Tag(device=dev1, name="TAG1", type_=TagType.INT, address=100),
+            Tag(device=dev1, name="TAG2", type_=TagType.INT, address=101),
+            Tag(device=dev2, name="TAG3", type_=TagType.INT, address=100),
+            Tag(device=dev2, name="TAG4", type_=TagType.INT, address=100)]
+
+
+# ------------ DataModel indexes --------------
+
+
+def test_tags_by_address(devices, tags):
+    dev1, dev2 = devices
+    bit0 = Tag(device=dev1, name="BIT0", type_=TagType.BOOL, address=100, bit_number=0)
+    model = DataModel()
+    model.add_many(tags[:3] + [bit0])
+
+    assert [tags[0], bit0] == model.tags_by_address(dev1, 100)
+    assert [tags[2]] == model.tags_by_address(dev2, 100)
+    assert [] == model.tags_by_address(dev2, 101)
+
+    model.discard(tags[0])
+    assert [bit0] == model.tags_by_address(dev1, 100)
+
+
+def test_bulk(devices, tags):
+    dev1, dev2 = devices
+    model = DataModel()
+    model.add_many(tags)
+    assert 4 == len(model)
+    assert 2 == len(model.devices())
+
+    # device is kept while at least one tag uses it
+    model.discard_many([tags[0], tags[2]])
+    assert [dev1, dev2] == model.devices()
+    model.discard_many([tags[1], tags[3], tags[3]])
+    assert [] == model.devices()
+    assert [] == model.tags_by_device(dev1)
+    assert 0 == len(model)
+
+
+def test_duplicate_is_ignored(devices, tags):
+    dev1, dev2 = devices
+    same_name = Tag(device=dev2, name="TAG1", type_=TagType.INT, address=5)
+    model = DataModel()
+    model.add_many([tags[0], same_name])
+    assert [dev1] == model.devices()
+    assert tags[0] is model.find_tag_by_name("TAG1")
+
+    # the tag of the model is discarded by name
+    model.discard(same_name)
+    assert 0 == len(model)
+    assert [] == model.devices()
+
+
+def test_drivers(devices, tags):
+    dev1, dev2 = devices
+    model = DataModel()
+    model.add_many([tags[0], tags[2]])
+    assert [] == model.drivers()
+    drv = DriverCreator.create("modbus")
+    dev1.setDriver(drv)
+    dev2.setDriver(drv)
+    assert [drv] == model.drivers()
+    model.discard_many([tags[0], tags[2]])
+    assert [] == model.drivers()
+
+
+def test_init_by_tags(devices, tags):
+    model = DataModel([tags[0], tags[2]])
+    assert tags[0] in model
+    assert list(devices) == model.devices()
+
+
+def test_devices_change_on_first_and_last_tag(devices, tags):
+    dev1, dev2 = devices
+    model = DataModel()
+    model.add(tags[2])
+    model.add(tags[0])
+    model.add(tags[1])
+    assert [dev2, dev1] == model.devices()      # order of first tags
+    model.discard(tags[2])
+    assert [dev1] == model.devices()
+    model.discard(tags[0])
+    assert [dev1] == model.devices()
+    model.discard(tags[1])
+    assert [] == model.devices()
@@ -0,0 +1,72 @@
+import logging
+
+from MBTools.utilites.Log import getLogger, RateLimitFilter, RepeatFormatter
+
+
+class ListHandler(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.messages = []
+        self.setFormatter(RepeatFormatter("%(message)s"))
+
+    def emit(self, record):
+        self.messages.append(self.format(record))
+
+
+def make_logger(name, interval):
+    log = getLogger(name)
+    log.setLevel(logging.DEBUG)
+    log.propagate = False
+    handler = ListHandler()
+    handler.addFilter(RateLimitFilter(interval))
+    log.handlers = [handler]
+    return log, handler
+
+
+def test_repeated_messages_are_suppressed(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr("MBTools.utilites.Log.time.monotonic", lambda: now[0])
+    log, handler = make_logger("test.rate", interval=10.0)
+
+    for i in range(5):
+        log.warning("%s: no connection", "dev{}".format(i))
+    assert ["dev0: no connection"] == handler.messages
+
+    now[0] += 10.0
+    log.warning("%s: no connection", "dev5")
+    assert "dev5: no connection (repeated 4 times)" == handler.messages[-1]
+
+
+def test_record_is_not_changed(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr("MBTools.utilites.Log.time.monotonic", lambda: now[0])
+    log, handler = make_logger("test.record", interval=10.0)
+    other = ListHandler()           # other handler gets the same records
+    other.setFormatter(logging.Formatter("%(message)s"))
+    log.addHandler(other)
+
+    log.warning("%d%% done", 50)
+    log.warning("%d%% done", 60)
+    now[0] += 10.0
+    log.warning("%d%% done", 70)
+    assert ["50% done", "70% done (repeated 1 times)"] == handler.messages
+    assert ["50% done", "60% done", "70% done"] == other.messages
+
+
+def test_key_separates_messages():
+    log, handler = make_logger("test.key", interval=10.0)
+    log.warning("%s: no connection", "a", extra={"key": "a"})
+    log.warning("%s: no connection", "b", extra={"key": "b"})
+    log.warning("%s: no connection", "a", extra={"key": "a"})
+    assert ["a: no connection", "b: no connection"] == handler.messages
+
+
+def test_disabled_level_does_not_format():
+    class Lazy(object):
+        def __str__(self):
+            raise AssertionError("must not be formatted")
+
+    log, handler = make_logger("test.lazy", interval=0.0)
+    log.setLevel(logging.WARNING)
+    log.debug("%s", Lazy())
+    assert [] == handler.messages
@@ -0,0 +1,87 @@
+import sys
+import threading
+
+import pytest
+
+from MBTools.drivers.modbus.Mailbox import Mailbox
+from MBTools.drivers.modbus.ModbusDriver import DriverCreator, DeviceCreator, QualityEnum
+
+
+# ------------ Mailbox --------------
+
+
+def test_latest_value_wins():
+    mailbox = Mailbox()
+    assert mailbox.put("a", 1)          # the consumer is woken up once
+    assert not mailbox.put("b", 1)
+    assert not mailbox.put("a", 2)
+    assert 2 == len(mailbox)
+    assert [2, 1] == mailbox.drain()
+    assert [] == mailbox.drain()
+    assert mailbox.put("b", 3)
+
+
+def test_concurrent_producers():
+    mailbox = Mailbox()
+    wakeups = []
+
+    def produce(key):
+        for i in range(1000):
+            if mailbox.put(key, (key, i)):
+                wakeups.append(key)
+
+    threads = [threading.Thread(target=produce, args=(key,)) for key in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert 1 == len(wakeups)
+    assert [(key, 999) for key in range(4)] == sorted(mailbox.drain())
+
+
+# ------------ QtModbusDriver --------------
+
+
+def publish(drv, dev, ranges, times: int):
+    """ Emits updates of the ranges from polling thread """
+    def run():
+        for i in range(times):
+            for range_ in ranges:
+                range_.setRegisters([i], QualityEnum.GOOD)
+                drv.driver().onDataChanged(range_, dev)
+
+    thread = threading.Thread(target=run)
+    thread.start()
+    thread.join()
+
+
+def test_adapter_conflates_updates():
+    from PyQt5.QtCore import QCoreApplication
+    from MBTools.drivers.modbus.QtDriver import QtModbusDriver
+
+    app = QCoreApplication.instance() or QCoreApplication(sys.argv)
+    dev = DeviceCreator.create("127.0.0.1", 502, "dev1")
+    ranges = [dev.addRange(0, 1, "range0"), dev.addRange(10, 1, "range1")]
+    for conflate, expect in ((True, 2), (False, 2000)):
+        drv = QtModbusDriver(DriverCreator.create("modbus"), conflate=conflate)
+        got = []
+        drv.dataChanged.connect(lambda name, rng: got.append((name, rng.register(rng.address()))))
+
+        publish(drv, dev, ranges, 1000)
+        assert (2 if conflate else 0) == drv.pending()
+        app.processEvents()
+        assert expect == len(got)
+        assert [("dev1", 999), ("dev1", 999)] == got[-2:]
+        assert 0 == drv.pending()
+
+
+def test_adapter_delegates_to_driver():
+    from MBTools.drivers.modbus.QtDriver import QtModbusDriver
+
+    drv = QtModbusDriver(DriverCreator.create("modbus"))
+    assert drv.driver().engineType() == drv.engineType()
+    with pytest.raises(AttributeError):
+        drv.unknown
+    # attributes read before __init__ (copy, pickle) don't recurse
+    with pytest.raises(AttributeError):
+        QtModbusDriver.__new__(QtModbusDriver).devices
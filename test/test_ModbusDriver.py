@@ -1,7 +1,9 @@
 
+import time
+
 import pytest
 
-from MBTools.drivers.modbus.ModbusDriver import ModbusCalculator
+from MBTools.drivers.modbus.ModbusDriver import ModbusCalculator, DeviceCreator, Range, QualityEnum, REQUEST_DELAY
 
 
 # ------------ ModbusCalculator --------------
@@ -18,3 +20,139 @@ from MBTools.drivers.modbus.ModbusDriver import ModbusCalculator
 ])
 def test_split_numbers(numbers, expect, max_len):
     assert ModbusCalculator.split_numbers(numbers, max_len) == expect
+
+
+# ------------ Scan classes --------------
+
+
+def test_scan_schedule():
+    dev = DeviceCreator.create("127.0.0.1", 502, "dev1")
+    fast = dev.addRange(0, 10, "fast", scan_rate=0.1)
+    slow = dev.addRange(100, 10, "slow", scan_rate=10.0)
+    default = dev.addRange(200, 10, "default")
+    assert REQUEST_DELAY == default.scanRate()
+
+    # all ranges are polled at start
+    assert [fast, slow, default] == dev._dueRanges(1000.0)
+    assert [] == dev._dueRanges(1000.05)
+    assert pytest.approx(0.05) == dev._waitTime(1000.05)
+    assert [fast] == dev._dueRanges(1000.1)
+    assert [fast, default] == dev._dueRanges(1000.5)
+    assert [fast, slow, default] == dev._dueRanges(1010.0)
+
+    # during 60 seconds the fast range is polled 100 times more often than slow one
+    polls = {fast: 0, slow: 0, default: 0}
+    now = 1020.0
+    while now < 1080.0:
+        for data in dev._dueRanges(now):
+            polls[data] += 1
+        now += dev._waitTime(now) or 0.001
+    assert 600 == pytest.approx(polls[fast], abs=2)
+    assert 6 == pytest.approx(polls[slow], abs=1)
+    assert dev._waitTime(now) <= REQUEST_DELAY
+
+
+# ------------ Range --------------
+
+
+def test_range_in_place():
+    data = Range(4)
+    data.setAddress(100)
+    view = data.reristersNum(101, 2)
+    whole = data.registers()
+    data.setRegisters([1, 2, 3, 4], QualityEnum.GOOD)
+    # views are not copies, they show data of the last polling
+    assert [2, 3] == list(view)
+    assert whole is data.registers()
+    data.setRegistersBytes(bytes([0, 5, 0, 6, 0x12, 0x34, 0xFF, 0xFF]), QualityEnum.GOOD)
+    assert [5, 6, 0x1234, 0xFFFF] == list(whole)
+    assert [6, 0x1234] == list(view)
+    assert 4 == data.number()
+
+
+def test_range_values_are_int():
+    data = Range(2)
+    data.setRegistersBytes(bytes([0xFF, 0xFF, 0x00, 0x01]))
+    regs = data.reristersNum(0, 2)
+    assert 0x1FFFF == (regs[1] << 16) + regs[0]
+
+
+@pytest.mark.parametrize("addr, num, expect, value", [
+    (10, 1, [0], 0), (12, 2, [2, 3], 2), (13, 2, None, 3), (9, 1, None, None), (14, 1, None, None),
+])
+def test_range_bounds(addr, num, expect, value):
+    data = Range(4)
+    data.setAddress(10)
+    data.setRegisters([0, 1, 2, 3])
+    regs = data.reristersNum(addr, num)
+    assert expect == (None if regs is None else list(regs))
+    assert value == data.register(addr)
+
+
+# ------------ Change detection --------------
+
+
+def published(dev):
+    emitted = []
+    dev.dataChanged.connect(lambda data: emitted.append(list(data.changedMask())))
+    return emitted
+
+
+def test_publish_only_changed():
+    dev = DeviceCreator.create("127.0.0.1", 502, "dev1")
+    data = dev.addRange(0, 3, "range0")
+    emitted = published(dev)
+
+    data.setRegisters([1, 2, 3], QualityEnum.GOOD)
+    assert dev._publish(data)
+    # same registers and quality
+    data.setRegisters([1, 2, 3], QualityEnum.GOOD)
+    assert not dev._publish(data)
+    data.setRegisters([1, 5, 3], QualityEnum.GOOD)
+    assert dev._publish(data)
+    # only quality has changed
+    data.setQuality(QualityEnum.NO_CONNET)
+    assert dev._publish(data)
+    assert [[True, True, True], [False, True, False], [False, False, False]] == emitted
+
+
+def test_changes_are_accumulated_till_publishing():
+    dev = DeviceCreator.create("127.0.0.1", 502, "dev1")
+    data = dev.addRange(0, 3, "range0")
+    data.setRegisters([1, 2, 3], QualityEnum.GOOD)
+    dev._publish(data)
+    data.setRegisters([9, 2, 3], QualityEnum.GOOD)
+    data.setRegisters([9, 2, 8], QualityEnum.GOOD)
+    assert dev._publish(data)
+    assert [True, False, True] == list(data.changedMask())
+
+
+def test_heartbeat():
+    dev = DeviceCreator.create("127.0.0.1", 502, "dev1")
+    data = dev.addRange(0, 3, "range0")
+    dev.setHeartbeat(0.05)
+    data.setRegisters([1, 2, 3], QualityEnum.GOOD)
+    assert dev._publish(data)
+    assert not dev._publish(data)
+    time.sleep(0.06)
+    assert dev._publish(data)
+
+
+# ------------ Timestamps --------------
+
+
+def test_range_timestamp():
+    dev = DeviceCreator.create("127.0.0.1", 502, "dev1")
+    first = dev.addRange(0, 2, "range0")
+    second = dev.addRange(10, 2, "range1")
+    dev._dueRanges(time.monotonic())
+    sent_ns = time.monotonic_ns()
+    first.setRegisters([1, 2], QualityEnum.GOOD, dev._stamp(sent_ns))
+    second.setRegisters([3, 4], QualityEnum.GOOD, dev._stamp(time.monotonic_ns()))
+
+    stamp = first.timestamp()
+    assert sent_ns == stamp.sent_ns
+    assert 0 <= stamp.latency_ns()
+    assert first.timestamp() < second.timestamp()
+    assert abs(time.time_ns() - stamp.wall_ns) < 10 ** 9
+    assert time.localtime(stamp.wall_ns // 10 ** 9) == first.time()
@@ -0,0 +1,104 @@
+import random
+
+from MBTools.drivers.modbus.RangeIndex import RangeIndex
+from MBTools.drivers.modbus.ModbusDriver import DeviceCreator, DriverCreator
+
+
+class Span(object):
+    def __init__(self, address, number):
+        self.__address = address
+        self.__number = number
+
+    def address(self):
+        return self.__address
+
+    def number(self):
+        return self.__number
+
+    def __repr__(self):
+        return "Span({0}, {1})".format(self.__address, self.__number)
+
+
+# ------------ RangeIndex --------------
+
+
+def test_find():
+    a, b = Span(10, 5), Span(100, 1)
+    index = RangeIndex([b, a])
+    assert [a, b] == index.ranges()
+    assert index.find(10) is a
+    assert index.find(14) is a
+    assert index.find(15) is None
+    assert index.find(9) is None
+    assert index.find(100) is b
+    assert index.find(12, 3) is a
+    assert index.find(12, 4) is None
+    assert 100 in index and 101 not in index
+
+
+def test_overlapping():
+    big, small = Span(0, 100), Span(10, 2)
+    index = RangeIndex([big, small])
+    # the latest range which holds the address is found first, ranges before it are checked too
+    assert index.find(11) is small
+    assert index.find(11, 5) is big
+    assert index.find(50) is big
+
+
+def test_remove():
+    a, b, c = Span(0, 10), Span(0, 10), Span(5, 50)
+    index = RangeIndex([a, b, c])
+    assert index.remove(c)
+    assert not index.remove(c)
+    assert index.find(20) is None
+    assert index.remove(a)
+    assert index.find(5) is b
+    assert index.remove(b)
+    assert 0 == len(index)
+    assert index.find(5) is None
+
+
+def test_random_against_scan():
+    rnd = random.Random(1)
+    spans = [Span(rnd.randrange(0, 500), rnd.randrange(1, 40)) for _ in range(60)]
+    index = RangeIndex(spans)
+    for span in spans[::3]:
+        index.remove(span)
+    rest = [span for i, span in enumerate(spans) if i % 3]
+    for address in range(0, 560):
+        for size in (1, 2, 7):
+            found = index.find(address, size)
+            covering = [span for span in rest if span.address() <= address and
+                        address + size <= span.address() + span.number()]
+            assert (found in covering) if covering else found is None
+
+
+# ------------ Device / ModbusDriver --------------
+
+
+def test_device_address_lookup():
+    dev = DeviceCreator.create("127.0.0.1", 502, "dev1")
+    r1 = dev.addRange(0, 10, "range0")
+    r2 = dev.addRange(100, 2, "range1")
+    assert dev.rangeByAddress(5) is r1
+    assert dev.rangeByAddress(101) is r2
+    assert dev.rangeByAddress(50) is None
+    assert dev.spanRange(100, 2) is r2
+    assert not dev.isSpanExists(101, 2)
+    dev.delRange(r2)
+    assert not dev.isAddressExists(100)
+    dev.delRangeById(r1.dataId())
+    assert not dev.isAddressExists(5)
+
+
+def test_driver_is_address_exists():
+    drv = DriverCreator.create("modbus")
+    dev = DeviceCreator.create("127.0.0.1", 1, "dev1")
+    dev.addRange(20, 5, "range0")
+    assert not drv.isAddressExists(20)
+    drv.addDevice(dev)
+    try:
+        assert drv.isAddressExists(24)
+        assert not drv.isAddressExists(25)
+    finally:
+        drv.delDevice(dev)
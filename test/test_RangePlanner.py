@@ -0,0 +1,68 @@
+import pytest
+
+from MBTools.drivers.modbus.RangePlanner import RangePlanner, PlanCost, MAX_READ_REGISTERS
+
+
+# ------------ RangePlanner --------------
+
+
+@pytest.mark.parametrize("spans, expect", [
+    ([],                                [],                            ),
+    ([5],                               [[5, 5]],                      ),
+    ([(10, 2), 11, 12],                 [[10, 11], [12, 12]],          ),
+    ([(10, 2), (11, 2), 20],            [[10, 12], [20, 20]],          ),
+    ([3, 1, 2, 2],                      [[1, 1], [2, 2], [3, 3]],      ),
+])
+def test_blocks(spans, expect):
+    assert RangePlanner.blocks(spans) == expect
+
+
+@pytest.mark.parametrize("spans, cost, expect", [
+    # small gaps are cheaper to read than a new request
+    ([1, 10, 30],                       PlanCost(0.01, 0.0002),        [[1, 30]]),
+    # large gap is cheaper as a separate request
+    ([1, 10, 1000],                     PlanCost(0.01, 0.0002),        [[1, 10], [1000, 1000]]),
+    # expensive registers (slow serial gateway): do not read the gaps
+    ([1, 10, 30],                       PlanCost(0.01, 0.01),          [[1, 1], [10, 10], [30, 30]]),
+    # protocol limit 125 registers
+    ([0, 124, 125],                     PlanCost(1.0, 0.0),            [[0, 124], [125, 125]]),
+    # REAL at 124 must not be split, so the first request ends at 123
+    ([0, (124, 2)],                     PlanCost(1.0, 0.0),            [[0, 0], [124, 125]]),
+    ([0, 50, (99, 2)],                  PlanCost(1.0, 0.0, 100),       [[0, 50], [99, 100]]),
+])
+def test_plan(spans, cost, expect):
+    assert RangePlanner.plan(spans, cost).requests == expect
+
+
+def test_plan_never_exceeds_limit():
+    spans = [(addr, 2) for addr in range(0, 3000, 7)]
+    plan = RangePlanner.plan(spans, PlanCost(1.0, 0.0))
+    for first, last in plan.requests:
+        assert last - first + 1 <= MAX_READ_REGISTERS
+    # every tag is read by exactly one request
+    for addr, size in spans:
+        assert 1 == len([r for r in plan.requests if r[0] <= addr and addr + size - 1 <= r[1]])
+
+
+def test_plan_cycle_time():
+    cost = PlanCost(0.01, 0.001)
+    plan = RangePlanner.plan([1, 2, 3, 1000], cost)
+    assert [[1, 3], [1000, 1000]] == plan.requests
+    assert 4 == plan.registers()
+    assert pytest.approx(cost.request_time(3) + cost.request_time(1)) == plan.cycle_time
+
+
+def test_plan_block_too_long():
+    spans = [(addr, 2) for addr in range(0, 200)]
+    with pytest.raises(ValueError):
+        RangePlanner.plan(spans)
+
+
+def test_plan_classes():
+    spans = [(10, 1, 0.1), (11, 1, 0.1), (12, 2, 10.0), (13, 1, 1.0), (500, 1, 10.0), (501, 1, 10.0)]
+    plans = RangePlanner.plan_classes(spans, PlanCost(0.01, 0.0002))
+    # REAL at 12 overlaps the tag at 13, the block is read by the fastest class
+    assert {0.1: [[10, 11]], 1.0: [[12, 13]], 10.0: [[500, 501]]} == \
+        {rate: plan.requests for rate, plan in plans.items()}
+    assert pytest.approx(plans[0.1].cycle_time / 0.1 + plans[1.0].cycle_time + plans[10.0].cycle_time / 10.0) == \
+        RangePlanner.load(plans)
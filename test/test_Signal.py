@@ -0,0 +1,78 @@
+import subprocess
+import sys
+import threading
+
+import pytest
+
+from MBTools.utilites.Signal import Signal
+from MBTools.drivers.modbus.ModbusDriver import DeviceCreator, DriverCreator
+
+
+class Sender(object):
+    changed = Signal(int)
+
+
+def test_signal_is_per_instance():
+    a, b = Sender(), Sender()
+    got = []
+    a.changed.connect(got.append)
+    a.changed.emit(1)
+    b.changed.emit(2)
+    assert [1] == got
+    assert a.changed is a.changed
+
+
+def test_disconnect():
+    sender = Sender()
+    got = []
+    sender.changed.connect(got.append)
+    sender.changed.disconnect(got.append)
+    sender.changed.emit(1)
+    assert [] == got
+    with pytest.raises(TypeError):
+        sender.changed.disconnect(got.append)
+
+
+def test_disconnect_while_emitting():
+    sender = Sender()
+    got = []
+
+    def once(value):
+        got.append(value)
+        sender.changed.disconnect(once)
+
+    sender.changed.connect(once)
+    sender.changed.connect(got.append)
+    sender.changed.emit(1)
+    sender.changed.emit(2)
+    assert [1, 1, 2] == got
+
+
+def test_core_is_headless():
+    code = ("import sys\n"
+            "from MBTools.drivers.modbus.ModbusDriver import DriverCreator, DeviceCreator\n"
+            "from MBTools.drivers.modbus.AsyncEngine import AsyncEngine\n"
+            "assert 'PyQt5' not in sys.modules, 'PyQt5 is imported'\n")
+    subprocess.run([sys.executable, "-c", code], check=True)
+
+
+def test_qt_adapter_delivers_to_gui_thread():
+    from PyQt5.QtCore import QCoreApplication
+    from MBTools.drivers.modbus.QtDriver import QtModbusDriver
+
+    app = QCoreApplication.instance() or QCoreApplication(sys.argv)
+    drv = QtModbusDriver(DriverCreator.create("modbus"))
+    dev = DeviceCreator.create("127.0.0.1", 502, "dev1")
+    data = dev.addRange(0, 2, "range0")
+    got = []
+    drv.dataChanged.connect(lambda name, rng: got.append((name, rng, threading.current_thread())))
+
+    # core signal from polling thread
+    thread = threading.Thread(target=drv.driver().onDataChanged, args=(data, dev))
+    thread.start()
+    thread.join()
+    assert [] == got
+    app.processEvents()
+    assert [("dev1", data, threading.main_thread())] == got
+    assert "modbus" == drv.objectName()
+    assert [] == list(drv.devices())
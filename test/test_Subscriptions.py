@@ -0,0 +1,122 @@
+import json
+
+import numpy as np
+import pytest
+
+from MBTools.drivers.modbus.ModbusDriver import QualityEnum
+from MBTools.oiserver.constants import TagType
+from MBTools.oiserver.Tag import Tag
+from MBTools.oiserver.Subscriptions import Subscriptions
+
+
+# ------------ Subscriptions --------------
+
+
+def update(subscriptions: Subscriptions, values: dict, tags: dict, quality=QualityEnum.GOOD):
+    """ Sets values {name: value} to the tags as the server does it """
+    watched = subscriptions.watched(tags.values())
+    for name, value in values.items():
+        tags[name].value = value
+        tags[name].quality = quality
+    subscriptions.notify(watched)
+
+
+@pytest.fixture
+def tags():
+    names = ["TAG1_REAL", "TAG1_WORD", "TAG2_WORD", "BIT"]
+    types = [TagType.REAL, TagType.WORD, TagType.WORD, TagType.BOOL]
+    return {name: Tag(None, name, type_) for name, type_ in zip(names, types)}
+
+
+def test_name_pattern_and_group(tags):
+    subscriptions = Subscriptions()
+    got = {"name": [], "pattern": [], "group": []}
+    subscriptions.subscribe("TAG1_WORD", got["name"].append)
+    subscriptions.subscribe("*_WORD", got["pattern"].append)
+    subscriptions.subscribe([tags["TAG1_REAL"], "BIT"], got["group"].append)
+
+    update(subscriptions, {"TAG1_WORD": 5, "TAG2_WORD": 7, "BIT": True}, tags)
+    assert [[("TAG1_WORD", 0, 5)]] == [[(c.tag.name, c.old, c.new) for c in changes] for changes in got["name"]]
+    assert [["TAG1_WORD", "TAG2_WORD"]] == [[c.tag.name for c in changes] for changes in got["pattern"]]
+    assert [[("BIT", True, QualityEnum.GOOD)]] == \
+        [[(c.tag.name, c.new, c.quality) for c in changes] for changes in got["group"]]
+
+    # change of quality only is passed too
+    update(subscriptions, {"TAG1_REAL": 0}, tags)
+    assert [("TAG1_REAL", 0, 0, QualityEnum.GOOD)] == \
+        [(c.tag.name, c.old, c.new, c.quality) for c in got["group"][-1]]
+
+    # nothing is changed - nothing is passed
+    update(subscriptions, {"TAG1_WORD": 5, "TAG2_WORD": 7, "TAG1_REAL": 0}, tags)
+    assert 1 == len(got["name"]) == len(got["pattern"]) and 2 == len(got["group"])
+
+
+def test_deadband(tags):
+    subscriptions = Subscriptions()
+    absolute, percent = [], []
+    subscriptions.subscribe("TAG1_REAL", absolute.append, absolute=0.5)
+    subscriptions.subscribe("TAG1_REAL", percent.append, percent=10)
+
+    for value in (np.float32(10), np.float32(10.4), np.float32(10.8), np.float32(11.2), np.float32(12.5)):
+        update(subscriptions, {"TAG1_REAL": value}, tags)
+    assert [(0, 10), (10, 10.8), (10.8, 12.5)] == \
+        [(changes[0].old, pytest.approx(changes[0].new)) for changes in absolute]
+    assert [(0, 10), (10, 11.2), (11.2, 12.5)] == \
+        [(changes[0].old, pytest.approx(changes[0].new)) for changes in percent]
+
+    # change of quality is passed through the deadband
+    update(subscriptions, {"TAG1_REAL": np.float32(12.6)}, tags, QualityEnum.REQUEST_ERROR)
+    assert QualityEnum.REQUEST_ERROR == absolute[-1][0].quality == percent[-1][0].quality
+
+
+def test_slow_drift_under_deadband(tags):
+    subscriptions = Subscriptions()
+    got = []
+    subscriptions.subscribe("TAG1_REAL", got.append, absolute=1)
+    tags["TAG1_REAL"].quality = QualityEnum.GOOD
+    for value in (0.6, 1.2, 1.8, 2.4):
+        update(subscriptions, {"TAG1_REAL": value}, tags)
+    # each step is under the deadband, the drift from the last passed value isn't
+    assert [(0, 1.2), (1.2, 2.4)] == [(changes[0].old, changes[0].new) for changes in got]
+
+
+def test_unsubscribe(tags):
+    subscriptions = Subscriptions()
+    got = []
+    subscription = subscriptions.subscribe("TAG*", got.append)
+    subscriptions.unsubscribe(subscription)
+    assert [] == subscriptions.watched(tags.values())
+    update(subscriptions, {"TAG1_WORD": 1}, tags)
+    assert [] == got
+
+
+# ------------ IOServer --------------
+
+
+def test_server_notifies_changed_tags(tmp_path):
+    from PyQt5.QtCore import QCoreApplication
+    from MBTools.oiserver.OIServer import IOServer
+    from MBTools.oiserver.OIServerConfigure import create_config, FormatName
+
+    app = QCoreApplication.instance() or QCoreApplication([])
+    conf = {
+        "devices": [{"name": "dev1", "protocol": "modbus", "ip": "127.0.0.1", "port": 1}],
+        "tags": [{"name": "A", "type": "WORD", "device": "dev1", "address": 10, "comment": ""},
+                 {"name": "B", "type": "WORD", "device": "dev1", "address": 11, "comment": ""}],
+    }
+    path = tmp_path / "conf.json"
+    path.write_text(json.dumps(conf))
+    io = IOServer()
+    got = []
+    io.subscribe("B", got.append)
+    io.set_config(create_config(FormatName.JSON, str(path)))
+    try:
+        range_ = io.devices()[0].rangeByAddress(10)
+        for registers in ([1, 5], [2, 5], [3, 6]):
+            range_.setRegisters(registers, QualityEnum.GOOD)
+            io._IOServer__onRangesUpdated([("dev1", range_)])
+        assert [[("B", 0, 5)], [("B", 5, 6)]] == [[(c.tag.name, c.old, c.new) for c in changes] for changes in got]
+        assert got[-1][0].timestamp is range_.timestamp()
+    finally:
+        io.clear_config()
+        app.processEvents()
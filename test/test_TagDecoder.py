@@ -0,0 +1,79 @@
+import random
+from array import array
+
+import numpy as np
+
+from MBTools.oiserver.constants import TagType, TagTypeSize
+from MBTools.oiserver.Tag import Tag
+from MBTools.oiserver.TagDecoder import TagBatch
+
+
+def scalar(regs: [], type_: TagType, bit_number=None):
+    """ Scalar decoder of IOServer before TagBatch (IOServer.__regsToValue, verbatim), the oracle """
+    if regs is None or type_ is None:
+        return None
+
+    if len(regs) < TagTypeSize[type_]:
+        return None
+
+    if TagType.INT == type_:
+        return regs[0]
+    elif TagType.WORD == type_:
+        return regs[0]
+    elif TagType.UINT == type_:
+        return regs[0]
+    elif TagType.REAL == type_:
+        data_bytes = np.array([regs[0], regs[1]], dtype=np.uint16)
+        data_as_float = data_bytes.view(dtype=np.float32)
+        return data_as_float[0]
+    elif TagType.DWORD == type_:
+        data_as_dword = (regs[1] << 16) + regs[0]
+        return data_as_dword
+    elif TagType.BOOL == type_:
+        assert (bit_number is not None)
+        output = [int(x) for x in '{:08b}'.format(regs[0])]
+        output.reverse()
+        # Заполняем старшие биты нулями (пока просто добавляем 16 нулей, потом сделать лучуше)
+        output.extend([0 for i in range(16)])
+        return bool(output[bit_number])
+
+
+def same(a, b):
+    """ Values are equal including type and bits (NaN of REAL) """
+    if type(a) is not type(b):
+        return False
+    if isinstance(a, np.floating):
+        return a.tobytes() == b.tobytes()
+    return a == b
+
+
+def test_decode_types():
+    registers = array('H', [0, 16224, 0xFFFF, 10, 20, 0b1010])
+    tags = [Tag(None, "real", TagType.REAL), Tag(None, "int", TagType.INT),
+            Tag(None, "dword", TagType.DWORD), Tag(None, "bit1", TagType.BOOL, bit_number=1),
+            Tag(None, "bit2", TagType.BOOL, bit_number=2), Tag(None, "tail", TagType.DWORD)]
+    batch = TagBatch(list(zip(tags, [0, 2, 3, 5, 5, 5], [2, 1, 2, 1, 1, 2])))
+    values = batch.decode(memoryview(registers))
+    assert [0.875, 0xFFFF, (20 << 16) + 10, True, False, None] == values
+    assert isinstance(values[0], np.float32)
+
+
+def test_same_as_scalar_decoder():
+    rnd = random.Random(7)
+    types = [TagType.INT, TagType.UINT, TagType.WORD, TagType.DWORD, TagType.REAL, TagType.BOOL]
+    for _ in range(20):
+        registers = array('H', [rnd.choice([0, 1, 0x7F80, 0x7FC1, 0x8000, 0xFFFF, rnd.randrange(65536)])
+                                for _ in range(rnd.randrange(0, 40))])
+        entries = []
+        for i in range(60):
+            type_ = rnd.choice(types)
+            bit = rnd.randrange(0, 20) if TagType.BOOL == type_ else None
+            entries.append((Tag(None, "t{}".format(i), type_, bit_number=bit), rnd.randrange(0, 42),
+                            TagTypeSize[type_]))
+        values = TagBatch(entries).decode(memoryview(registers))
+
+        view = memoryview(registers)
+        for (tag, offset, size), value in zip(entries, values):
+            regs = view[offset: offset + size] if offset + size <= len(view) else None
+            expected = scalar(regs, tag.type, tag.bit_number)
+            assert same(expected, value), (tag.type, offset, tag.bit_number, list(registers))
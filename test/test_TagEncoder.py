@@ -0,0 +1,148 @@
+import json
+import time
+from array import array
+
+import numpy as np
+import pytest
+
+from MBTools.oiserver.constants import TagType, TagTypeSize
+from MBTools.oiserver.Tag import Tag
+from MBTools.oiserver.TagEncoder import TagEncoder
+from MBTools.oiserver.TagDecoder import TagBatch
+from MBTools.oiserver.OIServer import IOServer
+from test.ModbusServerStub import ModbusServerStub
+
+
+# ------------ TagEncoder --------------
+
+
+@pytest.mark.parametrize("type_, value, expect", [
+    (TagType.INT, -2, [0xFFFE]),
+    (TagType.INT, 0xFFFE, [0xFFFE]),
+    (TagType.WORD, 7, [7]),
+    (TagType.UINT, 65535, [65535]),
+    (TagType.DWORD, (20 << 16) + 10, [10, 20]),
+    (TagType.REAL, 0.875, [0, 16224]),
+])
+def test_encode(type_, value, expect):
+    tag = Tag(None, "tag", type_)
+    registers = TagEncoder.encode(tag, value)
+    assert expect == registers
+    assert TagTypeSize[type_] == len(registers)
+    decoded = TagBatch([(tag, 0, len(registers))]).decode(array('H', registers))[0]
+    assert (value & 0xFFFF if TagType.INT == type_ else value) == decoded
+
+
+@pytest.mark.parametrize("type_, value", [
+    (TagType.WORD, 65536), (TagType.UINT, -1), (TagType.INT, -40000),
+    (TagType.DWORD, 1.5), (TagType.REAL, 1e39),
+])
+def test_value_out_of_type(type_, value):
+    with pytest.raises(ValueError):
+        TagEncoder.encode(Tag(None, "tag", type_), value)
+
+
+def test_bit():
+    tag = Tag(None, "bit", TagType.BOOL, bit_number=3)
+    assert [0b1001] == TagEncoder.encode(tag, True, 0b0001)
+    assert [0xFFF7] == TagEncoder.encode(tag, 0, 0xFFFF)
+    for register, value in ((None, True), (0, 2)):
+        with pytest.raises(ValueError):
+            TagEncoder.encode(tag, value, register)
+
+
+# ------------ IOServer.write_tags --------------
+
+
+def wait(condition, timeout: float = 5.0):
+    finish = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < finish, "timeout"
+        time.sleep(0.01)
+
+
+@pytest.fixture
+def server(tmp_path):
+    from PyQt5.QtCore import QCoreApplication
+    from MBTools.oiserver.OIServerConfigure import create_config, FormatName
+
+    app = QCoreApplication.instance() or QCoreApplication([])
+    stub = ModbusServerStub({20: 0b0101}).start()
+    other = ModbusServerStub().start()
+    conf = {
+        "devices": [{"name": "dev1", "protocol": "modbus", "ip": "127.0.0.1", "port": stub.port},
+                    {"name": "dev2", "protocol": "modbus", "ip": "127.0.0.1", "port": other.port}],
+        "tags": [
+            {"name": "real", "type": "REAL", "device": "dev1", "address": 10, "comment": "", "scan": 50},
+            {"name": "dword", "type": "DWORD", "device": "dev1", "address": 12, "comment": "", "scan": 50},
+            {"name": "word", "type": "WORD", "device": "dev1", "address": 14, "comment": "", "scan": 50},
+            {"name": "bit", "type": "BOOL", "device": "dev1", "address": 20, "bit": 1, "comment": "", "scan": 50},
+            {"name": "other", "type": "WORD", "device": "dev2", "address": 10, "comment": "", "scan": 50},
+        ],
+    }
+    path = tmp_path / "conf.json"
+    path.write_text(json.dumps(conf))
+    io = IOServer()
+    io.set_config(create_config(FormatName.JSON, str(path)))
+    yield io, stub, other
+    io.clear_config()
+    app.processEvents()
+    stub.stop()
+    other.stop()
+
+
+def test_write_tags(server):
+    io, stub, other = server
+    wait(lambda: 0 < len(stub.requests) and 0 < len(other.requests))
+    results = io.write_tags({"real": 0.875, "dword": 70000, "word": 5})
+    assert all(future.result(5) for future in results.values())
+
+    assert [0, 16224, 70000 & 0xFFFF, 1, 5] == [stub.registers[address] for address in range(10, 15)]
+    writes = [request for request in stub.requests if request[1] in (0x06, 0x10)]
+    assert [(1, 0x10, 10, 5)] == writes                 # one request for adjacent tags
+    assert all(0x03 == request[1] for request in other.requests)
+    assert [0, 16224] == io.tag("real").device.readRegisters(10, 2)
+
+
+def test_write_bit(server):
+    io, stub, other = server
+    range_ = io.tag("bit").device.rangeByAddress(20)
+    wait(lambda: range_.register(20) == 0b0101)
+    assert io.write_tags({"bit": True})["bit"].result(5)
+    assert 0b0111 == stub.registers[20]
+
+
+def test_write_errors(server):
+    io, stub, other = server
+    results = io.write_tags({"unknown": 1, "word": 1.5, "real": "x"})
+    with pytest.raises(KeyError):
+        results["unknown"].result(0)
+    with pytest.raises(ValueError):
+        results["word"].result(0)
+    with pytest.raises((ValueError, TypeError)):
+        results["real"].result(0)
+
+
+def test_bit_burst_is_one_request(server):
+    io, stub, other = server
+    device = io.tag("bit").device
+    wait(lambda: 0 < len(stub.requests))
+    for mask_write, function in ((True, 0x16), (False, 0x06)):
+        device.setMaskWrite(mask_write)
+        stub.registers[20] = 0xF0F0
+        start = len(stub.requests)
+        futures = device.writeBits([(20, bit, bit < 4) for bit in range(4)] + [(20, 4, 0)])
+        assert all(future.result(5) for future in futures)
+        assert 0xF0EF == stub.registers[20]     # bits 5-15 are kept
+        writes = [fc for unit, fc, address, count in stub.requests[start:] if 0x03 != fc]
+        assert [function] == writes
+
+
+def test_bit_errors():
+    with pytest.raises(ValueError):
+        TagEncoder.bit(Tag(None, "bit", TagType.BOOL, bit_number=16), True)
+    with pytest.raises(ValueError):
+        TagEncoder.bit(Tag(None, "bit", TagType.BOOL, bit_number=1), 2)
+    with pytest.raises(ValueError):
+        TagEncoder.bit(Tag(None, "word", TagType.WORD), 1)
+    assert (1, True) == TagEncoder.bit(Tag(None, "bit", TagType.BOOL, bit_number=1), 1)
@@ -0,0 +1,102 @@
+import json
+
+import pytest
+
+from MBTools.drivers.modbus.ModbusDriver import DeviceCreator, QualityEnum
+from MBTools.oiserver.constants import TagType
+from MBTools.oiserver.Tag import Tag
+from MBTools.oiserver.TagIndex import TagIndex
+
+
+# ------------ TagIndex --------------
+
+
+def test_entries_by_range():
+    dev1 = DeviceCreator.create("127.0.0.1", 502, "dev1")
+    dev2 = DeviceCreator.create("127.0.0.1", 503, "dev2")
+    r1 = dev1.addRange(10, 4, "range0")
+    r2 = dev1.addRange(100, 1, "range1")
+    r3 = dev2.addRange(10, 4, "range0")
+    real = Tag(dev1, "real", TagType.REAL, address=12)
+    word = Tag(dev1, "word", TagType.WORD, address=10)
+    far = Tag(dev1, "far", TagType.WORD, address=100)
+    other = Tag(dev2, "other", TagType.INT, address=13)
+    lost = Tag(dev1, "lost", TagType.WORD, address=50)
+
+    index = TagIndex([real, word, far, other, lost])
+    assert [(word, 0, 1), (real, 2, 2)] == index.entries("dev1", r1.dataId())
+    assert [(far, 0, 1)] == index.entries("dev1", r2.dataId())
+    assert [(other, 3, 1)] == index.entries("dev2", r3.dataId())
+    assert [] == index.entries("dev2", r1.dataId())
+    assert [lost] == index.unconfigured()
+    assert 4 == len(index)
+
+
+def test_update_of_device():
+    dev1 = DeviceCreator.create("127.0.0.1", 502, "dev1")
+    dev2 = DeviceCreator.create("127.0.0.1", 503, "dev2")
+    r1 = dev1.addRange(10, 4, "range0")
+    r2 = dev2.addRange(10, 4, "range0")
+    word = Tag(dev1, "word", TagType.WORD, address=10)
+    other = Tag(dev2, "other", TagType.INT, address=13)
+    index = TagIndex([word, other])
+
+    r3 = dev1.addRange(100, 1, "range1")
+    far = Tag(dev1, "far", TagType.WORD, address=100)
+    lost = Tag(dev1, "lost", TagType.WORD, address=50)
+    index.update(dev1, [word, far, lost])
+    assert [(word, 0, 1)] == index.entries("dev1", r1.dataId())
+    assert [(far, 0, 1)] == index.entries("dev1", r3.dataId())
+    assert 1 == len(index.batch("dev1", r3.dataId()))
+    assert [(other, 3, 1)] == index.entries("dev2", r2.dataId())
+    assert [lost] == index.unconfigured()
+
+    index.remove("dev1")
+    assert [] == index.entries("dev1", r1.dataId())
+    assert [] == index.unconfigured()
+    assert 1 == len(index)
+
+
+# ------------ IOServer --------------
+
+
+@pytest.fixture
+def server(tmp_path):
+    from PyQt5.QtCore import QCoreApplication
+    from MBTools.oiserver.OIServer import IOServer
+    from MBTools.oiserver.OIServerConfigure import create_config, FormatName
+
+    app = QCoreApplication.instance() or QCoreApplication([])
+    conf = {
+        "devices": [
+            {"name": "dev1", "protocol": "modbus", "ip": "127.0.0.1", "port": 1},
+            {"name": "dev2", "protocol": "modbus", "ip": "127.0.0.1", "port": 2},
+        ],
+        "tags": [
+            {"name": "A", "type": "WORD", "device": "dev1", "address": 10, "comment": ""},
+            {"name": "B", "type": "INT", "device": "dev1", "address": 11, "comment": ""},
+            {"name": "C", "type": "WORD", "device": "dev2", "address": 10, "comment": ""},
+        ],
+    }
+    path = tmp_path / "conf.json"
+    path.write_text(json.dumps(conf))
+    io = IOServer()
+    io.set_config(create_config(FormatName.JSON, str(path)))
+    yield io
+    io.clear_config()
+    app.processEvents()
+
+
+def test_server_updates_only_tags_of_range(server):
+    for dev in server.devices():
+        server.driver().delDevice(dev)          # polling must not change quality of ranges
+    dev1 = [dev for dev in server.devices() if "dev1" == dev.name()][0]
+    range_ = dev1.rangeByAddress(10)
+    range_.setRegisters([7, 5], QualityEnum.GOOD)
+    server._IOServer__onRangesUpdated([("dev1", range_)])
+
+    assert 7 == server.tag("A").value
+    assert 5 == server.tag("B").value
+    assert QualityEnum.GOOD == server.tag("B").quality
+    assert range_.timestamp() is server.tag("A").timestamp
+    assert QualityEnum.GOOD != server.tag("C").quality
@@ -0,0 +1,137 @@
+import json
+
+import numpy as np
+
+from MBTools.drivers.modbus.ModbusDriver import DeviceCreator, QualityEnum
+from MBTools.drivers.modbus.Timestamp import Timestamp
+from MBTools.oiserver.constants import TagType
+from MBTools.oiserver.Tag import Tag
+from MBTools.oiserver.TagIndex import TagIndex
+from MBTools.oiserver.TagTable import TagTable, COLUMNS
+
+
+# ------------ TagTable --------------
+
+
+def stamps(timestamp: Timestamp) -> tuple:
+    return timestamp.sent_ns, timestamp.received_ns, timestamp.wall_ns
+
+
+def test_row_has_interface_of_tag():
+    dev = DeviceCreator.create("127.0.0.1", 502, "dev1")
+    table = TagTable()
+    real = table.add(Tag(dev, "real", TagType.REAL, address=12, comment="temperature"))
+    bit = table.add(Tag(dev, "bit", TagType.BOOL, address=3, bit_number=5))
+
+    assert dev is real.device
+    assert ("real", 12, TagType.REAL, 2, "temperature") == (real.name, real.address, real.type,
+                                                             real.size(), real.comment)
+    assert 0 == real.value and real.timestamp is None and real.bit_number is None and real.scan_rate is None
+    assert QualityEnum.UNDEF == real.quality
+    assert 5 == bit.bit_number
+
+    real.value = None
+    assert real.value is None
+    real.value = 0.1
+    bit.value = True
+    bit.scan_rate = 0.5
+    assert isinstance(real.value, np.float32) and np.float32(0.1) == real.value
+    assert True is bit.value
+    assert 0.5 == bit.scan_rate
+    stamp = Timestamp(1, 2, 3000000000)
+    real.timestamp = stamp
+    assert stamps(stamp) == stamps(real.timestamp)
+
+
+def test_duplicate_name_and_lookup(caplog):
+    table = TagTable()
+    first = table.add(Tag(None, "A", TagType.WORD, address=1))
+    assert first == table.add(Tag(None, "A", TagType.INT, address=2))
+    assert "tag A has a duplicate" in caplog.text
+    assert 1 == len(table)
+    assert first == table.row("A")
+    assert table.row("B") is None
+    assert "A" in table and "B" not in table
+
+
+def test_devices_of_rows():
+    devices = [DeviceCreator.create("127.0.0.1", 502, "dev{}".format(i)) for i in range(3)]
+    table = TagTable()
+    rows = table.extend(Tag(devices[i % 3], "t{}".format(i), TagType.INT, address=i) for i in range(9))
+    assert devices * 3 == [row.device for row in rows]
+    assert [0, 1, 2] * 3 == table.column("device").tolist()
+
+
+def test_growth_keeps_rows():
+    table = TagTable(capacity=2)
+    rows = table.extend(Tag(None, "t{}".format(i), TagType.INT, address=i) for i in range(100))
+    rows[7].value = 70
+    assert 100 == len(table)
+    assert list(range(100)) == [row.address for row in table.rows()]
+    assert 70 == table.row("t7").value
+    assert COLUMNS.itemsize * 100 == table.nbytes()
+    assert COLUMNS.itemsize < 64
+
+
+def test_vectorized_operations():
+    table = TagTable()
+    rows = table.extend(Tag(None, "t{}".format(i), TagType.WORD, address=i) for i in range(10))
+    stamp = Timestamp(1, 2, 3)
+    table.update(np.array([2, 5]), [20, None], QualityEnum.GOOD, stamp)
+
+    assert [2, 5] == table.byQuality(QualityEnum.GOOD).tolist()
+    assert 20 == rows[2].value and rows[5].value is None
+    assert stamps(stamp) == stamps(rows[5].timestamp)
+
+    snapshot = table.snapshot()
+    rows[2].value = 1
+    assert 20 == snapshot["value"][2]
+    assert list(range(10)) == snapshot["address"].tolist()
+
+
+def test_batch_stores_to_columns():
+    dev = DeviceCreator.create("127.0.0.1", 502, "dev1")
+    range_ = dev.addRange(10, 4, "range0")
+    table = TagTable()
+    rows = table.extend([Tag(dev, "word", TagType.WORD, address=10),
+                         Tag(dev, "real", TagType.REAL, address=12)])
+    range_.setRegisters([7, 0, 0, 16224], QualityEnum.GOOD)
+
+    batch = TagIndex(rows).batch("dev1", range_.dataId())
+    batch.store(batch.decode(range_.registers()), range_.quality(), range_.timestamp())
+    assert [7, 0.875] == [row.value for row in rows]
+    assert [QualityEnum.GOOD] * 2 == [row.quality for row in rows]
+    assert stamps(range_.timestamp()) == stamps(rows[1].timestamp)
+
+
+# ------------ IOServer --------------
+
+
+def test_server_with_columnar_tags(tmp_path):
+    from PyQt5.QtCore import QCoreApplication
+    from MBTools.oiserver.OIServer import IOServer
+    from MBTools.oiserver.OIServerConfigure import create_config, FormatName
+
+    app = QCoreApplication.instance() or QCoreApplication([])
+    conf = {
+        "devices": [{"name": "dev1", "protocol": "modbus", "ip": "127.0.0.1", "port": 1}],
+        "tags": [{"name": "A", "type": "WORD", "device": "dev1", "address": 10, "comment": ""},
+                 {"name": "B", "type": "INT", "device": "dev1", "address": 11, "comment": ""}],
+    }
+    path = tmp_path / "conf.json"
+    path.write_text(json.dumps(conf))
+    io = IOServer(columnar=True)
+    io.set_config(create_config(FormatName.JSON, str(path)))
+    try:
+        for dev in io.devices():
+            io.driver().delDevice(dev)
+        range_ = io.devices()[0].rangeByAddress(10)
+        range_.setRegisters([7, 5], QualityEnum.GOOD)
+        io._IOServer__onRangesUpdated([("dev1", range_)])
+
+        assert 2 == len(io.table())
+        assert [7, 5] == io.table().column("value").tolist()
+        assert 5 == io.tag("B").value
+    finally:
+        io.clear_config()
+        app.processEvents()
@@ -0,0 +1,116 @@
+import numpy as np
+import pytest
+
+from MBTools.drivers.modbus.WriteQueue import WriteQueue, WriteBatch, MaskBatch, WriteError, MAX_WRITE_REGISTERS
+
+
+# ------------ WriteQueue --------------
+
+
+def test_last_value_wins():
+    queue = WriteQueue()
+    f1 = queue.put(10, 1)
+    f2 = queue.put(10, 2)
+    batches = queue.take()
+    assert 1 == len(batches)
+    assert (10, [2]) == (batches[0].address, batches[0].values)
+    queue.done(batches[0])
+    assert f1.result(0) and f2.result(0)
+    assert 0 == len(queue)
+
+
+@pytest.mark.parametrize("commands, expect", [
+    ([(10, 1), (11, 2), (12, 3)],               [(10, [1, 2, 3])]),
+    ([(12, 3), (10, 1), (11, 2)],               [(10, [1, 2, 3])]),
+    ([(10, [1, 2]), (20, 5)],                   [(10, [1, 2]), (20, [5])]),
+    ([(10, 0x12345)],                           []),               # out of register: rejected
+])
+def test_merge(commands, expect):
+    queue = WriteQueue()
+    for addr, value in commands:
+        queue.put(addr, value)
+    assert expect == [(b.address, b.values) for b in queue.take()]
+    assert [] == queue.take()
+
+
+def test_split_by_limit():
+    queue = WriteQueue()
+    future = queue.put(0, list(range(MAX_WRITE_REGISTERS + 10)))
+    batches = queue.take()
+    assert [MAX_WRITE_REGISTERS, 10] == [len(b) for b in batches]
+    queue.done(batches[0])
+    assert not future.done()
+    queue.done(batches[1])
+    assert future.result(0)
+
+
+def test_error():
+    queue = WriteQueue()
+    f1 = queue.put(0, [1, 2])
+    f2 = queue.put(100, 3)
+    batches = queue.take()
+    queue.done(batches[0], WriteError("rejected"))
+    queue.done(batches[1])
+    with pytest.raises(WriteError):
+        f1.result(0)
+    assert f2.result(0)
+
+
+def test_fail():
+    queue = WriteQueue()
+    future = queue.put(0, 1)
+    queue.fail(ConnectionError())
+    with pytest.raises(ConnectionError):
+        future.result(0)
+    assert 0 == len(queue)
+
+
+def test_put_many():
+    queue = WriteQueue()
+    f1, f2 = queue.putMany([(10, [1, 2]), (12, 3)])
+    batches = queue.take()
+    assert [(10, [1, 2, 3])] == [(b.address, b.values) for b in batches]
+    queue.done(batches[0])
+    assert f1.result(0) and f2.result(0)
+
+
+def test_bad_values_are_rejected():
+    queue = WriteQueue()
+    empty, wide, negative, real, good = queue.putMany([(10, []), (11, 70000), (12, [1, -1]), (14, 1.5), (20, 7)])
+    assert empty.result(0)
+    for future in (wide, negative, real):
+        with pytest.raises(ValueError):
+            future.result(0)
+    assert [(20, [7])] == [(b.address, b.values) for b in queue.take()]
+
+
+def test_numpy_integers():
+    queue = WriteQueue()
+    queue.put(10, np.uint16(5))
+    queue.put(11, np.array([6, 7], dtype=np.uint16))
+    assert [(10, [5, 6, 7])] == [(b.address, b.values) for b in queue.take()]
+
+
+def test_bits_are_merged():
+    queue = WriteQueue()
+    futures = queue.putBits([(10, bit, bit % 2) for bit in range(16)] + [(10, 0, 1), (11, 3, 0)])
+    batches = queue.take()
+    assert all(isinstance(b, MaskBatch) for b in batches)
+    assert [(10, 0, 0xAAAB), (11, 0xFFF7, 0)] == [(b.address, b.and_mask, b.or_mask) for b in batches]
+    assert 0xAAAB == batches[0].apply(0x5555)
+    assert 0x1234 & 0xFFF7 == batches[1].apply(0x1234)
+    for batch in batches:
+        queue.done(batch)
+    assert all(future.result(0) for future in futures)
+    assert 0 == len(queue)
+
+
+def test_bits_and_register():
+    queue = WriteQueue()
+    queue.put(10, 0x00F0)
+    queue.putBits([(10, 0, 1), (10, 4, 0), (11, 1, 1)])
+    queue.put(11, 7)            # the whole register replaces the bits
+    batches = queue.take()
+    assert [WriteBatch] == [type(b) for b in batches]
+    assert (10, [0x00E1, 7]) == (batches[0].address, batches[0].values)
+    assert 5 == len(batches[0].futures)